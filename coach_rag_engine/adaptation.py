@@ -0,0 +1,233 @@
+"""
+Cascaded Strategy Adaptation for Coach RAG AI Engine
+====================================================
+
+Strategy selection is a two-tier cascade:
+
+1. Local (opt-in, cascade_margin): candidates are scored with the
+   selection reranker. When the best one leads the runner-up by at least
+   the margin, its strategy_text is rewritten with precompiled phrase
+   tables for the coach personality and energy level (personality
+   vocabulary, hedges dropped at medium / high energy, hard efforts
+   softened at low energy), trimmed to the word limit and framed by an opener and
+   closer.
+2. LLM: close calls, and every situation with injury risk or recovery
+   needed, go to gpt-4o-mini for selection and adaptation.
+
+AdaptationStats records how often each tier served and how long it took.
+"""
+
+import re
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from .models import CoachPersonality, CoachEnergy, SituationContext
+except ImportError:
+    # Fallback for direct script execution
+    from models import CoachPersonality, CoachEnergy, SituationContext
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+# Suggested selection score lead for cascade_margin. One extra matching tag
+# is worth 0.1 of selection score, so a smaller lead is not a clear winner.
+CASCADE_MARGIN = 0.25
+MAX_WORDS = 40              # Same limit the LLM prompt enforces
+LATENCY_WINDOW = 500        # Recent calls kept for percentiles
+
+# Openers per personality (variants picked per strategy + situation)
+PERSONALITY_OPENERS = {
+    CoachPersonality.STRATEGIST: ("Here's the plan:", "Smart move now:", "Think it through:"),
+    CoachPersonality.PACER: ("Lock into rhythm:", "Steady now:", "Find your groove:"),
+    CoachPersonality.FINISHER: ("Dig in:", "This is where it counts:", "Own this stretch:"),
+}
+
+# Closers per personality and energy
+CLOSERS = {
+    (CoachPersonality.STRATEGIST, CoachEnergy.LOW): ("Stay patient.", "Trust the plan."),
+    (CoachPersonality.STRATEGIST, CoachEnergy.MEDIUM): ("Execute it well.", "Run smart."),
+    (CoachPersonality.STRATEGIST, CoachEnergy.HIGH): ("Execute it now!", "Make it count!"),
+    (CoachPersonality.PACER, CoachEnergy.LOW): ("Nice and easy.", "Smooth and relaxed."),
+    (CoachPersonality.PACER, CoachEnergy.MEDIUM): ("Keep it steady.", "Stay consistent."),
+    (CoachPersonality.PACER, CoachEnergy.HIGH): ("Hold that rhythm!", "Keep it rolling!"),
+    (CoachPersonality.FINISHER, CoachEnergy.LOW): ("You've got this.", "One step at a time."),
+    (CoachPersonality.FINISHER, CoachEnergy.MEDIUM): ("Keep pushing.", "Stay strong."),
+    (CoachPersonality.FINISHER, CoachEnergy.HIGH): ("Let's go!", "Finish strong!"),
+}
+
+# Phrase substitutions on the strategy body, applied personality first
+# (a phrase rewritten there is not rewritten again for energy)
+PERSONALITY_PHRASES = {
+    CoachPersonality.STRATEGIST: (
+        (r"focus on", "prioritize"),
+        (r"speed up", "raise your pace"),
+        (r"slow down", "ease your pace"),
+    ),
+    CoachPersonality.PACER: (
+        (r"speed up", "lift your rhythm"),
+        (r"slow down", "settle your rhythm"),
+        (r"maintain", "hold steady"),
+    ),
+    CoachPersonality.FINISHER: (
+        (r"speed up", "drive harder"),
+        (r"slow down", "bank some energy"),
+        (r"maintain", "hold on to"),
+    ),
+}
+
+HEDGES = (
+    (r"try to", ""),
+    (r"you should", ""),
+    (r"you may want to", ""),
+)
+
+ENERGY_PHRASES = {
+    CoachEnergy.LOW: (
+        (r"push hard", "work steadily"),
+        (r"as hard as you can", "at a controlled effort"),
+        (r"immediately", "smoothly"),
+        (r"you must", "you can"),
+    ),
+    CoachEnergy.MEDIUM: HEDGES,
+    CoachEnergy.HIGH: HEDGES + (
+        (r"focus on", "lock in on"),
+        (r"keep", "hold"),
+        (r"maintain", "hold"),
+        (r"gently", "firmly"),
+    ),
+}
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+SENTENCE_START = re.compile(r"(^|[.!?]\s+)([a-z])")
+DOUBLE_SPACE = re.compile(r" {2,}")
+
+
+def _compile_templates() -> Dict[Tuple[CoachPersonality, CoachEnergy], Tuple[Tuple[str, str], ...]]:
+    """All (opener, closer) pairs per personality and energy."""
+    templates = {}
+    for personality, openers in PERSONALITY_OPENERS.items():
+        for energy in CoachEnergy:
+            templates[(personality, energy)] = tuple(
+                (opener, closer) for opener in openers for closer in CLOSERS[(personality, energy)]
+            )
+    return templates
+
+
+def _compile_phrases() -> Dict[Tuple[CoachPersonality, CoachEnergy], Tuple[re.Pattern, Dict[str, str]]]:
+    """One alternation regex and its replacements per personality and energy."""
+    tables = {}
+    for personality in CoachPersonality:
+        for energy in CoachEnergy:
+            replacements = {}
+            for phrase, replacement in PERSONALITY_PHRASES[personality] + ENERGY_PHRASES[energy]:
+                replacements.setdefault(phrase, replacement)
+            # Longest first, so "focus on" wins over a shorter overlapping phrase
+            alternation = "|".join(sorted((re.escape(p) for p in replacements), key=len, reverse=True))
+            tables[(personality, energy)] = (re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE), replacements)
+    return tables
+
+
+TEMPLATES = _compile_templates()
+PHRASES = _compile_phrases()
+
+
+# ============================================================================
+# TEMPLATE ADAPTER
+# ============================================================================
+
+def _rewrite_phrases(text: str, personality: CoachPersonality, energy: CoachEnergy) -> str:
+    """Apply the personality / energy phrase table in one pass (case kept)."""
+    pattern, replacements = PHRASES[(personality, energy)]
+
+    def substitute(match: re.Match) -> str:
+        found = match.group(0)
+        replacement = replacements[found.lower()]
+        if found[:1].isupper() and replacement:
+            replacement = replacement[0].upper() + replacement[1:]
+        return replacement
+
+    text = DOUBLE_SPACE.sub(" ", pattern.sub(substitute, text)).strip()
+    # Dropped hedges can leave a sentence starting lowercase
+    return SENTENCE_START.sub(lambda m: m.group(1) + m.group(2).upper(), text)
+
+
+def _fit_words(text: str, budget: int) -> str:
+    """Leading sentences of text within a word budget (cut mid-sentence if needed)."""
+    kept, used = [], 0
+    for sentence in SENTENCE_SPLIT.split(text.strip()):
+        words = len(sentence.split())
+        if used + words > budget:
+            if not kept:
+                kept.append(" ".join(sentence.split()[:budget]).rstrip(",;:") + ".")
+            break
+        kept.append(sentence)
+        used += words
+    return " ".join(kept)
+
+
+def adapt_strategy_text(
+    strategy_text: str,
+    context: SituationContext,
+    variant_key: str = "",
+    max_words: int = MAX_WORDS
+) -> str:
+    """
+    Adapt a KB strategy_text to the coach personality and energy (no LLM).
+
+    The wording is rewritten with the phrase tables (PERSONALITY_PHRASES,
+    ENERGY_PHRASES), cut to whole sentences within max_words and framed
+    by an opener and closer. The content is not checked against the
+    situation, so the engine only uses this for clear winners without
+    injury risk or recovery needed.
+
+    The phrase variant is chosen deterministically from variant_key, so the
+    same strategy in the same situation always reads the same.
+    """
+    options = TEMPLATES[(context.personality, context.energy_level)]
+    opener, closer = options[zlib.crc32(variant_key.encode()) % len(options)]
+
+    budget = max_words - len(opener.split()) - len(closer.split())
+    body = _rewrite_phrases(strategy_text, context.personality, context.energy_level)
+    return f"{opener} {_fit_words(body, budget)} {closer}"
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+class AdaptationStats:
+    """Per-tier call counts and latency of strategy selection."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.calls: Dict[str, int] = {"template": 0, "llm": 0, "simple": 0}
+        self._latency_ms: Dict[str, Deque[float]] = {tier: deque(maxlen=window) for tier in self.calls}
+        self.margins: Deque[float] = deque(maxlen=window)
+
+    def record(self, tier: str, started: float):
+        """Count a selection served by tier (started: time.perf_counter() value)."""
+        self.calls[tier] += 1
+        self._latency_ms[tier].append((time.perf_counter() - started) * 1000)
+
+    def metrics(self) -> Dict[str, Any]:
+        total = sum(self.calls.values())
+        all_ms: List[float] = [ms for values in self._latency_ms.values() for ms in values]
+
+        def pct(values, q) -> float:
+            return round(float(np.percentile(list(values), q)), 1) if values else 0.0
+
+        return {
+            **{f"{tier}_calls": count for tier, count in self.calls.items()},
+            "llm_call_rate": round(self.calls["llm"] / total, 3) if total else 0.0,
+            "llm_p50_ms": pct(self._latency_ms["llm"], 50),
+            "llm_p99_ms": pct(self._latency_ms["llm"], 99),
+            "selection_p50_ms": pct(all_ms, 50),
+            "selection_p99_ms": pct(all_ms, 99),
+            "median_margin": pct(self.margins, 50),
+        }
@@ -0,0 +1,177 @@
+"""
+Trace-Driven Outcome Assessment for Coach RAG AI Engine
+=======================================================
+
+Scores strategy executions from a run's telemetry instead of hand-picked
+before / after metrics.
+
+For every execution, mean pace, HR and zone are taken over a window before
+delivery and a window after it (skipping a short reaction delay). All
+windows are computed at once: cumulative sums over the trace plus
+searchsorted window bounds, so a run with hundreds of executions costs a
+few array passes. Dropout samples (0 / NaN) are excluded from the means.
+
+The effectiveness rules are the ones assess_strategy_effectiveness has
+always used, evaluated as boolean arrays:
+- target behind and pace got faster by > 0.05 min/km       +0.3
+- otherwise, fatigue high/severe and pace within 0.1 min/km +0.2
+- HR trend rising/spiking and HR rose by < 3 BPM           +0.2
+- zone too high and zone dropped                           +0.2
+starting from 0.5, capped to [0, 1].
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+BEFORE_WINDOW_SECONDS = 60.0
+AFTER_DELAY_SECONDS = 30.0      # Time for the runner to act on the cue
+AFTER_WINDOW_SECONDS = 90.0
+
+METRICS = ("pace", "hr", "zone")
+
+BEHIND_STATUSES = ("slightly_behind", "way_behind")
+RECOVERY_FATIGUE = ("high", "severe")
+RISING_HR = ("rising", "spiking")
+
+# (reason, score bonus) per rule, in evaluation order
+RULES = (
+    ("Pace improved", 0.3),
+    ("Pace stabilized during recovery", 0.2),
+    ("HR stabilized", 0.2),
+    ("Moved to lower zone", 0.2),
+)
+NO_IMPROVEMENT = "No significant improvement detected"
+
+# {"timestamp": [...], "pace": [...], "hr": [...], "zone": [...]} or per-sample dicts
+TelemetryTrace = Union[Dict[str, Sequence[float]], Sequence[Dict[str, float]]]
+
+
+# ============================================================================
+# TRACE WINDOWS
+# ============================================================================
+
+def trace_arrays(trace: TelemetryTrace) -> Dict[str, np.ndarray]:
+    """Columnar float64 arrays sorted by timestamp (missing metrics -> NaN)."""
+    if not isinstance(trace, dict):
+        trace = {
+            key: [sample.get(key, np.nan) for sample in trace]
+            for key in ("timestamp",) + METRICS
+        }
+
+    timestamps = np.asarray(trace["timestamp"], dtype=np.float64)
+    arrays = {"timestamp": timestamps}
+    for metric in METRICS:
+        values = trace.get(metric)
+        arrays[metric] = (
+            np.full(len(timestamps), np.nan) if values is None
+            else np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+        )
+
+    if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        arrays = {key: values[order] for key, values in arrays.items()}
+    return arrays
+
+
+def window_means(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray
+) -> np.ndarray:
+    """Mean of valid (> 0, finite) values in [start, end) per window, NaN if none."""
+    valid = np.isfinite(values) & (values > 0)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+
+    lo = np.searchsorted(timestamps, starts, side="left")
+    hi = np.searchsorted(timestamps, ends, side="left")
+    n = counts[hi] - counts[lo]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (sums[hi] - sums[lo]) / n, np.nan)
+
+
+def before_after(
+    trace: Dict[str, np.ndarray],
+    event_times: np.ndarray,
+    before_window: float = BEFORE_WINDOW_SECONDS,
+    after_delay: float = AFTER_DELAY_SECONDS,
+    after_window: float = AFTER_WINDOW_SECONDS
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """Per-event metric means before delivery and after the reaction delay."""
+    timestamps = trace["timestamp"]
+    before, after = {}, {}
+    for metric in METRICS:
+        before[metric] = window_means(timestamps, trace[metric], event_times - before_window, event_times)
+        after[metric] = window_means(
+            timestamps, trace[metric], event_times + after_delay, event_times + after_delay + after_window
+        )
+    return before, after
+
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def score_executions(
+    contexts: List[Dict[str, Any]],
+    before: Dict[str, np.ndarray],
+    after: Dict[str, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Apply the effectiveness rules to many executions at once.
+
+    Args:
+        contexts: execution_context per execution
+        before: Metric arrays before delivery (pace, hr, zone)
+        after: Metric arrays after delivery
+
+    Returns:
+        (was_effective, effectiveness_score, reasons)
+    """
+    behind = np.array([c.get("target_status") in BEHIND_STATUSES for c in contexts], dtype=bool)
+    recovering = np.array([c.get("fatigue") in RECOVERY_FATIGUE for c in contexts], dtype=bool)
+    hr_rising = np.array([c.get("hr_trend") in RISING_HR for c in contexts], dtype=bool)
+    zone_high = np.array([bool(c.get("zone_too_high", False)) for c in contexts], dtype=bool)
+
+    with np.errstate(invalid="ignore"):
+        pace_ok = (before["pace"] > 0) & (after["pace"] > 0)
+        pace_change = after["pace"] - before["pace"]
+        hr_ok = (before["hr"] > 0) & (after["hr"] > 0)
+        hr_change = after["hr"] - before["hr"]
+
+        hits = np.stack([
+            pace_ok & behind & (pace_change < -0.05),
+            pace_ok & ~behind & recovering & (np.abs(pace_change) < 0.1),
+            hr_ok & hr_rising & (hr_change < 3),
+            zone_high & (after["zone"] < before["zone"]),
+        ], axis=1)
+
+    bonuses = np.array([bonus for _, bonus in RULES])
+    scores = np.clip(0.5 + hits @ bonuses, 0.0, 1.0)
+    effective = hits.any(axis=1)
+    reasons = [
+        "; ".join(RULES[i][0] for i in np.flatnonzero(row)) or NO_IMPROVEMENT
+        for row in hits
+    ]
+    return effective, scores, reasons
+
+
+def outcome_metrics(
+    before: Dict[str, np.ndarray],
+    after: Dict[str, np.ndarray],
+    i: int
+) -> Dict[str, Any]:
+    """pace / hr / zone change of execution i (None where either side is missing)."""
+    metrics = {}
+    for metric in METRICS:
+        b, a = before[metric][i], after[metric][i]
+        metrics[f"{metric}_change"] = float(a - b) if b and a and np.isfinite(a - b) else None
+    return metrics
@@ -0,0 +1,502 @@
+"""
+Ranking Policy Backtest
+=======================
+
+Replays ranking policies (reranker weight sets) over exported
+strategy_executions and estimates how effective their choices would
+have been, without touching production.
+
+Inputs (CSV, JSON or JSON lines exports):
+- strategy_executions: strategy_id, executed_at, execution_context,
+  outcome_measured, was_effective, effectiveness_score
+- coaching_strategies_kb: id, tags, distance, runner_level, is_active
+
+Both are loaded once into columnar NumPy arrays (save them as .npz with
+--save to skip parsing next time). For every execution the candidate set
+is the active KB strategies eligible for its distance / runner level;
+each policy scores all candidates of a chunk of executions as one
+(executions x strategies) matrix product and picks the argmax. Chunks
+are sized from the KB (CHUNK_CELLS matrix cells), so memory stays flat
+as the KB grows.
+
+Features per (execution, candidate), as the engine ranks them:
+- success_rate, avg_effectiveness, times_used: replayed point in time,
+  from the outcomes logged before the execution (no look-ahead)
+- tag_overlap: situation tags shared with the strategy
+- similarity: situation embeddings are not logged, so the tag Jaccard
+  index stands in for vector similarity
+- source_tier: 1.0 (database strategies)
+
+Counterfactual estimates per policy:
+- direct method: mean of a reward model (effectiveness per strategy and
+  situation bucket, shrunk towards the strategy and global means) over
+  the policy's choices
+- replay: observed effectiveness on executions where the policy agrees
+  with the logged choice (reported with coverage; only those executions
+  count, so it is skewed towards situations the logging policy favoured)
+
+Usage:
+    python -m coach_rag_engine.backtest --executions executions.csv --strategies kb.csv
+    python -m coach_rag_engine.backtest --synthetic 2000000
+    python -m coach_rag_engine.backtest ... --policy 'recall={"similarity": 0.7, "success_rate": 0.3}'
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bandit import situation_bucket
+from reranker import Reranker, SELECTION_WEIGHTS
+from timestamps import parse_timestamp
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+# semantic_search_strategies_kb hybrid score and the no-LLM selection
+POLICIES = {
+    "sql_hybrid": {"similarity": 0.5, "success_rate": 0.3, "avg_effectiveness": 0.2},
+    "simple_selection": dict(SELECTION_WEIGHTS),
+}
+
+CHUNK_CELLS = 4_000_000     # Executions x strategies scored per chunk (16 MB per float32 matrix)
+SHRINKAGE = 5.0             # Pseudo-observations towards the parent mean (reward model)
+
+FATIGUE = ("low", "moderate", "high", "severe")
+TARGET_STATUS = ("ahead", "on_track", "slightly_behind", "way_behind")
+HR_TREND = ("stable", "rising", "spiking", "recovering")
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """Rows of a CSV, JSON (array) or JSON lines export."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            return list(csv.DictReader(f))
+        if path.endswith(".json"):
+            return json.load(f)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _parse_list(value: Any) -> List[str]:
+    """TEXT[] from JSON or a Postgres array literal ({a,b})."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    value = value.strip()
+    if value.startswith("["):
+        return json.loads(value)
+    return [v.strip().strip('"') for v in value.strip("{}").split(",") if v.strip()]
+
+
+def _parse_json(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    return json.loads(value) if value else {}
+
+
+def _parse_bool(value: Any) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("t", "true", "1")
+
+
+def _parse_float(value: Any) -> float:
+    return float(value) if value not in (None, "") else np.nan
+
+
+def _parse_time(value: Any) -> float:
+    if not value:
+        return 0.0
+    return parse_timestamp(str(value)).timestamp()
+
+
+# ============================================================================
+# STRATEGY TABLE
+# ============================================================================
+
+class StrategyTable:
+    """Candidate strategies as arrays (tags as a bool matrix)."""
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        tags: Sequence[Sequence[str]],
+        distances: Sequence[str],
+        runner_levels: Sequence[str]
+    ):
+        self.ids = list(ids)
+        self.position = {sid: i for i, sid in enumerate(self.ids)}
+        self.tag_vocab = {tag: i for i, tag in enumerate(sorted({t for ts in tags for t in ts}))}
+        self.distance_vocab = {d: i for i, d in enumerate(sorted(set(distances)))}
+        self.level_vocab = {lvl: i for i, lvl in enumerate(sorted(set(runner_levels) - {"all"}))}
+
+        self.tags = np.zeros((len(self.ids), len(self.tag_vocab)), dtype=np.float32)
+        for i, ts in enumerate(tags):
+            self.tags[i, [self.tag_vocab[t] for t in ts]] = 1.0
+        self.tag_counts = self.tags.sum(axis=1)
+        self.distance = np.array([self.distance_vocab[d] for d in distances], dtype=np.int16)
+        # -1 = runner level "all"
+        self.level = np.array([self.level_vocab.get(lvl, -1) for lvl in runner_levels], dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]]) -> "StrategyTable":
+        """Active strategies of a coaching_strategies_kb export."""
+        rows = [r for r in rows if _parse_bool(r.get("is_active")) is not False]
+        return cls(
+            [r["id"] for r in rows],
+            [_parse_list(r.get("tags")) for r in rows],
+            [r.get("distance") or "" for r in rows],
+            [r.get("runner_level") or "all" for r in rows]
+        )
+
+
+# ============================================================================
+# EXECUTION LOG
+# ============================================================================
+
+class ExecutionLog:
+    """
+    Columnar strategy_executions, sorted by executed_at.
+
+    strategy is the candidate position (-1 for strategies not in the
+    table), distance / level are table vocabulary codes (-1 = unknown,
+    every candidate eligible) and effective / score are NaN when no
+    outcome was measured.
+    """
+
+    COLUMNS = ("executed_at", "strategy", "bucket", "distance", "level", "tags", "tag_counts", "effective", "score")
+
+    def __init__(self, **columns: np.ndarray):
+        order = np.argsort(columns["executed_at"], kind="stable")
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name][order])
+
+    def __len__(self) -> int:
+        return len(self.executed_at)
+
+    @property
+    def measured(self) -> np.ndarray:
+        return ~np.isnan(self.effective)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], table: StrategyTable) -> "ExecutionLog":
+        n = len(rows)
+        tags = np.zeros((n, len(table.tag_vocab)), dtype=np.float32)
+        tag_counts = np.zeros(n, dtype=np.float32)
+        columns = {
+            "executed_at": np.zeros(n),
+            "strategy": np.full(n, -1, dtype=np.int32),
+            "bucket": np.zeros(n, dtype=np.int32),
+            "distance": np.full(n, -1, dtype=np.int16),
+            "level": np.full(n, -1, dtype=np.int16),
+            "effective": np.full(n, np.nan, dtype=np.float32),
+            "score": np.full(n, np.nan, dtype=np.float32),
+        }
+        buckets: Dict[str, int] = {}
+
+        for i, row in enumerate(rows):
+            context = _parse_json(row.get("execution_context"))
+            columns["executed_at"][i] = _parse_time(row.get("executed_at"))
+            columns["strategy"][i] = table.position.get(row.get("strategy_id"), -1)
+            bucket = situation_bucket(context.get("fatigue", ""), context.get("target_status", ""), context.get("hr_trend", ""))
+            columns["bucket"][i] = buckets.setdefault(bucket, len(buckets))
+            columns["distance"][i] = table.distance_vocab.get(context.get("distance"), -1)
+            columns["level"][i] = table.level_vocab.get(context.get("runner_level"), -1)
+
+            situation_tags = context.get("situation_tags") or []
+            tag_counts[i] = len(situation_tags)
+            for tag in situation_tags:
+                column = table.tag_vocab.get(tag)
+                if column is not None:
+                    tags[i, column] = 1.0
+
+            if _parse_bool(row.get("outcome_measured")) and _parse_bool(row.get("was_effective")) is not None:
+                columns["effective"][i] = float(_parse_bool(row["was_effective"]))
+                columns["score"][i] = _parse_float(row.get("effectiveness_score"))
+
+        return cls(tags=tags, tag_counts=tag_counts, **columns)
+
+    def save(self, path: str):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.COLUMNS})
+
+    @classmethod
+    def load(cls, path: str) -> "ExecutionLog":
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.COLUMNS})
+
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+def synthetic(executions: int, strategies: int = 50, tags: int = 24, seed: int = 7) -> Tuple[StrategyTable, ExecutionLog]:
+    """
+    Synthetic KB and log: each (strategy, bucket) has a hidden effectiveness,
+    higher when the strategy's tags match the situation; the logged policy
+    picks the best tag match with noise.
+    """
+    rng = np.random.default_rng(seed)
+    tag_names = [f"tag{i}" for i in range(tags)]
+    strategy_tags = [list(rng.choice(tag_names, size=rng.integers(2, 6), replace=False)) for _ in range(strategies)]
+    table = StrategyTable(
+        [f"S{i:03d}" for i in range(strategies)],
+        strategy_tags,
+        [("5k", "10k", "half")[i % 3] for i in range(strategies)],
+        ["all"] * strategies
+    )
+
+    buckets = len(FATIGUE) * len(TARGET_STATUS) * len(HR_TREND)
+    bucket = rng.integers(0, buckets, executions).astype(np.int32)
+    situation = (rng.random((executions, len(table.tag_vocab))) < 0.15).astype(np.float32)
+    distance = rng.integers(-1, 3, executions).astype(np.int16)
+    overlap = situation @ table.tags.T
+    eligible = (distance[:, None] < 0) | (table.distance[None, :] == distance[:, None])
+    noisy = np.where(eligible, overlap + rng.gumbel(size=overlap.shape) * 1.5, -np.inf)
+    logged = np.argmax(noisy, axis=1).astype(np.int32)
+    del noisy
+
+    quality = rng.beta(2, 3, (strategies, buckets))
+    p = np.clip(quality[logged, bucket] + 0.05 * overlap[np.arange(executions), logged], 0, 1)
+    effective = (rng.random(executions) < p).astype(np.float32)
+    effective[rng.random(executions) < 0.3] = np.nan    # unmeasured
+
+    log = ExecutionLog(
+        executed_at=np.sort(rng.uniform(0, 365 * 86400, executions)),
+        strategy=logged,
+        bucket=bucket,
+        distance=distance,
+        level=np.full(executions, -1, dtype=np.int16),
+        tags=situation,
+        tag_counts=situation.sum(axis=1),
+        effective=effective,
+        score=np.where(np.isnan(effective), np.nan, np.clip(p + rng.normal(0, 0.1, executions), 0, 1)).astype(np.float32)
+    )
+    return table, log
+
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+def _point_in_time(total: np.ndarray, strategy: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    (executions, strategies) stat as each execution saw it: total plus the
+    values logged by earlier executions of the chunk (exclusive cumsum).
+
+    strategy holds one logged strategy per execution (-1: none, NaN values
+    are skipped); built in place in the output matrix.
+    """
+    n = strategy.size
+    out = np.zeros((n, total.size), dtype=np.float32)
+    # An execution's increment shows from the next execution on
+    rows = np.flatnonzero((strategy[:-1] >= 0) & ~np.isnan(values[:-1]))
+    out[rows + 1, strategy[rows]] = values[rows]
+    np.cumsum(out, axis=0, out=out)
+    out += total
+    return out
+
+
+def replay(
+    log: ExecutionLog,
+    table: StrategyTable,
+    policies: Dict[str, Dict[str, float]],
+    chunk_size: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Choice of every policy for every execution (-1: no eligible candidate).
+
+    Self-learning stats are replayed in time order: an execution sees only
+    the outcomes of executions logged before it. chunk_size defaults to
+    CHUNK_CELLS / strategies executions.
+    """
+    rerankers = {name: Reranker(weights) for name, weights in policies.items()}
+    choices = {name: np.full(len(log), -1, dtype=np.int32) for name in policies}
+    s = len(table)
+    chunk_size = chunk_size or max(1, CHUNK_CELLS // max(s, 1))
+
+    # Running per-strategy stats before the current chunk
+    used = np.zeros(s, dtype=np.float32)
+    successes = np.zeros(s, dtype=np.float32)
+    score_sum = np.zeros(s, dtype=np.float32)
+    scored = np.zeros(s, dtype=np.float32)
+
+    for start in range(0, len(log), chunk_size):
+        end = min(start + chunk_size, len(log))
+        n = end - start
+        strategy = log.strategy[start:end]
+
+        # Per-execution increments (one logged strategy each)
+        executed = np.ones(n, dtype=np.float32)
+        effective = np.nan_to_num(log.effective[start:end])
+        score = log.score[start:end]
+        has_score = (~np.isnan(score)).astype(np.float32)
+        increments = (executed, effective, score, has_score)
+
+        used_before, success_before, score_before, scored_before = (
+            _point_in_time(total, strategy, values)
+            for total, values in zip((used, successes, score_sum, scored), increments)
+        )
+
+        # Situation / strategy features
+        overlap = log.tags[start:end] @ table.tags.T
+        union = log.tag_counts[start:end, None] + table.tag_counts[None, :] - overlap
+        features = {
+            "similarity": np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0),
+            "match_score": np.zeros((n, s), dtype=np.float32),
+            "success_rate": np.divide(success_before, used_before, out=np.zeros_like(used_before), where=used_before > 0),
+            "avg_effectiveness": np.divide(score_before, scored_before, out=np.zeros_like(scored_before), where=scored_before > 0),
+            "times_used": used_before,
+            "tag_overlap": overlap,
+            "source_tier": np.ones((n, s), dtype=np.float32),
+        }
+        flat = {name: values.ravel() for name, values in features.items()}
+
+        distance = log.distance[start:end, None]
+        level = log.level[start:end, None]
+        eligible = ((distance < 0) | (table.distance[None, :] == distance)) & (
+            (level < 0) | (table.level[None, :] < 0) | (table.level[None, :] == level)
+        )
+        any_eligible = eligible.any(axis=1)
+
+        for name, reranker in rerankers.items():
+            scores = np.where(eligible, reranker.scores(flat).reshape(n, s), -np.inf)
+            picks = np.argmax(scores, axis=1).astype(np.int32)
+            choices[name][start:end] = np.where(any_eligible, picks, -1)
+
+        # Running totals for the next chunk
+        for total, values in zip((used, successes, score_sum, scored), increments):
+            logged = (strategy >= 0) & ~np.isnan(values)
+            total += np.bincount(strategy[logged], weights=values[logged], minlength=s).astype(np.float32)
+
+    return choices
+
+
+# ============================================================================
+# COUNTERFACTUAL ESTIMATES
+# ============================================================================
+
+def reward_model(log: ExecutionLog, strategies: int, shrinkage: float = SHRINKAGE) -> np.ndarray:
+    """Effectiveness per (strategy, bucket), shrunk to strategy then global means."""
+    measured = log.measured & (log.strategy >= 0)
+    strategy = log.strategy[measured]
+    bucket = log.bucket[measured]
+    reward = log.effective[measured].astype(np.float64)
+    buckets = int(log.bucket.max()) + 1 if len(log) else 1
+
+    global_mean = reward.mean() if reward.size else 0.0
+    n_s = np.bincount(strategy, minlength=strategies)
+    sum_s = np.bincount(strategy, weights=reward, minlength=strategies)
+    strategy_mean = (sum_s + shrinkage * global_mean) / (n_s + shrinkage)
+
+    cell = strategy * buckets + bucket
+    n_c = np.bincount(cell, minlength=strategies * buckets).reshape(strategies, buckets)
+    sum_c = np.bincount(cell, weights=reward, minlength=strategies * buckets).reshape(strategies, buckets)
+    return (sum_c + shrinkage * strategy_mean[:, None]) / (n_c + shrinkage)
+
+
+def evaluate(log: ExecutionLog, choices: np.ndarray, model: np.ndarray) -> Dict[str, Any]:
+    """Direct-method and replay estimates of a policy's choices."""
+    measured = log.measured
+    chosen = choices >= 0
+    population = measured & chosen
+
+    direct = model[choices[population], log.bucket[population]]
+    agree = population & (choices == log.strategy)
+    counts = np.bincount(choices[chosen], minlength=model.shape[0])
+
+    return {
+        "direct_effectiveness": float(direct.mean()) if direct.size else float("nan"),
+        "replay_effectiveness": float(log.effective[agree].mean()) if agree.any() else float("nan"),
+        "replay_matches": int(agree.sum()),
+        "agreement": float((choices[chosen] == log.strategy[chosen]).mean()) if chosen.any() else 0.0,
+        "strategies_used": int((counts > 0).sum()),
+        "top_strategy_share": float(counts.max() / chosen.sum()) if chosen.any() else 0.0,
+    }
+
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def parse_policy(value: str) -> Tuple[str, Dict[str, float]]:
+    """NAME=JSON weights."""
+    name, _, weights = value.partition("=")
+    return name, json.loads(weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay of strategy ranking policies")
+    parser.add_argument("--executions", help="strategy_executions export (.csv / .json / .jsonl) or saved .npz")
+    parser.add_argument("--strategies", help="coaching_strategies_kb export (.csv / .json / .jsonl)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic executions instead")
+    parser.add_argument("--policy", action="append", type=parse_policy, default=[], help="NAME=JSON reranker weights")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Executions per chunk (default: CHUNK_CELLS / strategies)")
+    parser.add_argument("--save", help="Write the loaded log as .npz (reuse with the same strategies export)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("COACH RAG - Ranking Policy Backtest")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    if args.synthetic:
+        table, log = synthetic(args.synthetic)
+        source = "synthetic"
+    elif args.executions and args.strategies:
+        table = StrategyTable.from_rows(load_rows(args.strategies))
+        if args.executions.endswith(".npz"):
+            log = ExecutionLog.load(args.executions)
+        else:
+            log = ExecutionLog.from_rows(load_rows(args.executions), table)
+        source = args.executions
+    else:
+        parser.error("--executions and --strategies, or --synthetic N")
+    load_seconds = time.perf_counter() - start
+
+    if args.save:
+        log.save(args.save)
+
+    policies = dict(POLICIES)
+    policies.update(args.policy)
+
+    measured = log.measured
+    print(f"📚 {source}: {len(log):,} executions ({int(measured.sum()):,} measured), {len(table)} strategies ({load_seconds:.1f}s load)")
+    print(f"   Logged policy effectiveness: {np.nanmean(log.effective):.3f}")
+
+    start = time.perf_counter()
+    choices = replay(log, table, policies, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"⚡ Replayed {len(policies)} policies in {elapsed:.2f}s ({len(log) * len(policies) / elapsed * 60 / 1e6:.1f}M policy-executions/min)")
+
+    model = reward_model(log, len(table))
+    for name, picks in choices.items():
+        result = evaluate(log, picks, model)
+        print(f"\n🎯 {name}: {policies[name]}")
+        print(f"   Direct-method effectiveness: {result['direct_effectiveness']:.3f}")
+        print(f"   Replay effectiveness: {result['replay_effectiveness']:.3f} on {result['replay_matches']:,} matching executions")
+        print(f"   Agreement with logged choices: {result['agreement']:.1%}")
+        print(f"   Strategies used: {result['strategies_used']}, top strategy share {result['top_strategy_share']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
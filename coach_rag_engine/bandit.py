@@ -0,0 +1,250 @@
+"""
+Online Strategy Bandit for Coach RAG AI Engine
+==============================================
+
+In-process Beta-Bernoulli model of strategy success, per
+(strategy, situation bucket) and optionally per user. Outcomes update it
+in O(1) the moment they are recorded, so ranking reflects them without
+waiting for record_strategy_outcome_kb and a KB re-read.
+
+Posterior of an arm:
+    Beta(1 + s * p + successes, 1 + (1 - s) * p + failures)
+where s is the strategy's KB success_rate and p = min(times_used,
+PRIOR_STRENGTH) pseudo-observations: the KB stats are a capped prior,
+the bucket's own outcomes quickly dominate. Per-user arms add the user's
+outcomes on top, weighted by USER_WEIGHT.
+
+Ranking uses either a Thompson draw (exploration) or the posterior mean.
+
+Checkpoints: each worker persists only the outcomes it observed itself
+(one row per worker_id), and startup sums all rows, so workers never
+overwrite each other's evidence.
+"""
+
+import base64
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .models import SituationContext
+except ImportError:
+    # Fallback for direct script execution
+    from models import SituationContext
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+BANDIT_MODES = ("thompson", "mean")
+PRIOR_STRENGTH = 10.0       # Max pseudo-observations taken from KB stats
+USER_WEIGHT = 2.0           # A user's own outcome counts this much
+INITIAL_CAPACITY = 256
+CHECKPOINT_INTERVAL_SECONDS = 300.0
+SNAPSHOT_VERSION = 1
+
+# (strategy_id, situation bucket, user_id or "")
+ArmKey = Tuple[str, str, str]
+
+
+def situation_bucket(fatigue: str, target_status: str, hr_trend: str) -> str:
+    """Coarse situation key shared by live contexts and execution records."""
+    return f"{fatigue}|{target_status}|{hr_trend}"
+
+
+def context_bucket(context: SituationContext) -> str:
+    return situation_bucket(context.fatigue_level.value, context.target_status.value, context.hr_trend.value)
+
+
+def execution_bucket(execution_context: Dict[str, Any]) -> str:
+    """Bucket of a strategy_executions.execution_context."""
+    return situation_bucket(
+        execution_context.get("fatigue", ""),
+        execution_context.get("target_status", ""),
+        execution_context.get("hr_trend", "")
+    )
+
+
+def _encode(values: np.ndarray) -> str:
+    return base64.b64encode(values.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode(payload: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload), dtype=np.float32).astype(np.float64)
+
+
+# ============================================================================
+# BANDIT
+# ============================================================================
+
+class StrategyBandit:
+    """
+    Beta posteriors per (strategy, situation bucket[, user]).
+
+    Usage:
+        bandit = StrategyBandit(mode="thompson")
+        bandit.update("S12", bucket, was_effective=True, user_id=user_id)
+        scores = bandit.score(ids, bucket, success_rates, times_used, user_id)
+    """
+
+    def __init__(
+        self,
+        mode: str = "thompson",
+        per_user: bool = False,
+        prior_strength: float = PRIOR_STRENGTH,
+        user_weight: float = USER_WEIGHT,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            mode: "thompson" (sampled) or "mean" (posterior mean) scores
+            per_user: Keep per-user arms besides the shared ones
+            prior_strength: Cap on pseudo-observations from KB stats
+            user_weight: Weight of a user's own outcomes
+            seed: RNG seed (Thompson draws)
+        """
+        if mode not in BANDIT_MODES:
+            raise ValueError(f"mode must be one of {BANDIT_MODES}")
+
+        self.mode = mode
+        self.per_user = per_user
+        self.prior_strength = prior_strength
+        self.user_weight = user_weight
+        self._rng = np.random.default_rng(seed)
+
+        # Arm counts: totals (all workers) and this worker's own (checkpointed)
+        self._index: Dict[ArmKey, int] = {}
+        self._keys: List[ArmKey] = []
+        self._counts = np.zeros((INITIAL_CAPACITY, 2), dtype=np.float64)      # successes, failures
+        self._own_counts = np.zeros((INITIAL_CAPACITY, 2), dtype=np.float64)
+
+        self.updates = 0
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _arm(self, key: ArmKey) -> int:
+        """Row of an arm (created on first use)."""
+        row = self._index.get(key)
+        if row is None:
+            row = len(self._keys)
+            if row == len(self._counts):
+                self._counts = np.vstack([self._counts, np.zeros_like(self._counts)])
+                self._own_counts = np.vstack([self._own_counts, np.zeros_like(self._own_counts)])
+            self._index[key] = row
+            self._keys.append(key)
+        return row
+
+    # ========================================================================
+    # LEARNING
+    # ========================================================================
+
+    def update(self, strategy_id: str, bucket: str, was_effective: bool, user_id: Optional[str] = None):
+        """Add one outcome (O(1))."""
+        column = 0 if was_effective else 1
+        keys = [(strategy_id, bucket, "")]
+        if self.per_user and user_id:
+            keys.append((strategy_id, bucket, user_id))
+
+        for key in keys:
+            row = self._arm(key)
+            self._counts[row, column] += 1
+            self._own_counts[row, column] += 1
+        self.updates += 1
+        self.dirty = True
+
+    def _lookup(self, strategy_ids: Sequence[str], bucket: str, user_id: str) -> np.ndarray:
+        """(n, 2) counts per strategy, zeros for unseen arms."""
+        counts = np.zeros((len(strategy_ids), 2), dtype=np.float64)
+        for i, strategy_id in enumerate(strategy_ids):
+            row = self._index.get((strategy_id, bucket, user_id))
+            if row is not None:
+                counts[i] = self._counts[row]
+        return counts
+
+    def posterior(
+        self,
+        strategy_ids: Sequence[str],
+        bucket: str,
+        success_rates: np.ndarray,
+        times_used: np.ndarray,
+        user_id: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Beta (alpha, beta) per strategy."""
+        pseudo = np.minimum(np.asarray(times_used, dtype=np.float64), self.prior_strength)
+        rates = np.clip(np.asarray(success_rates, dtype=np.float64), 0.0, 1.0)
+
+        counts = self._lookup(strategy_ids, bucket, "")
+        if self.per_user and user_id:
+            counts = counts + self.user_weight * self._lookup(strategy_ids, bucket, user_id)
+
+        alpha = 1.0 + rates * pseudo + counts[:, 0]
+        beta = 1.0 + (1.0 - rates) * pseudo + counts[:, 1]
+        return alpha, beta
+
+    def score(
+        self,
+        strategy_ids: Sequence[str],
+        bucket: str,
+        success_rates: np.ndarray,
+        times_used: np.ndarray,
+        user_id: Optional[str] = None
+    ) -> np.ndarray:
+        """Ranking score per strategy in [0, 1] (Thompson draw or posterior mean)."""
+        alpha, beta = self.posterior(strategy_ids, bucket, success_rates, times_used, user_id)
+        if self.mode == "thompson":
+            return self._rng.beta(alpha, beta).astype(np.float32)
+        return (alpha / (alpha + beta)).astype(np.float32)
+
+    # ========================================================================
+    # CHECKPOINTS
+    # ========================================================================
+
+    def to_state(self) -> Dict[str, Any]:
+        """Compact state of this worker's own observations (JSON-serializable)."""
+        rows = np.flatnonzero(self._own_counts[:len(self._keys)].sum(axis=1) > 0)
+        return {
+            "version": SNAPSHOT_VERSION,
+            "keys": [list(self._keys[r]) for r in rows.tolist()],
+            "successes": _encode(self._own_counts[rows, 0]),
+            "failures": _encode(self._own_counts[rows, 1]),
+        }
+
+    def load_states(self, states: Iterable[Tuple[str, Dict[str, Any]]], worker_id: str) -> int:
+        """
+        Add checkpoint rows (worker_id, state); the row of worker_id also
+        restores this worker's own counts.
+
+        Returns:
+            Number of arms loaded
+        """
+        loaded = 0
+        for row_worker, state in states:
+            if not state or state.get("version") != SNAPSHOT_VERSION:
+                continue
+            successes, failures = _decode(state["successes"]), _decode(state["failures"])
+            own = row_worker == worker_id
+            for key, s, f in zip(state["keys"], successes, failures):
+                row = self._arm(tuple(key))
+                self._counts[row] += (s, f)
+                if own:
+                    self._own_counts[row] += (s, f)
+                loaded += 1
+        return loaded
+
+    def metrics(self) -> Dict[str, Any]:
+        """Arm count, observations and update counter."""
+        # Outcomes counted once (shared arms; user arms repeat them)
+        shared = np.array([not key[2] for key in self._keys], dtype=bool)
+        n = len(self._keys)
+        return {
+            "mode": self.mode,
+            "arms": n,
+            "user_arms": int(n - shared.sum()),
+            "observations": int(self._counts[:n][shared].sum()),
+            "own_observations": int(self._own_counts[:n][shared].sum()),
+            "updates": self.updates,
+            "memory_bytes": self._counts.nbytes + self._own_counts.nbytes,
+        }
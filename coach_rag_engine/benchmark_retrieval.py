@@ -0,0 +1,135 @@
+"""
+Retrieval Benchmark
+===================
+
+Measures recall@k and latency of two-stage local search against exact
+search on the StrategyIndex, and recall/memory of quantized storage.
+
+Uses the live KB when SUPABASE_URL / SUPABASE_ANON_KEY are set, otherwise
+a synthetic KB whose per-dimension variance decays like Matryoshka-trained
+text-embedding-3 vectors (most signal in the leading dimensions).
+
+Usage:
+    python -m coach_rag_engine.benchmark_retrieval --rows 20000 --queries 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from local_index import StrategyIndex, recall_at_k
+from quantization import QuantizedEmbeddingStore
+from vectors import EMBEDDING_DIMS
+
+DISTANCES = ("casual", "5k", "10k", "half", "full")
+
+
+def synthetic_index(rows: int, seed: int = 7) -> StrategyIndex:
+    """Build a synthetic KB index with Matryoshka-like embeddings."""
+    rng = np.random.default_rng(seed)
+    decay = (1.0 + np.arange(EMBEDDING_DIMS, dtype=np.float32)) ** -0.5
+    embeddings = rng.standard_normal((rows, EMBEDDING_DIMS), dtype=np.float32) * decay
+    kb_rows = [
+        {
+            "id": f"S{i:06d}",
+            "title": f"Strategy {i}",
+            "distance": DISTANCES[i % len(DISTANCES)],
+            "type": "core" if i % 2 else "micro",
+            "runner_level": "all",
+            "success_rate": float(rng.uniform(0.3, 0.9)),
+            "avg_effectiveness_score": float(rng.uniform(0.3, 0.9)),
+            "times_used": int(rng.integers(0, 200)),
+        }
+        for i in range(rows)
+    ]
+    return StrategyIndex(kb_rows, embeddings)
+
+
+async def live_index() -> StrategyIndex:
+    """Load the KB index from Supabase."""
+    from engine import CoachRAGEngine
+
+    engine = CoachRAGEngine()
+    try:
+        await engine.load_local_index()
+        return engine._local_index
+    finally:
+        await engine.close()
+
+
+def make_queries(index: StrategyIndex, count: int, noise: float, seed: int = 11) -> np.ndarray:
+    """Perturb random KB embeddings to simulate situation embeddings."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(index), count)
+    base = index.embeddings[picks]
+    return base + rng.standard_normal(base.shape, dtype=np.float32) * noise / np.sqrt(EMBEDDING_DIMS)
+
+
+def time_search(index: StrategyIndex, queries: np.ndarray, **kwargs) -> np.ndarray:
+    """Per-query latency in milliseconds."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search_positions(query, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-stage retrieval recall/latency benchmark")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic KB size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--noise", type=float, default=1.0, help="Query perturbation scale")
+    parser.add_argument("--rerank-depth", type=int, default=48)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("COACH RAG - Two-Stage Retrieval Benchmark")
+    print("=" * 60)
+
+    if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_ANON_KEY"):
+        index = asyncio.run(live_index())
+        source = "live KB"
+    else:
+        index = synthetic_index(args.rows)
+        source = "synthetic KB"
+
+    queries = make_queries(index, args.queries, args.noise)
+    search = {"match_threshold": -1.0, "match_count": args.k}
+
+    print(f"📚 {source}: {len(index)} strategies, {len(queries)} queries, k={args.k}")
+
+    for distance in (None, "10k"):
+        recall = recall_at_k(
+            index, queries, k=args.k, rerank_depth=args.rerank_depth,
+            distance=distance, match_threshold=-1.0
+        )
+        exact_ms = time_search(index, queries, mode="exact", distance=distance, **search)
+        staged_ms = time_search(
+            index, queries, mode="two_stage", rerank_depth=args.rerank_depth,
+            distance=distance, **search
+        )
+        label = distance or "all distances"
+        print(f"\n🔍 {label}")
+        print(f"   recall@{args.k}: {recall:.3f}")
+        print(f"   exact:     p50 {np.percentile(exact_ms, 50):.2f} ms, p99 {np.percentile(exact_ms, 99):.2f} ms")
+        print(f"   two-stage: p50 {np.percentile(staged_ms, 50):.2f} ms, p99 {np.percentile(staged_ms, 99):.2f} ms")
+
+    print("\n🗜️  Quantized storage (vs float32 exact)")
+    for mode in ("int8", "float16"):
+        store = QuantizedEmbeddingStore.from_embeddings(index.embeddings, mode)
+        recall = store.recall_at_k(index.embeddings, queries, k=args.k)
+        print(f"   {mode:8s} recall@{args.k}: {recall:.3f}, memory {index.embeddings.nbytes / store.nbytes:.2f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Situation Change Detection for Coach RAG AI Engine
+==================================================
+
+Scheduled coaching fires on a fixed cadence whether or not anything about
+the runner changed. The detector remembers the last delivered strategy per
+run and suppresses a new strategy call while:
+- the canonical situation signature (SituationContext.signature) is the same
+- every tracked metric moved less than its threshold (pace, HR, zone)
+- the last delivery is younger than max_hold_seconds
+
+A suppressed tick returns the last strategy again ("cached") or an empty
+hold result ("hold"), both marked suppressed.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Optional
+
+try:
+    from .models import PerformanceAnalysis, AdaptiveStrategyOutput, SituationContext
+except ImportError:
+    # Fallback for direct script execution
+    from models import PerformanceAnalysis, AdaptiveStrategyOutput, SituationContext
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+# Metric -> minimum change that counts as a new situation
+DEFAULT_THRESHOLDS = {
+    "pace": 0.15,   # min/km
+    "hr": 5.0,      # BPM
+    "zone": 1.0,
+}
+
+# Metric name -> PerformanceAnalysis field (other names are used as-is)
+METRIC_FIELDS = {
+    "pace": "current_pace",
+    "hr": "current_hr",
+    "zone": "current_zone",
+}
+
+SUPPRESSION_MODES = ("cached", "hold")
+MAX_HOLD_SECONDS = 180.0    # Deliver a fresh strategy at least this often
+MAX_TRACKED_RUNS = 1000
+
+
+def _metric(perf: PerformanceAnalysis, name: str) -> Optional[float]:
+    value = getattr(perf, METRIC_FIELDS.get(name, name), None)
+    return float(value) if value is not None else None
+
+
+# ============================================================================
+# CHANGE DETECTOR
+# ============================================================================
+
+class SituationChangeDetector:
+    """
+    Per-run suppression of redundant strategy calls.
+
+    Usage:
+        detector = SituationChangeDetector(mode="hold")
+        result = detector.check(run_id, context, perf)
+        if result is None:
+            result = await select_strategy(...)
+            detector.record(run_id, context, perf, result)
+    """
+
+    def __init__(
+        self,
+        thresholds: Optional[Dict[str, float]] = None,
+        mode: str = "cached",
+        max_hold_seconds: Optional[float] = MAX_HOLD_SECONDS,
+        max_runs: int = MAX_TRACKED_RUNS
+    ):
+        """
+        Args:
+            thresholds: Metric -> minimum delta (default DEFAULT_THRESHOLDS)
+            mode: "cached" (repeat the last strategy) or "hold" (empty result)
+            max_hold_seconds: Longest suppression streak (None = unlimited)
+            max_runs: Runs remembered (least recently used dropped first)
+        """
+        if mode not in SUPPRESSION_MODES:
+            raise ValueError(f"mode must be one of {SUPPRESSION_MODES}")
+
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.mode = mode
+        self.max_hold_seconds = max_hold_seconds
+        self.max_runs = max_runs
+
+        # run_id -> last delivery (signature, metrics, strategy, time)
+        self._last: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        # Counters
+        self.checks = 0
+        self.suppressed = 0
+        self.delivered_reasons: Dict[str, int] = {}
+
+    def _changed(self, last: Dict[str, Any], signature: str, perf: PerformanceAnalysis) -> Optional[str]:
+        """Why the situation counts as new, or None if it does not."""
+        if signature != last["signature"]:
+            return "signature"
+
+        for name, threshold in self.thresholds.items():
+            before, now = last["metrics"].get(name), _metric(perf, name)
+            if before is not None and now is not None and abs(now - before) >= threshold:
+                return name
+
+        if self.max_hold_seconds is not None and time.monotonic() - last["at"] >= self.max_hold_seconds:
+            return "max_hold"
+        return None
+
+    def check(
+        self,
+        run_id: str,
+        context: SituationContext,
+        perf: PerformanceAnalysis
+    ) -> Optional[AdaptiveStrategyOutput]:
+        """
+        Suppressed result if the situation did not change, else None.
+
+        None means a fresh strategy is needed; pass it to record().
+        """
+        self.checks += 1
+        last = self._last.get(run_id)
+
+        reason = "first" if last is None else self._changed(last, context.signature(), perf)
+        if reason is not None:
+            self.delivered_reasons[reason] = self.delivered_reasons.get(reason, 0) + 1
+            return None
+
+        self._last.move_to_end(run_id)
+        self.suppressed += 1
+        strategy = last["strategy"]
+
+        if self.mode == "cached":
+            return replace(strategy, suppressed=True, requires_outcome_check=False)
+
+        return AdaptiveStrategyOutput(
+            strategy_text="",
+            strategy_name="Hold",
+            situation_summary=strategy.situation_summary,
+            selection_reason="Situation unchanged since last strategy",
+            execution_id=strategy.execution_id,
+            confidence_score=strategy.confidence_score,
+            priority_tags=strategy.priority_tags,
+            requires_outcome_check=False,
+            suppressed=True
+        )
+
+    def record(
+        self,
+        run_id: str,
+        context: SituationContext,
+        perf: PerformanceAnalysis,
+        strategy: AdaptiveStrategyOutput
+    ):
+        """Remember a delivered strategy as the run's baseline."""
+        self._last[run_id] = {
+            "signature": context.signature(),
+            "metrics": {name: _metric(perf, name) for name in self.thresholds},
+            "strategy": strategy,
+            "at": time.monotonic(),
+        }
+        self._last.move_to_end(run_id)
+        while len(self._last) > self.max_runs:
+            self._last.popitem(last=False)
+
+    def forget(self, run_id: str):
+        """Drop a finished run."""
+        self._last.pop(run_id, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Suppression counters."""
+        return {
+            "mode": self.mode,
+            "checks": self.checks,
+            "suppressed": self.suppressed,
+            "delivered": self.checks - self.suppressed,
+            "suppression_rate": round(self.suppressed / self.checks, 3) if self.checks else 0.0,
+            "delivered_reasons": dict(self.delivered_reasons),
+            "tracked_runs": len(self._last),
+        }
@@ -0,0 +1,239 @@
+"""
+KB Delta Sync for Coach RAG AI Engine
+=====================================
+
+Keeps the local strategy index fresh without full reloads.
+
+A background task polls coaching_strategies_kb for rows changed since a
+watermark (updated_at), using keyset pagination on (updated_at, id):
+
+    order=updated_at.asc,id.asc
+    or=(updated_at.gt.<ts>,and(updated_at.eq.<ts>,id.gt.<id>))
+
+Each page is applied in place (StrategyIndex.apply_changes): stat
+updates from record_strategy_outcome_kb, inserts and deactivations.
+Changed rows are fetched without embeddings; vectors are pulled only for
+strategies the index does not hold yet and for those whose embedding_hash
+(migration 012) differs from the one held, i.e. re-embedded strategies.
+
+Every cycle restarts a few seconds behind the watermark, because
+updated_at is the writer's transaction start time and a slow transaction
+can commit a row older than the newest one already seen. Re-applying a
+row is idempotent.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from .local_index import StrategyIndex
+    from .timestamps import parse_timestamp
+except ImportError:
+    # Fallback for direct script execution
+    from local_index import StrategyIndex
+    from timestamps import parse_timestamp
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+SYNC_INTERVAL_SECONDS = 30.0
+PAGE_SIZE = 500
+OVERLAP_SECONDS = 5.0
+
+# (watermark, last_id, limit) -> changed KB rows, without embeddings
+FetchChanges = Callable[[Optional[str], Optional[str], int], Awaitable[List[Dict[str, Any]]]]
+
+# (ids) -> {id: strategy_embedding}
+FetchEmbeddings = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+
+# ============================================================================
+# DELTA SYNC
+# ============================================================================
+
+class KBDeltaSync:
+    """
+    Background incremental sync of coaching_strategies_kb into a StrategyIndex.
+
+    Usage:
+        sync = KBDeltaSync(fetch_changes, fetch_embeddings, lambda: engine._local_index)
+        sync.start()
+        ...
+        print(sync.metrics())
+        await sync.stop()
+    """
+
+    def __init__(
+        self,
+        fetch_changes: FetchChanges,
+        fetch_embeddings: FetchEmbeddings,
+        get_index: Callable[[], Optional[StrategyIndex]],
+        interval: float = SYNC_INTERVAL_SECONDS,
+        page_size: int = PAGE_SIZE,
+        overlap_seconds: float = OVERLAP_SECONDS,
+        before_cycle: Optional[Callable[[], Awaitable[Any]]] = None
+    ):
+        """
+        Args:
+            fetch_changes: Keyset-paginated change query
+            fetch_embeddings: Embedding lookup for new / re-embedded strategies
+            get_index: Returns the index to update (it may be swapped)
+            interval: Seconds between polls
+            page_size: Rows per page
+            overlap_seconds: Re-read window behind the watermark
+            before_cycle: Optional hook run before each cycle (e.g. an
+                embedding version check that may swap the index)
+        """
+        self.fetch_changes = fetch_changes
+        self.fetch_embeddings = fetch_embeddings
+        self.get_index = get_index
+        self.interval = interval
+        self.page_size = page_size
+        self.overlap_seconds = overlap_seconds
+        self.before_cycle = before_cycle
+
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.cycles = 0
+        self.errors = 0
+        self.rows_applied = 0
+        self.counts = {"inserted": 0, "updated": 0, "deactivated": 0, "skipped": 0}
+        self.last_rows_per_second = 0.0
+        self.last_cycle_seconds = 0.0
+        self.caught_up_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # ========================================================================
+    # SYNC
+    # ========================================================================
+
+    def _cursor_start(self, index: StrategyIndex) -> Optional[str]:
+        """Watermark to resume from, minus the overlap window."""
+        if not index.watermark:
+            return None
+        start = parse_timestamp(index.watermark) - timedelta(seconds=self.overlap_seconds)
+        return start.isoformat()
+
+    @staticmethod
+    def _needs_embedding(index: StrategyIndex, row: Dict[str, Any]) -> bool:
+        """True if the row is new to the index or its vector changed."""
+        position = index.position(row["id"])
+        if position is None:
+            return True
+        return row.get("embedding_hash") != index.rows[position].get("embedding_hash")
+
+    async def sync_once(self) -> int:
+        """
+        Drain all pending changes into the index.
+
+        Returns:
+            Number of rows applied
+        """
+        if self.before_cycle is not None:
+            await self.before_cycle()
+
+        index = self.get_index()
+        if index is None:
+            return 0
+
+        started = time.perf_counter()
+        watermark, last_id = self._cursor_start(index), None
+        applied = 0
+
+        while True:
+            rows = await self.fetch_changes(watermark, last_id, self.page_size)
+            if not rows:
+                break
+
+            # Vectors only for new or re-embedded strategies
+            missing = [
+                r["id"] for r in rows
+                if r.get("is_active", True) and self._needs_embedding(index, r)
+            ]
+            if missing:
+                embeddings = await self.fetch_embeddings(missing)
+                for row in rows:
+                    if row["id"] in embeddings:
+                        row["strategy_embedding"] = embeddings[row["id"]]
+
+            counts = index.apply_changes(rows)
+            for key, value in counts.items():
+                self.counts[key] += value
+            applied += len(rows)
+
+            watermark, last_id = rows[-1]["updated_at"], rows[-1]["id"]
+            if len(rows) < self.page_size:
+                break
+
+        elapsed = time.perf_counter() - started
+        self.cycles += 1
+        self.rows_applied += applied
+        self.last_cycle_seconds = elapsed
+        self.last_rows_per_second = applied / elapsed if elapsed > 0 else 0.0
+        self.caught_up_at = time.time()
+        return applied
+
+    async def _run(self):
+        """Poll loop; errors are counted and retried on the next tick."""
+        while True:
+            try:
+                await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"   ⚠️ KB delta sync error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background poll task (needs a running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ========================================================================
+    # METRICS
+    # ========================================================================
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Sync health.
+
+        lag_seconds is the time since the index last drained the change
+        feed (so data is at most lag_seconds stale), watermark_age_seconds
+        the age of the newest change applied.
+        """
+        index = self.get_index()
+        watermark = index.watermark if index is not None else None
+        now = time.time()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "cycles": self.cycles,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "rows_applied": self.rows_applied,
+            **self.counts,
+            "rows_per_second": round(self.last_rows_per_second, 1),
+            "last_cycle_ms": round(self.last_cycle_seconds * 1000, 1),
+            "lag_seconds": round(now - self.caught_up_at, 1) if self.caught_up_at else None,
+            "watermark": watermark,
+            "watermark_age_seconds": (
+                round((datetime.now(timezone.utc) - parse_timestamp(watermark)).total_seconds(), 1)
+                if watermark else None
+            ),
+        }
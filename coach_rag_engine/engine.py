@@ -16,8 +16,11 @@ Output is short, actionable coaching strategy.
 
 import os
 import json
+import time
+import uuid
 import asyncio
 import httpx
+import numpy as np
 from typing import List, Dict, Optional, Any, Tuple
 from datetime import datetime
 
@@ -36,6 +39,43 @@ try:
         FatigueLevel,
         TargetStatus
     )
+    from .vectors import (
+        EMBEDDING_MODEL,
+        EMBEDDING_DIMS,
+        EMBEDDING_WRITE_BATCH,
+        decode_base64_embedding,
+        to_pgvector
+    )
+    from .local_index import StrategyIndex, KB_COLUMNS, SYNC_COLUMNS, KB_PAGE_SIZE, SEARCH_MODES
+    from .quantization import MappedFloat32Store
+    from .snapshot import open_snapshot, write_snapshot
+    from .shared_kb import SharedKBReader
+    from .delta_sync import KBDeltaSync
+    from .index_registry import IndexRegistry
+    from .lexical import LexicalIndex
+    from .hybrid import HybridRetriever
+    from .reranker import Reranker, SELECTION_WEIGHTS, SUCCESS_WEIGHTS, MATCH_WEIGHTS, features_from_strategies
+    from .session import RunSession
+    from .change_detection import SituationChangeDetector
+    from .prefetch import TransitionTable, HISTORY_LIMIT
+    from .semantic_cache import SemanticResponseCache, situation_vector
+    from .adaptation import AdaptationStats, adapt_strategy_text
+    from .write_behind import WriteBehindQueue
+    from .spool import RecordSpool, SpoolDrainer
+    from .pending import PendingExecutionStore, PENDING_TTL_SECONDS, MAX_PENDING_EXECUTIONS, CLOSE_BATCH_SIZE
+    from .assessment import (
+        TelemetryTrace,
+        METRICS,
+        BEFORE_WINDOW_SECONDS,
+        AFTER_DELAY_SECONDS,
+        AFTER_WINDOW_SECONDS,
+        trace_arrays,
+        before_after,
+        score_executions,
+        outcome_metrics
+    )
+    from .bandit import StrategyBandit, context_bucket, execution_bucket, CHECKPOINT_INTERVAL_SECONDS
+    from .rollups import RollupJob, Watermark, PERIODS, ROLLUP_INTERVAL_SECONDS
 except ImportError:
     # Fallback for direct script execution
     from models import (
@@ -52,6 +92,43 @@ except ImportError:
         FatigueLevel,
         TargetStatus
     )
+    from vectors import (
+        EMBEDDING_MODEL,
+        EMBEDDING_DIMS,
+        EMBEDDING_WRITE_BATCH,
+        decode_base64_embedding,
+        to_pgvector
+    )
+    from local_index import StrategyIndex, KB_COLUMNS, SYNC_COLUMNS, KB_PAGE_SIZE, SEARCH_MODES
+    from quantization import MappedFloat32Store
+    from snapshot import open_snapshot, write_snapshot
+    from shared_kb import SharedKBReader
+    from delta_sync import KBDeltaSync
+    from index_registry import IndexRegistry
+    from lexical import LexicalIndex
+    from hybrid import HybridRetriever
+    from reranker import Reranker, SELECTION_WEIGHTS, SUCCESS_WEIGHTS, MATCH_WEIGHTS, features_from_strategies
+    from session import RunSession
+    from change_detection import SituationChangeDetector
+    from prefetch import TransitionTable, HISTORY_LIMIT
+    from semantic_cache import SemanticResponseCache, situation_vector
+    from adaptation import AdaptationStats, adapt_strategy_text
+    from write_behind import WriteBehindQueue
+    from spool import RecordSpool, SpoolDrainer
+    from pending import PendingExecutionStore, PENDING_TTL_SECONDS, MAX_PENDING_EXECUTIONS, CLOSE_BATCH_SIZE
+    from assessment import (
+        TelemetryTrace,
+        METRICS,
+        BEFORE_WINDOW_SECONDS,
+        AFTER_DELAY_SECONDS,
+        AFTER_WINDOW_SECONDS,
+        trace_arrays,
+        before_after,
+        score_executions,
+        outcome_metrics
+    )
+    from bandit import StrategyBandit, context_bucket, execution_bucket, CHECKPOINT_INTERVAL_SECONDS
+    from rollups import RollupJob, Watermark, PERIODS, ROLLUP_INTERVAL_SECONDS
 
 
 class CoachRAGEngine:
@@ -77,7 +154,28 @@ class CoachRAGEngine:
     def __init__(
         self,
         supabase_url: Optional[str] = None,
-        supabase_anon_key: Optional[str] = None
+        supabase_anon_key: Optional[str] = None,
+        search_mode: str = "exact",
+        ann_ef_search: Optional[int] = None,
+        index_quantization: Optional[str] = None,
+        kb_snapshot_path: Optional[str] = None,
+        shared_kb_name: Optional[str] = None,
+        hybrid_retrieval: bool = False,
+        max_candidates: int = 15,
+        selection_weights: Optional[Dict[str, float]] = None,
+        change_detection: Optional[str] = None,
+        change_thresholds: Optional[Dict[str, float]] = None,
+        speculative_prefetch: bool = False,
+        response_cache_radius: Optional[float] = None,
+        cascade_margin: Optional[float] = None,
+        write_behind: bool = False,
+        spool_path: Optional[str] = None,
+        pending_ttl: float = PENDING_TTL_SECONDS,
+        max_pending_executions: int = MAX_PENDING_EXECUTIONS,
+        close_unmeasured: bool = False,
+        bandit: Optional[str] = None,
+        bandit_per_user: bool = False,
+        worker_id: Optional[str] = None
     ):
         """
         Initialize the Coach RAG Engine.
@@ -88,12 +186,74 @@ class CoachRAGEngine:
         Args:
             supabase_url: Supabase project URL
             supabase_anon_key: Supabase anon key (for Edge Function auth)
+            search_mode: Vector search mode, "exact" or "two_stage"
+                (256-dim prefix prefilter + full-dimension rerank)
+            ann_ef_search: HNSW ef_search of the search RPCs (higher =
+                better recall, slower; migrations 011 and 014); None uses
+                the RPC default
+            index_quantization: Local index storage, None (float32),
+                "int8" or "float16"; the top candidates are reranked
+                exactly from float32 rows in a memory-mapped file
+            kb_snapshot_path: KB snapshot file to mmap as the local index
+                (defaults to COACH_RAG_KB_SNAPSHOT)
+            shared_kb_name: Host shared-memory KB to attach read-only
+                (defaults to COACH_RAG_SHARED_KB)
+            hybrid_retrieval: Fuse local BM25 and vector rankings (RRF)
+                when the local index is loaded
+            max_candidates: Strategies retrieved for LLM condition matching
+                (fewer = smaller prompts)
+            selection_weights: Reranker weights for no-LLM strategy
+                selection (defaults to SELECTION_WEIGHTS)
+            change_detection: Suppress strategy calls for a run while the
+                situation is unchanged, returning the last strategy
+                ("cached") or an empty "hold" result; None disables
+            change_thresholds: Metric deltas that count as a change
+                (defaults to pace 0.15 min/km, HR 5 BPM, zone 1)
+            speculative_prefetch: In run sessions, precompute strategies
+                for the likely next situations between ticks
+            response_cache_radius: Reuse strategy outputs across runners in
+                nearly the same situation (max cosine distance between
+                situation vectors, e.g. 0.02); None disables
+            cascade_margin: Selection score lead of the top candidate over
+                the runner-up that skips the LLM: the KB text is served with
+                a personality opener / closer instead (e.g. CASCADE_MARGIN;
+                one extra matching tag adds 0.1). Never used with injury
+                risk or recovery needed. None (default) always calls the LLM
+            write_behind: Queue execution / outcome records and write them
+                in bulk in the background (requires record_strategy_batch_kb,
+                migration 006)
+            spool_path: SQLite file that keeps execution / outcome records
+                while Supabase is unreachable, replayed in the background
+                (defaults to COACH_RAG_SPOOL)
+            pending_ttl: Seconds an execution waits for its outcome before
+                it is evicted from memory
+            max_pending_executions: Executions kept waiting for an outcome
+                (oldest evicted first)
+            close_unmeasured: Close evicted executions in the database as
+                unmeasured, in batches (requires migration 006)
+            bandit: Rank by an in-process Beta posterior per (strategy,
+                situation bucket) updated from outcomes, "thompson"
+                (sampled) or "mean"; None uses the KB success_rate
+            bandit_per_user: Also keep per-user posteriors
+            worker_id: Bandit checkpoint row of this process (defaults to
+                COACH_RAG_WORKER_ID). Required with bandit: it must be
+                unique per process and stable across restarts and deploys
+                (e.g. a StatefulSet pod name or "<host>-<slot>")
         """
         
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode must be one of {SEARCH_MODES}")
+        
         # Load Supabase credentials (required for Edge Function)
         self.supabase_url = supabase_url or os.getenv("SUPABASE_URL", "")
         self.supabase_anon_key = supabase_anon_key or os.getenv("SUPABASE_ANON_KEY", "")
         
+        # Direct (non-Edge-Function) retrieval path credentials
+        self.supabase_key = self.supabase_anon_key
+        self.openai_key = os.getenv("OPENAI_API_KEY", "")
+        self.mem0_api_key = os.getenv("MEM0_API_KEY", "")
+        self.mem0_base_url = os.getenv("MEM0_BASE_URL", "https://api.mem0.ai/v1")
+        
         # Edge Function endpoint
         self.edge_function_url = f"{self.supabase_url}/functions/v1/coach-rag-strategy"
         
@@ -105,8 +265,104 @@ class CoachRAGEngine:
         self._cache_ttl = 300  # 5 minutes
         self._cache_timestamps: Dict[str, datetime] = {}
         
-        # Execution tracking (for self-learning)
-        self._pending_executions: Dict[str, StrategyExecution] = {}
+        # Execution tracking (for self-learning), bounded and TTL-evicted
+        self.close_unmeasured = close_unmeasured
+        self._pending_executions = PendingExecutionStore(
+            pending_ttl,
+            max_pending_executions,
+            keep_evicted=close_unmeasured
+        )
+        
+        # Write-behind execution / outcome recording (bulk RPC)
+        self._write_queue: Optional[WriteBehindQueue] = None
+        if write_behind:
+            self._write_queue = WriteBehindQueue(self._write_or_spool_batch)
+        
+        # Durable local spool for writes that fail (replayed when back online)
+        self._spool: Optional[RecordSpool] = None
+        self._spool_drainer: Optional[SpoolDrainer] = None
+        spool_path = spool_path or os.getenv("COACH_RAG_SPOOL")
+        if spool_path:
+            self._spool = RecordSpool(spool_path)
+            self._spool_drainer = SpoolDrainer(self._spool, self._write_record_batch)
+            pending = len(self._spool)
+            if pending:
+                print(f"   📦 Record spool has {pending} records to replay")
+        
+        # Local KB index (vector search without the RPC round trip)
+        self.search_mode = search_mode
+        self.ann_ef_search = ann_ef_search
+        self.index_quantization = index_quantization
+        self._local_index: Optional[StrategyIndex] = None
+        self._kb_sync: Optional[KBDeltaSync] = None
+        
+        # Embedding versions (double-buffered rebuilds, shadow comparison)
+        self.embedding_model = EMBEDDING_MODEL
+        self._index_registry = IndexRegistry()
+        
+        # BM25 index over KB text (no-embedding retrieval path)
+        self._lexical_index: Optional[LexicalIndex] = None
+        self._lexical_load_attempted = False
+        
+        # Retrieval breadth and lexical + vector rank fusion
+        self.max_candidates = max_candidates
+        self.hybrid_retrieval = hybrid_retrieval
+        self._hybrid = HybridRetriever(max_candidates=max_candidates)
+        
+        # Vectorized rerankers shared by the selection paths
+        self._selection_reranker = Reranker(selection_weights or SELECTION_WEIGHTS)
+        self._success_reranker = Reranker(SUCCESS_WEIGHTS)
+        self._match_reranker = Reranker(MATCH_WEIGHTS, tiebreak=("success_rate", "times_used"))
+        
+        # Selection cascade: local template adaptation for clear winners
+        self.cascade_margin = cascade_margin
+        self._adaptation_stats = AdaptationStats()
+        
+        # Online strategy bandit (outcomes feed ranking without KB re-reads)
+        self._bandit: Optional[StrategyBandit] = None
+        self._bandit_task: Optional[asyncio.Task] = None
+        self.worker_id = worker_id or os.getenv("COACH_RAG_WORKER_ID")
+        if bandit:
+            # Hostnames are shared by workers on one host and change per
+            # container deploy: rows would be overwritten or orphaned
+            if not self.worker_id:
+                raise ValueError("bandit requires a stable worker_id (or COACH_RAG_WORKER_ID)")
+            self._bandit = StrategyBandit(mode=bandit, per_user=bandit_per_user)
+        
+        # Streaming per-period effectiveness rollups (start_effectiveness_rollups)
+        self._rollup_job: Optional[RollupJob] = None
+        
+        # Situation change detection (skip redundant scheduled calls)
+        self._change_detector: Optional[SituationChangeDetector] = None
+        if change_detection:
+            self._change_detector = SituationChangeDetector(change_thresholds, mode=change_detection)
+        
+        # Similarity-keyed cache of final strategy outputs
+        self._response_cache: Optional[SemanticResponseCache] = None
+        if response_cache_radius is not None:
+            self._response_cache = SemanticResponseCache(radius=response_cache_radius)
+        
+        # Open run sessions (per-run prefetched retrieval context)
+        self._sessions: Dict[str, RunSession] = {}
+        
+        # User top strategies per run (read once per run, oldest runs dropped)
+        self._user_top_cache: Dict[str, List[Dict[str, Any]]] = {}
+        self.user_top_cache_runs = 1024
+        
+        # Situation transitions for speculative prefetch (loaded on first run)
+        self.speculative_prefetch = speculative_prefetch
+        self._transitions: Optional[TransitionTable] = None
+        
+        # Zero-copy cold start from a KB snapshot file
+        kb_snapshot_path = kb_snapshot_path or os.getenv("COACH_RAG_KB_SNAPSHOT")
+        if kb_snapshot_path:
+            self.load_kb_snapshot(kb_snapshot_path)
+        
+        # Host-level shared KB published by a loader process
+        self._shared_kb: Optional[SharedKBReader] = None
+        shared_kb_name = shared_kb_name or os.getenv("COACH_RAG_SHARED_KB")
+        if shared_kb_name:
+            self.attach_shared_kb(shared_kb_name)
         
         print("🏃 Coach RAG Engine initialized (using secure Edge Function)")
     
@@ -118,8 +374,29 @@ class CoachRAGEngine:
     
     async def close(self):
         """Close the HTTP client."""
+        for session in list(self._sessions.values()):
+            await session.end_run()
+        if self._kb_sync is not None:
+            await self._kb_sync.stop()
+        if self.close_unmeasured:
+            await self._close_unmeasured_executions()
+        if self._bandit_task is not None:
+            self._bandit_task.cancel()
+            self._bandit_task = None
+        if self._bandit is not None and self._bandit.dirty:
+            await self.save_bandit_checkpoint()
+        if self._rollup_job is not None:
+            await self._rollup_job.stop()
+        if self._write_queue is not None:
+            await self._write_queue.close()
+        if self._spool_drainer is not None:
+            await self._spool_drainer.stop()
+            self._spool.close()
         if self._client and not self._client.is_closed:
             await self._client.aclose()
+        if self._shared_kb is not None:
+            self._local_index = None
+            self._shared_kb.close()
     
     # ========================================================================
     # KB EMBEDDING GENERATION (for KB initialization/evolution)
@@ -127,14 +404,25 @@ class CoachRAGEngine:
     
     async def generate_and_store_kb_embeddings(
         self,
-        strategy_id: Optional[str] = None
+        strategy_id: Optional[str] = None,
+        model: Optional[str] = None,
+        version: Optional[str] = None
     ) -> int:
         """
         Generate and store embeddings for KB strategies.
         If strategy_id is None, generates for all strategies missing embeddings.
         
+        With a version, embeds every active strategy (or strategy_id) into
+        that embedding set instead of the live column; the live search is
+        untouched until activate_kb_index_version(version).
+        
         Note: Requires OPENAI_API_KEY in environment for embedding generation.
         
+        Args:
+            strategy_id: Single strategy to embed (optional)
+            model: Embedding model (defaults to the engine's current model)
+            version: Embedding set to write (optional)
+        
         Returns:
             Number of embeddings generated
         """
@@ -150,9 +438,13 @@ class CoachRAGEngine:
         try:
             client = await self._get_client()
             
+            model = model or self.embedding_model
+            
             # Get strategies that need embeddings
             if strategy_id:
                 params = {"id": f"eq.{strategy_id}"}
+            elif version:
+                params = {"is_active": "eq.true"}
             else:
                 params = {"strategy_embedding": "is.null", "is_active": "eq.true"}
             
@@ -177,6 +469,8 @@ class CoachRAGEngine:
             print(f"   🔄 Generating embeddings for {len(strategies)} strategies...")
             
             count = 0
+            batch_ids: List[str] = []
+            batch_embeddings: List[str] = []
             for strategy in strategies:
                 # Build embedding text: title + conditions_to_use + strategy_text
                 embedding_text = f"""
@@ -190,29 +484,21 @@ class CoachRAGEngine:
                 """.strip()
                 
                 # Generate embedding using OpenAI (from env)
-                embedding = await self._generate_embedding_with_key(embedding_text, openai_key)
+                embedding = await self._generate_embedding_with_key(embedding_text, openai_key, model)
                 
-                if embedding:
-                    # Store embedding via RPC
-                    update_response = await client.post(
-                        f"{self.supabase_url}/rest/v1/rpc/update_strategy_embedding_kb",
-                        headers={
-                            "apikey": self.supabase_anon_key,
-                            "Authorization": f"Bearer {self.supabase_anon_key}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "p_strategy_id": strategy['id'],
-                            "p_embedding": embedding
-                        }
-                    )
-                    
-                    if update_response.status_code == 200:
-                        count += 1
-                        if count % 5 == 0:
-                            print(f"   ✅ Generated {count}/{len(strategies)} embeddings...")
-                    else:
-                        print(f"   ⚠️ Failed to store embedding for {strategy['id']}")
+                if embedding is not None:
+                    batch_ids.append(strategy['id'])
+                    batch_embeddings.append(to_pgvector(embedding))
+                else:
+                    print(f"   ⚠️ Failed to generate embedding for {strategy['id']}")
+                
+                if len(batch_ids) >= EMBEDDING_WRITE_BATCH:
+                    count += await self._store_embedding_batch(batch_ids, batch_embeddings, model, version)
+                    batch_ids, batch_embeddings = [], []
+                    print(f"   ✅ Stored {count}/{len(strategies)} embeddings...")
+            
+            if batch_ids:
+                count += await self._store_embedding_batch(batch_ids, batch_embeddings, model, version)
             
             print(f"   ✅ Generated {count} embeddings successfully")
             return count
@@ -223,6 +509,513 @@ class CoachRAGEngine:
             traceback.print_exc()
             return 0
     
+    async def _store_embedding_batch(
+        self,
+        strategy_ids: List[str],
+        embeddings: List[str],
+        model: str,
+        version: Optional[str] = None
+    ) -> int:
+        """
+        Store many embeddings (pgvector literals) with one bulk RPC:
+        the live column, or a versioned set.
+        
+        Returns:
+            Number of strategies written
+        """
+        if version:
+            rpc_name = "store_strategy_embedding_versions"
+            payload = {
+                "p_version": version,
+                "p_model": model,
+                "p_strategy_ids": strategy_ids,
+                "p_embeddings": embeddings
+            }
+        else:
+            rpc_name = "update_strategy_embeddings_kb"
+            payload = {
+                "p_strategy_ids": strategy_ids,
+                "p_embeddings": embeddings
+            }
+        
+        client = await self._get_client()
+        response = await client.post(
+            f"{self.supabase_url}/rest/v1/rpc/{rpc_name}",
+            headers={
+                "apikey": self.supabase_anon_key,
+                "Authorization": f"Bearer {self.supabase_anon_key}",
+                "Content-Type": "application/json"
+            },
+            json=payload
+        )
+        
+        if response.status_code != 200:
+            print(f"   ⚠️ Failed to store {len(strategy_ids)} embeddings: {response.status_code}")
+            return 0
+        return int(response.json() or 0)
+    
+    # ========================================================================
+    # LOCAL KB INDEX (in-process vector search)
+    # ========================================================================
+    
+    async def _fetch_kb_pages(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Fetch every coaching_strategies_kb row matching params.
+        
+        Keyset pagination on id: one GET is capped at PostgREST's max-rows.
+        Raises if fewer rows arrive than the first page counted (a max-rows
+        below KB_PAGE_SIZE), instead of returning a truncated KB.
+        """
+        
+        client = await self._get_client()
+        rows: List[Dict[str, Any]] = []
+        expected = None
+        last_id = None
+        
+        while True:
+            headers = {
+                "apikey": self.supabase_anon_key,
+                "Authorization": f"Bearer {self.supabase_anon_key}"
+            }
+            if expected is None:
+                headers["Prefer"] = "count=exact"
+            
+            page_params = dict(params, order="id.asc", limit=str(KB_PAGE_SIZE))
+            if last_id is not None:
+                page_params["id"] = f'gt."{last_id}"'
+            
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/coaching_strategies_kb",
+                headers=headers,
+                params=page_params
+            )
+            response.raise_for_status()
+            page = response.json()
+            
+            if expected is None:
+                # Content-Range: 0-499/1234 (total after the slash)
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                expected = int(total) if total.isdigit() else 0
+            
+            rows.extend(page)
+            if len(page) < KB_PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+        
+        if len(rows) < expected:
+            raise RuntimeError(
+                f"Short KB read: {len(rows)} of {expected} rows "
+                f"(PostgREST max-rows below {KB_PAGE_SIZE}?)"
+            )
+        return rows
+    
+    async def _fetch_kb_rows(self, with_embeddings: bool = True) -> List[Dict[str, Any]]:
+        """
+        Fetch all active KB strategies (with embeddings) via PostgREST.
+        
+        Raises on a failed or short read; [] only if Supabase is not configured.
+        """
+        
+        if not self.supabase_url or not self.supabase_anon_key:
+            print("   ⚠️ Supabase not configured, KB not fetched")
+            return []
+        
+        return await self._fetch_kb_pages({
+            "select": ",".join(KB_COLUMNS + ("updated_at", "embedding_hash", "strategy_embedding")),
+            "is_active": "eq.true",
+            "strategy_embedding": "not.is.null"
+        } if with_embeddings else {
+            "select": ",".join(KB_COLUMNS + ("updated_at",)),
+            "is_active": "eq.true"
+        })
+    
+    async def _fetch_kb_changes(
+        self,
+        watermark: Optional[str],
+        last_id: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch one page of KB rows changed after (watermark, last_id).
+        
+        Keyset pagination on (updated_at, id); embeddings are not selected.
+        """
+        
+        params = {
+            "select": ",".join(KB_COLUMNS + SYNC_COLUMNS),
+            "order": "updated_at.asc,id.asc",
+            "limit": str(limit)
+        }
+        if watermark and last_id:
+            params["or"] = f'(updated_at.gt."{watermark}",and(updated_at.eq."{watermark}",id.gt."{last_id}"))'
+        elif watermark:
+            params["updated_at"] = f"gt.{watermark}"
+        
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.supabase_url}/rest/v1/coaching_strategies_kb",
+            headers={
+                "apikey": self.supabase_anon_key,
+                "Authorization": f"Bearer {self.supabase_anon_key}"
+            },
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def _fetch_kb_embeddings(self, strategy_ids: List[str]) -> Dict[str, Any]:
+        """Fetch strategy_embedding for the given KB ids."""
+        
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.supabase_url}/rest/v1/coaching_strategies_kb",
+            headers={
+                "apikey": self.supabase_anon_key,
+                "Authorization": f"Bearer {self.supabase_anon_key}"
+            },
+            params={
+                "select": "id,strategy_embedding",
+                "id": "in.(" + ",".join(f'"{sid}"' for sid in strategy_ids) + ")",
+                "strategy_embedding": "not.is.null"
+            }
+        )
+        response.raise_for_status()
+        return {row["id"]: row["strategy_embedding"] for row in response.json()}
+    
+    async def _kb_index_from_rows(self, rows: List[Dict[str, Any]], quantization: Optional[str] = None) -> StrategyIndex:
+        """Index KB rows, tagged with the active embedding set's version and model."""
+        index = StrategyIndex.from_kb_rows(rows, quantization=quantization, exact_rerank=True)
+        active_set = await self._fetch_active_embedding_set()
+        if active_set:
+            index.embedding_version = active_set["version"]
+            index.embedding_model = active_set["model"]
+        return index
+    
+    async def load_local_index(self) -> int:
+        """
+        Load active KB strategies with embeddings into the local index.
+        
+        Once loaded, vector retrieval runs in-process (search_mode decides
+        exact vs two-stage) instead of calling semantic_search_strategies_kb.
+        
+        Returns:
+            Number of strategies indexed
+        """
+        
+        try:
+            rows = await self._fetch_kb_rows()
+            if not rows:
+                print("   ⚠️ No embedded KB strategies to index")
+                return 0
+            
+            self._local_index = await self._kb_index_from_rows(rows, quantization=self.index_quantization)
+            print(f"   ✅ Local index loaded: {len(self._local_index)} strategies ({self.search_mode} search, {self._local_index.nbytes / 1024:.0f} KB)")
+            return len(self._local_index)
+        
+        except Exception as e:
+            print(f"   ❌ Local index load error: {e}")
+            return 0
+    
+    def load_kb_snapshot(self, path: str) -> int:
+        """
+        Memory-map a KB snapshot file as the local index (zero-copy).
+        
+        Returns:
+            Number of strategies indexed
+        """
+        try:
+            self._local_index = open_snapshot(path)
+            self.embedding_model = self._local_index.embedding_model
+            if self.index_quantization is not None:
+                # Quantized scan, exact rerank from the mapped float32 rows
+                index = self._local_index
+                index.quantize(self.index_quantization, rerank_hook=MappedFloat32Store(index.embeddings))
+            print(f"   ✅ KB snapshot mapped: {len(self._local_index)} strategies from {path}")
+            return len(self._local_index)
+        
+        except Exception as e:
+            print(f"   ❌ KB snapshot load error: {e}")
+            return 0
+    
+    def attach_shared_kb(self, name: str) -> int:
+        """
+        Attach read-only to a shared-memory KB published on this host.
+        
+        The local index follows the publisher's atomic swaps on refresh.
+        
+        Returns:
+            Number of strategies indexed (0 if nothing published yet)
+        """
+        try:
+            self._shared_kb = SharedKBReader(name)
+            self._refresh_shared_kb()
+            count = len(self._local_index) if self._local_index is not None else 0
+            print(f"   ✅ Shared KB attached: {name} v{self._shared_kb.version} ({count} strategies)")
+            return count
+        
+        except Exception as e:
+            print(f"   ❌ Shared KB attach error: {e}")
+            self._shared_kb = None
+            return 0
+    
+    def _refresh_shared_kb(self):
+        """Swap to the latest shared KB version, if one was published."""
+        if self._shared_kb is not None and self._shared_kb.refresh():
+            self._local_index = self._shared_kb.index
+            self.embedding_model = self._local_index.embedding_model
+    
+    async def load_lexical_index(self) -> int:
+        """
+        Build the BM25 index from KB text (no embeddings needed).
+        
+        Only needed without a local vector index; otherwise the lexical
+        index is built over the local index's rows on first use.
+        
+        Returns:
+            Number of strategies indexed
+        """
+        self._lexical_load_attempted = True
+        
+        try:
+            rows = await self._fetch_kb_rows(with_embeddings=False)
+        
+        except Exception as e:
+            print(f"   ❌ KB fetch error: {e}")
+            return 0
+        
+        if not rows:
+            return 0
+        
+        self._lexical_index = LexicalIndex(rows)
+        print(f"   ✅ Lexical index loaded: {len(self._lexical_index)} strategies, {len(self._lexical_index.vocab)} terms")
+        return len(self._lexical_index)
+    
+    def _get_lexical_index(self) -> Optional[LexicalIndex]:
+        """BM25 index, (re)built over the local index when that changed."""
+        index = self._local_index
+        lexical = self._lexical_index
+        # Delta sync edits text in place: the generation catches that
+        if index is not None and (
+            lexical is None
+            or lexical.filter_index is not index
+            or len(lexical) != len(index)
+            or lexical.text_generation != index.text_generation
+        ):
+            self._lexical_index = lexical = LexicalIndex.from_strategy_index(index)
+        return lexical
+    
+    def start_kb_sync(self, interval: float = 30.0) -> Optional[KBDeltaSync]:
+        """
+        Start the background delta sync that keeps the local index fresh.
+        
+        Stats (success_rate, times_used, avg_effectiveness_score), new
+        strategies and deactivations are applied in place, and a newly
+        activated embedding version is rebuilt and swapped in. Not used with
+        a shared-memory KB: there the loader process syncs and republishes.
+        
+        Returns:
+            The running KBDeltaSync (metrics via kb_sync_metrics())
+        """
+        if self._shared_kb is not None:
+            print("   ⚠️ Shared KB attached, delta sync runs in the publisher")
+            return None
+        
+        if self._kb_sync is None:
+            self._kb_sync = KBDeltaSync(
+                self._fetch_kb_changes,
+                self._fetch_kb_embeddings,
+                lambda: self._local_index,
+                interval=interval,
+                before_cycle=self._follow_active_embedding_set
+            )
+        self._kb_sync.start()
+        return self._kb_sync
+    
+    def kb_sync_metrics(self) -> Dict[str, Any]:
+        """Delta sync lag and throughput metrics (empty if not started)."""
+        return self._kb_sync.metrics() if self._kb_sync is not None else {}
+    
+    async def export_kb_snapshot(self, path: str) -> int:
+        """
+        Fetch the KB and write it as a snapshot file for fast worker startup.
+        
+        Returns:
+            Snapshot size in bytes (0 on failure)
+        """
+        try:
+            rows = await self._fetch_kb_rows()
+            if not rows:
+                print("   ⚠️ No embedded KB strategies to export")
+                return 0
+            
+            # Workers take their query embedding model from the header
+            return write_snapshot(await self._kb_index_from_rows(rows), path)
+        
+        except Exception as e:
+            print(f"   ❌ KB snapshot export error: {e}")
+            return 0
+    
+    # ========================================================================
+    # VERSIONED KB INDEXES (double-buffered rebuilds)
+    # ========================================================================
+    
+    async def _fetch_active_embedding_set(self) -> Optional[Dict[str, Any]]:
+        """Active row of kb_embedding_sets (None if there is none)."""
+        
+        try:
+            client = await self._get_client()
+            
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/kb_embedding_sets",
+                headers={
+                    "apikey": self.supabase_anon_key,
+                    "Authorization": f"Bearer {self.supabase_anon_key}"
+                },
+                params={"select": "version,model", "status": "eq.active", "limit": "1"}
+            )
+            
+            if response.status_code == 200 and response.json():
+                return response.json()[0]
+        
+        except Exception as e:
+            print(f"   ⚠️ Embedding set lookup error: {e}")
+        
+        return None
+    
+    async def _fetch_kb_embedding_set(self, version: str) -> List[Dict[str, Any]]:
+        """Fetch active KB rows with one embedding version's vectors."""
+        
+        rows = []
+        for row in await self._fetch_kb_pages({
+            "select": ",".join(KB_COLUMNS + ("updated_at", "coaching_strategy_embeddings(embedding)")),
+            "is_active": "eq.true",
+            "coaching_strategy_embeddings.embedding_version": f"eq.{version}"
+        }):
+            vectors = row.pop("coaching_strategy_embeddings", None) or []
+            if vectors:
+                row["strategy_embedding"] = vectors[0]["embedding"]
+                rows.append(row)
+        return rows
+    
+    def _register_serving_index(self):
+        """Make sure the registry's active entry is the index now serving."""
+        index = self._local_index
+        if index is not None and self._index_registry.active is not index:
+            self._index_registry.add(index.embedding_version or "live", index, active=True)
+    
+    async def build_kb_index_version(self, version: str, model: Optional[str] = None) -> int:
+        """
+        Build the local index for an embedding version in the background.
+        
+        The current index keeps serving; compare with
+        compare_kb_index_versions() and flip with activate_kb_index_version().
+        
+        Args:
+            version: Embedding set (see generate_and_store_kb_embeddings)
+            model: Model that produced it (defaults to the engine's model)
+        
+        Returns:
+            Number of strategies indexed
+        """
+        try:
+            rows = await self._fetch_kb_embedding_set(version)
+            if not rows:
+                print(f"   ⚠️ Embedding version {version} has no vectors")
+                return 0
+            
+            index = await self._index_registry.build(
+                version,
+                rows,
+                embedding_model=model or self.embedding_model,
+                quantization=self.index_quantization,
+                exact_rerank=True
+            )
+            print(f"   ✅ Index {version} built: {len(index)} strategies ({index.embedding_model})")
+            return len(index)
+        
+        except Exception as e:
+            print(f"   ❌ Index build error ({version}): {e}")
+            return 0
+    
+    async def compare_kb_index_versions(self, version: str, k: int = 15, sample: int = 50) -> Dict[str, Any]:
+        """
+        Shadow-run recent live queries against the serving index and version.
+        
+        Returns:
+            Report with recall@k of the new version against the current one
+            and p50/p99 latency of both (plus deltas)
+        """
+        self._register_serving_index()
+        
+        async def embed(text: str, model: str) -> Optional[np.ndarray]:
+            return await self._generate_embedding_with_key(text, self.openai_key, model)
+        
+        report = await self._index_registry.compare(version, embed, k=k, sample=sample, mode=self.search_mode)
+        recall = report["recall_at_k"]
+        print(
+            f"   📊 Shadow {version} vs {report['active_version']}: "
+            f"recall@{k} {recall if recall is None else round(recall, 3)}, "
+            f"p50 {report['p50_delta_ms']:+.2f} ms, p99 {report['p99_delta_ms']:+.2f} ms "
+            f"({report['queries']} queries)"
+        )
+        return report
+    
+    async def activate_kb_index_version(self, version: str, min_recall: Optional[float] = None) -> bool:
+        """
+        Activate an embedding version: server-side flip, then local pointer swap.
+        
+        Args:
+            version: A version built with build_kb_index_version()
+            min_recall: Refuse unless the last shadow report meets this recall
+        
+        Returns:
+            True if activated
+        """
+        try:
+            if min_recall is not None:
+                self._index_registry.check_recall(version, min_recall)
+            
+            client = await self._get_client()
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/activate_kb_embedding_set",
+                headers={
+                    "apikey": self.supabase_anon_key,
+                    "Authorization": f"Bearer {self.supabase_anon_key}",
+                    "Content-Type": "application/json"
+                },
+                json={"p_version": version}
+            )
+            response.raise_for_status()
+            
+            self._swap_kb_index_version(version)
+            return True
+        
+        except Exception as e:
+            print(f"   ❌ Index activation error ({version}): {e}")
+            return False
+    
+    def _swap_kb_index_version(self, version: str):
+        """Point searches (and query embeddings) at a built version."""
+        self._register_serving_index()
+        self._local_index = self._index_registry.activate(version)
+        self.embedding_model = self._local_index.embedding_model
+        self._strategy_cache.clear()
+        if self._response_cache is not None:
+            self._response_cache.clear()
+        print(f"   🔀 Local index swapped to {version} ({self.embedding_model})")
+    
+    async def _follow_active_embedding_set(self):
+        """Rebuild and swap when another process activated a new version."""
+        if self._local_index is None:
+            return
+        
+        active_set = await self._fetch_active_embedding_set()
+        if not active_set or active_set["version"] == self._local_index.embedding_version:
+            return
+        
+        if await self.build_kb_index_version(active_set["version"], active_set["model"]):
+            self._swap_kb_index_version(active_set["version"])
+    
     # ========================================================================
     # MAIN API: Get Adaptive Strategy
     # ========================================================================
@@ -262,6 +1055,19 @@ class CoachRAGEngine:
         )
         print(f"   → Situation: {context.pace_trend.value} pace, {context.hr_trend.value} HR, {context.fatigue_level.value} fatigue")
         
+        # Unchanged situation for this run: skip the Edge Function call
+        suppressed = self._check_situation_change(run_id, context, performance_analysis)
+        if suppressed is not None:
+            return suppressed
+        
+        # Nearly the same situation served recently (any runner)
+        cached = self._lookup_cached_response(context, performance_analysis)
+        if cached is not None:
+            # On the request path: never wait for write-behind queue space
+            await self._record_execution(user_id, run_id, cached, context, performance_analysis, block=False)
+            self._record_delivered(run_id, context, performance_analysis, cached)
+            return cached
+        
         # 2. Call Edge Function to get strategy (secrets used internally)
         try:
             client = await self._get_client()
@@ -298,6 +1104,8 @@ class CoachRAGEngine:
                 )
                 
                 print(f"   → Strategy: {adaptive_strategy.strategy_name} (confidence: {adaptive_strategy.confidence_score:.0%})")
+                self._record_delivered(run_id, context, performance_analysis, adaptive_strategy)
+                self._cache_response(context, performance_analysis, adaptive_strategy)
                 return adaptive_strategy
             else:
                 error_text = await response.aread()
@@ -316,6 +1124,189 @@ class CoachRAGEngine:
                 priority_tags=context.situation_tags[:3]
             )
     
+    # ========================================================================
+    # SITUATION CHANGE DETECTION
+    # ========================================================================
+    
+    def _check_situation_change(
+        self,
+        run_id: Optional[str],
+        context: SituationContext,
+        perf: PerformanceAnalysis
+    ) -> Optional[AdaptiveStrategyOutput]:
+        """Suppressed result if the run's situation is unchanged (else None)."""
+        if self._change_detector is None or not run_id:
+            return None
+        
+        result = self._change_detector.check(run_id, context, perf)
+        if result is not None:
+            print(f"   ⏸️ Situation unchanged, {self._change_detector.mode} result")
+        return result
+    
+    def _record_delivered(
+        self,
+        run_id: Optional[str],
+        context: SituationContext,
+        perf: PerformanceAnalysis,
+        strategy: AdaptiveStrategyOutput
+    ):
+        """Make a delivered strategy the run's change-detection baseline."""
+        if self._change_detector is not None and run_id:
+            self._change_detector.record(run_id, context, perf, strategy)
+    
+    def change_detection_metrics(self) -> Dict[str, Any]:
+        """Suppression counters (empty if change detection is off)."""
+        return self._change_detector.metrics() if self._change_detector is not None else {}
+    
+    # ========================================================================
+    # SEMANTIC RESPONSE CACHE
+    # ========================================================================
+    
+    def _response_scope(self, context: SituationContext, perf: PerformanceAnalysis) -> Tuple[str, str, str]:
+        return (
+            context.personality.value,
+            context.energy_level.value,
+            self._get_distance_category(perf.target_distance)
+        )
+    
+    def _lookup_cached_response(
+        self,
+        context: SituationContext,
+        perf: PerformanceAnalysis
+    ) -> Optional[AdaptiveStrategyOutput]:
+        """Cached output for a nearly identical situation, if any."""
+        if self._response_cache is None:
+            return None
+        
+        cached = self._response_cache.lookup(self._response_scope(context, perf), situation_vector(context, perf))
+        if cached is not None:
+            print(f"   ♻️ Semantic cache hit: {cached.strategy_name}")
+        return cached
+    
+    def _cache_response(
+        self,
+        context: SituationContext,
+        perf: PerformanceAnalysis,
+        strategy: AdaptiveStrategyOutput
+    ):
+        """Remember a delivered output for similar situations."""
+        if self._response_cache is not None:
+            self._response_cache.store(self._response_scope(context, perf), situation_vector(context, perf), strategy)
+    
+    def response_cache_metrics(self) -> Dict[str, Any]:
+        """Semantic cache hit rate and staleness (empty if disabled)."""
+        return self._response_cache.metrics() if self._response_cache is not None else {}
+    
+    # ========================================================================
+    # RUN SESSIONS (per-run prefetched context)
+    # ========================================================================
+    
+    async def start_run(
+        self,
+        user_id: str,
+        run_id: str,
+        target_distance: float,
+        personality: CoachPersonality,
+        energy: CoachEnergy,
+        runner_level: Optional[str] = None
+    ) -> RunSession:
+        """
+        Start a run session.
+        
+        Resolves the distance category and prefetches the user's top
+        strategies, Mem0 memories and the KB partition concurrently, once
+        (the partition waits for the first tick without runner_level).
+        Per-tick session.get_adaptive_strategy() calls then run the direct
+        retrieval path with that context; session.end_run() flushes pending
+        writes (and the write-behind queue) and releases it.
+        
+        Args:
+            user_id: User UUID
+            run_id: Run UUID
+            target_distance: Target distance in meters
+            personality: Coach personality
+            energy: Coach energy level
+            runner_level: Runner level (resolved on the first tick if None)
+            
+        Returns:
+            The prefetched RunSession
+        """
+        previous = self._sessions.get(run_id)
+        if previous is not None:
+            await previous.end_run()
+        
+        session = RunSession(self, user_id, run_id, target_distance, personality, energy, runner_level)
+        await session.prefetch()
+        self._sessions[run_id] = session
+        return session
+    
+    def get_run_session(self, run_id: str) -> Optional[RunSession]:
+        """Open session for a run, if any."""
+        return self._sessions.get(run_id)
+    
+    async def _fetch_execution_history(self, limit: int = HISTORY_LIMIT) -> List[Dict[str, Any]]:
+        """Recent strategy_executions (run, time, context) for the transition table."""
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.supabase_url}/rest/v1/strategy_executions",
+            headers={
+                "apikey": self.supabase_key,
+                "Authorization": f"Bearer {self.supabase_key}"
+            },
+            params={
+                "select": "run_id,executed_at,execution_context",
+                "run_id": "not.is.null",
+                "order": "executed_at.desc",
+                "limit": str(limit)
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def load_transition_table(self, limit: int = HISTORY_LIMIT) -> TransitionTable:
+        """
+        Build the situation transition table from execution history.
+        
+        Without history (or Supabase), only the escalation prior is used.
+        
+        Returns:
+            The engine's TransitionTable
+        """
+        rows = []
+        if self.supabase_url and self.supabase_key:
+            try:
+                rows = await self._fetch_execution_history(limit)
+            except Exception as e:
+                print(f"   ⚠️ Execution history fetch error: {e}")
+        
+        self._transitions = TransitionTable.from_executions(rows)
+        print(f"   ✅ Transition table: {self._transitions.runs} runs, {len(self._transitions.counts)} situations")
+        return self._transitions
+    
+    async def _get_transition_table(self) -> Optional[TransitionTable]:
+        """Transition table for speculative prefetch (None if disabled)."""
+        if not self.speculative_prefetch:
+            return None
+        if self._transitions is None:
+            await self.load_transition_table()
+        return self._transitions
+    
+    async def _prefetch_kb_partition(self, distance_category: str, runner_level: str) -> List[Dict[str, Any]]:
+        """
+        KB fallback candidates for a run's distance.
+        
+        Without a local vector index, also builds the BM25 index so
+        no-embedding ticks stay local.
+        """
+        if not self.supabase_url or not self.supabase_key:
+            return []
+        
+        if self._local_index is None and not self._lexical_load_attempted:
+            await self.load_lexical_index()
+        
+        client = await self._get_client()
+        return await self._query_kb_fallback(client, distance_category, runner_level, self.max_candidates)
+    
     # ========================================================================
     # SITUATION CONTEXT BUILDER
     # ========================================================================
@@ -390,7 +1381,10 @@ class CoachRAGEngine:
         self,
         context: SituationContext,
         user_id: str,
-        performance_analysis: PerformanceAnalysis
+        performance_analysis: PerformanceAnalysis,
+        distance_category: Optional[str] = None,
+        runner_level: Optional[str] = None,
+        kb_fallback: Optional[List[Dict[str, Any]]] = None
     ) -> List[CoachingStrategy]:
         """
         Next-gen RAG retrieval using:
@@ -398,6 +1392,9 @@ class CoachRAGEngine:
         2. Distance + runner level filtering
         3. LLM-based condition matching (conditions_to_use / when_not_to_use)
         4. Success rate ordering (self-learning)
+        
+        Run sessions pass their resolved distance category / runner level and
+        prefetched KB partition (kb_fallback, used instead of the fallback query).
         """
         
         if not self.supabase_url or not self.supabase_key:
@@ -405,10 +1402,10 @@ class CoachRAGEngine:
             return self._get_fallback_strategies(context)
         
         # Determine distance category from target distance
-        distance_category = self._get_distance_category(performance_analysis.target_distance)
+        distance_category = distance_category or self._get_distance_category(performance_analysis.target_distance)
         
         # Determine runner level
-        runner_level = self._get_runner_level(performance_analysis)
+        runner_level = runner_level or self._get_runner_level(performance_analysis)
         
         # Build situation description for embedding generation
         situation_description = self._build_situation_description_for_kb(
@@ -419,28 +1416,84 @@ class CoachRAGEngine:
         # Generate embedding for current situation (vector search)
         situation_embedding = await self._generate_embedding(situation_description)
         
+        # Pick up a newer shared KB version (cheap control-block read)
+        self._refresh_shared_kb()
+        
         try:
             client = await self._get_client()
             
-            if situation_embedding:
+            async def query_fallback() -> List[Dict[str, Any]]:
+                if kb_fallback is not None:
+                    return list(kb_fallback)
+                return await self._query_kb_fallback(
+                    client, distance_category, runner_level, self.max_candidates
+                )
+            
+            if situation_embedding is not None and self._local_index is not None:
+                # Local vector search (no RPC round trip)
+                print(f"   🔍 Local {self.search_mode}{' hybrid' if self.hybrid_retrieval else ''} vector search: distance={distance_category}, level={runner_level}")
+                
+                # Keep recent queries for shadow runs of new embedding versions
+                self._index_registry.record_query(
+                    situation_description,
+                    distance=distance_category,
+                    runner_level=runner_level
+                )
+                
+                if self.hybrid_retrieval:
+                    # BM25 + vector reciprocal rank fusion, then success weighting
+                    kb_strategies = self._hybrid.search(
+                        self._local_index,
+                        self._get_lexical_index(),
+                        situation_embedding,
+                        situation_description,
+                        distance=distance_category,
+                        runner_level=runner_level,
+                        match_threshold=0.65,
+                        mode=self.search_mode
+                    )
+                else:
+                    kb_strategies = self._local_index.search(
+                        situation_embedding,
+                        distance=distance_category,
+                        runner_level=runner_level,
+                        match_threshold=0.65,
+                        match_count=self.max_candidates,
+                        mode=self.search_mode
+                    )
+                
+                if not kb_strategies:
+                    print(f"   ⚠️ No local vector matches above threshold, falling back to KB query")
+                    kb_strategies = await query_fallback()
+            elif situation_embedding is not None:
                 # NEXT-GEN: Vector-based semantic search
                 print(f"   🔍 Vector search: distance={distance_category}, level={runner_level}")
                 
+                # Two-stage: 256-dim prefix prefilter, full-precision rerank
+                rpc_name = (
+                    "semantic_search_strategies_kb_two_stage"
+                    if self.search_mode == "two_stage"
+                    else "semantic_search_strategies_kb"
+                )
+                payload = {
+                    "p_situation_embedding": to_pgvector(situation_embedding),
+                    "p_distance": distance_category,
+                    "p_runner_level": runner_level,
+                    "p_strategy_type": None,  # Get both core and micro
+                    "p_match_threshold": 0.65,  # 65% similarity threshold
+                    "p_match_count": self.max_candidates  # Top candidates for LLM refinement
+                }
+                if self.ann_ef_search is not None:
+                    payload["p_ef_search"] = self.ann_ef_search
+                
                 response = await client.post(
-                    f"{self.supabase_url}/rest/v1/rpc/semantic_search_strategies_kb",
+                    f"{self.supabase_url}/rest/v1/rpc/{rpc_name}",
                     headers={
                         "apikey": self.supabase_key,
                         "Authorization": f"Bearer {self.supabase_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
-                        "p_situation_embedding": situation_embedding,
-                        "p_distance": distance_category,
-                        "p_runner_level": runner_level,
-                        "p_strategy_type": None,  # Get both core and micro
-                        "p_match_threshold": 0.65,  # 65% similarity threshold
-                        "p_match_count": 15  # Get top 15 for LLM refinement
-                    }
+                    json=payload
                 )
                 
                 if response.status_code == 200:
@@ -451,20 +1504,30 @@ class CoachRAGEngine:
                     else:
                         print(f"   ⚠️ No vector matches above threshold, falling back to KB query")
                         # Fallback to non-vector query
-                        kb_strategies = await self._query_kb_fallback(
-                            client, distance_category, runner_level, 15
-                        )
+                        kb_strategies = await query_fallback()
                 else:
                     print(f"   ⚠️ Vector search failed: {response.status_code}, using fallback")
-                    kb_strategies = await self._query_kb_fallback(
-                        client, distance_category, runner_level, 15
-                    )
+                    kb_strategies = await query_fallback()
             else:
-                # No embedding available, use fallback query
-                print(f"   ⚠️ Embedding generation failed, using KB query fallback")
-                kb_strategies = await self._query_kb_fallback(
-                    client, distance_category, runner_level, 15
-                )
+                # No embedding available: local BM25 over the KB text
+                lexical = self._get_lexical_index()
+                if lexical is None and not self._lexical_load_attempted:
+                    await self.load_lexical_index()
+                    lexical = self._lexical_index
+                
+                kb_strategies = []
+                if lexical is not None:
+                    print(f"   🔤 No embedding, local BM25 search: distance={distance_category}, level={runner_level}")
+                    kb_strategies = lexical.search(
+                        situation_description,
+                        distance=distance_category,
+                        runner_level=runner_level,
+                        match_count=self.max_candidates
+                    )
+                
+                if not kb_strategies:
+                    print(f"   ⚠️ No lexical matches, using KB query fallback")
+                    kb_strategies = await query_fallback()
             
             if not kb_strategies:
                 print(f"   ⚠️ No KB strategies found for {distance_category}")
@@ -493,7 +1556,7 @@ class CoachRAGEngine:
                     success_rate=s.get("success_rate", 0.0),
                     avg_effectiveness_score=s.get("avg_effectiveness_score", 0.0),
                     similarity_score=s.get("match_score", s.get("similarity", 0.7)),  # LLM match or vector similarity
-                    source="kb_vector" if situation_embedding else "kb"
+                    source="kb_vector" if situation_embedding is not None else "kb"
                 )
                 for s in matched_strategies
             ]
@@ -651,11 +1714,7 @@ class CoachRAGEngine:
         
         if not self.openai_key or not kb_strategies:
             # No LLM available, return top strategies by success rate
-            return sorted(
-                kb_strategies,
-                key=lambda s: (s.get("success_rate", 0.0), s.get("times_used", 0)),
-                reverse=True
-            )[:8]
+            return self._success_reranker.rank_rows(kb_strategies, 8)
         
         # Build prompt for LLM condition matching
         strategies_text = "\n".join([
@@ -761,37 +1820,20 @@ Be strict: only match if conditions clearly apply.
                             s["match_reason"] = match_info.get("reason", "")
                             matched_strategies.append(s)
                     
-                    # Sort by match_score, then success_rate, then times_used
-                    matched_strategies.sort(
-                        key=lambda x: (
-                            x.get("match_score", 0.0),
-                            x.get("success_rate", 0.0),
-                            x.get("times_used", 0)
-                        ),
-                        reverse=True
-                    )
-                    
+                    # Top 8 by match_score, then success_rate, then times_used
                     print(f"   🎯 LLM matched {len(matched_strategies)} strategies from {len(kb_strategies)} candidates")
-                    return matched_strategies[:8]  # Top 8 matches
+                    return self._match_reranker.rank_rows(matched_strategies, 8)
                     
                 except json.JSONDecodeError as e:
                     print(f"   ⚠️ LLM response parse error: {e}")
                     # Fallback: return top strategies by success rate
-                    return sorted(
-                        kb_strategies,
-                        key=lambda s: (s.get("success_rate", 0.0), s.get("times_used", 0)),
-                        reverse=True
-                    )[:8]
+                    return self._success_reranker.rank_rows(kb_strategies, 8)
                     
         except Exception as e:
             print(f"   ⚠️ LLM condition matching error: {e}")
         
         # Fallback: return top strategies by success rate
-        return sorted(
-            kb_strategies,
-            key=lambda s: (s.get("success_rate", 0.0), s.get("times_used", 0)),
-            reverse=True
-        )[:8]
+        return self._success_reranker.rank_rows(kb_strategies, 8)
     
     def _get_fallback_strategies(
         self,
@@ -869,9 +1911,14 @@ Be strict: only match if conditions clearly apply.
     async def _fetch_mem0_coaching_memories(
         self,
         user_id: str,
-        context: SituationContext
+        context: Optional[SituationContext] = None
     ) -> List[Mem0CoachingMemory]:
-        """Fetch relevant coaching memories from Mem0."""
+        """
+        Fetch relevant coaching memories from Mem0.
+        
+        Without a context (run session prefetch), only the situation-independent
+        queries are used.
+        """
         
         if not self.mem0_api_key:
             return []
@@ -882,13 +1929,20 @@ Be strict: only match if conditions clearly apply.
             client = await self._get_client()
             
             # Search for coaching feedback memories
-            queries = [
-                "coaching strategies that worked well",
-                f"{context.pace_trend.value} pace coaching",
-                f"{context.fatigue_level.value} fatigue running advice",
-                "what motivates this runner",
-                "running form cues that helped"
-            ]
+            if context is not None:
+                queries = [
+                    "coaching strategies that worked well",
+                    f"{context.pace_trend.value} pace coaching",
+                    f"{context.fatigue_level.value} fatigue running advice",
+                    "what motivates this runner",
+                    "running form cues that helped"
+                ]
+            else:
+                queries = [
+                    "coaching strategies that worked well",
+                    "what motivates this runner",
+                    "running form cues that helped"
+                ]
             
             for query in queries[:3]:  # Limit to 3 queries for speed
                 response = await client.post(
@@ -945,13 +1999,22 @@ Be strict: only match if conditions clearly apply.
     
     async def _get_user_top_strategies(
         self,
-        user_id: str
+        user_id: str,
+        run_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Get strategies that have worked best for this user."""
+        """
+        Get strategies that have worked best for this user.
+        
+        Served from user_strategy_stats (index lookup); with a run_id the
+        result is cached for the rest of the run.
+        """
         
         if not self.supabase_url or not self.supabase_key:
             return []
         
+        if run_id in self._user_top_cache:
+            return self._user_top_cache[run_id]
+        
         try:
             client = await self._get_client()
             
@@ -969,13 +2032,22 @@ Be strict: only match if conditions clearly apply.
             )
             
             if response.status_code == 200:
-                return response.json()
+                top = response.json()
+                if run_id:
+                    self._user_top_cache[run_id] = top
+                    while len(self._user_top_cache) > self.user_top_cache_runs:
+                        self._user_top_cache.pop(next(iter(self._user_top_cache)))
+                return top
                 
         except Exception as e:
             print(f"   ⚠️ User top strategies error: {e}")
         
         return []
     
+    def _forget_user_top_strategies(self, run_id: str):
+        """Drop the cached user top strategies of a finished run."""
+        self._user_top_cache.pop(run_id, None)
+    
     # ========================================================================
     # STRATEGY SELECTION & ADAPTATION (LLM-Powered)
     # ========================================================================
@@ -986,13 +2058,106 @@ Be strict: only match if conditions clearly apply.
         strategies: List[CoachingStrategy],
         mem0_memories: List[Mem0CoachingMemory],
         user_top_strategies: List[Dict[str, Any]],
-        performance_analysis: PerformanceAnalysis
+        performance_analysis: PerformanceAnalysis,
+        user_id: Optional[str] = None
     ) -> AdaptiveStrategyOutput:
-        """Select best strategy and adapt it using LLM."""
+        """
+        Select the best strategy and adapt it (cascade).
+        
+        With cascade_margin set, a top candidate that clearly wins on the
+        selection score is framed locally from phrase tables; close calls and
+        cautious situations go to the LLM.
+        """
+        started = time.perf_counter()
         
         if not self.openai_key:
             # No LLM available, use best matching strategy directly
-            return self._select_best_strategy_simple(context, strategies, mem0_memories)
+            strategy = self._select_best_strategy_simple(context, strategies, mem0_memories, user_id)
+            self._adaptation_stats.record("simple", started)
+            return strategy
+        
+        strategy = self._adapt_clear_winner(context, strategies, mem0_memories, user_id)
+        if strategy is not None:
+            self._adaptation_stats.record("template", started)
+            return strategy
+        
+        strategy = await self._llm_select_and_adapt_strategy(
+            context, strategies, mem0_memories, user_top_strategies, performance_analysis, user_id
+        )
+        self._adaptation_stats.record("llm", started)
+        return strategy
+    
+    def _adapt_clear_winner(
+        self,
+        context: SituationContext,
+        strategies: List[CoachingStrategy],
+        mem0_memories: List[Mem0CoachingMemory],
+        user_id: Optional[str] = None
+    ) -> Optional[AdaptiveStrategyOutput]:
+        """Template-adapted top candidate if it leads by cascade_margin, else None."""
+        if self.cascade_margin is None or not strategies:
+            return None
+        
+        # Injury risk / recovery: the LLM tailors the caution to the situation
+        if context.injury_risk or context.recovery_needed:
+            return None
+        
+        # Same scoring as the no-LLM selection (success, match, tags, source)
+        features = self._selection_features(context, strategies, user_id)
+        scores = self._selection_reranker.scores(features)
+        top = self._selection_reranker.top_k(features, k=2, scores=scores)
+        margin = float(scores[top[0]] - scores[top[1]]) if len(top) > 1 else 1.0
+        self._adaptation_stats.margins.append(margin)
+        
+        if margin < self.cascade_margin:
+            return None
+        
+        best = strategies[top[0]]
+        print(f"   ⚡ Clear winner (margin {margin:.2f}), template adaptation: {best.strategy_name}")
+        
+        return AdaptiveStrategyOutput(
+            strategy_text=adapt_strategy_text(best.strategy_text, context, variant_key=f"{best.id}|{context.signature()}"),
+            strategy_name=best.strategy_name,
+            situation_summary=f"{context.pace_trend.value} pace, {context.fatigue_level.value} fatigue",
+            selection_reason=f"Clear best match: {best.success_rate:.0%} success rate",
+            source_strategies=[strategies[i] for i in top.tolist()],
+            mem0_insights_used=[m.memory_text for m in mem0_memories[:2]],
+            confidence_score=min(0.9, 0.7 + margin),
+            priority_tags=context.situation_tags[:3]
+        )
+    
+    def _selection_features(
+        self,
+        context: SituationContext,
+        strategies: List[CoachingStrategy],
+        user_id: Optional[str] = None
+    ) -> Dict[str, np.ndarray]:
+        """Selection features; success_rate comes from the bandit when enabled."""
+        features = features_from_strategies(strategies, context.situation_tags)
+        if self._bandit is not None:
+            features["success_rate"] = self._bandit.score(
+                [s.id for s in strategies],
+                context_bucket(context),
+                features["success_rate"],
+                features["times_used"],
+                user_id
+            )
+        return features
+    
+    def adaptation_metrics(self) -> Dict[str, Any]:
+        """Selection cascade counters: LLM call rate and latency per tier."""
+        return self._adaptation_stats.metrics()
+    
+    async def _llm_select_and_adapt_strategy(
+        self,
+        context: SituationContext,
+        strategies: List[CoachingStrategy],
+        mem0_memories: List[Mem0CoachingMemory],
+        user_top_strategies: List[Dict[str, Any]],
+        performance_analysis: PerformanceAnalysis,
+        user_id: Optional[str] = None
+    ) -> AdaptiveStrategyOutput:
+        """Select best strategy and adapt it using LLM."""
         
         # Build LLM prompt for strategy selection and adaptation
         prompt = self._build_strategy_selection_prompt(
@@ -1091,7 +2256,7 @@ OUTPUT FORMAT (JSON):
             print(f"   ❌ LLM strategy selection error: {e}")
         
         # Fallback to simple selection
-        return self._select_best_strategy_simple(context, strategies, mem0_memories)
+        return self._select_best_strategy_simple(context, strategies, mem0_memories, user_id)
     
     def _build_strategy_selection_prompt(
         self,
@@ -1174,7 +2339,8 @@ OUTPUT JSON:
         self,
         context: SituationContext,
         strategies: List[CoachingStrategy],
-        mem0_memories: List[Mem0CoachingMemory]
+        mem0_memories: List[Mem0CoachingMemory],
+        user_id: Optional[str] = None
     ) -> AdaptiveStrategyOutput:
         """Simple strategy selection without LLM (fallback)."""
         
@@ -1188,13 +2354,9 @@ OUTPUT JSON:
                 priority_tags=context.situation_tags[:3]
             )
         
-        # Score strategies based on match
-        best_strategy = max(strategies, key=lambda s: (
-            s.success_rate * 0.4 +
-            s.similarity_score * 0.3 +
-            len(set(s.tags) & set(context.situation_tags)) * 0.1 +
-            (0.2 if s.source == "database" else 0.1)
-        ))
+        # Score strategies based on match (success, similarity, tag overlap, source)
+        features = self._selection_features(context, strategies, user_id)
+        best_strategy = strategies[int(self._selection_reranker.top_k(features, k=1)[0])]
         
         return AdaptiveStrategyOutput(
             strategy_text=best_strategy.strategy_text,
@@ -1211,14 +2373,26 @@ OUTPUT JSON:
     # EMBEDDING GENERATION
     # ========================================================================
     
-    async def _generate_embedding(self, text: str) -> Optional[List[float]]:
+    async def _generate_embedding(self, text: str) -> Optional[np.ndarray]:
         """Generate embedding using OpenAI (uses Edge Function or env key)."""
-        # This method is kept for compatibility but won't be used
-        # since we now use Edge Function for strategy selection
-        return None
+        # Strategy selection normally goes through the Edge Function;
+        # this only produces an embedding when OPENAI_API_KEY is set locally
+        return await self._generate_embedding_with_key(text, self.openai_key, self.embedding_model)
     
-    async def _generate_embedding_with_key(self, text: str, openai_key: str) -> Optional[List[float]]:
-        """Generate embedding using OpenAI with provided key."""
+    async def _generate_embedding_with_key(
+        self,
+        text: str,
+        openai_key: str,
+        model: str = EMBEDDING_MODEL
+    ) -> Optional[np.ndarray]:
+        """
+        Generate embedding using OpenAI with provided key.
+        
+        Requests the base64 encoding and decodes it straight into a float32
+        array, so the vector is never materialized as a list of Python floats.
+        text-embedding-3 models are asked for EMBEDDING_DIMS dimensions so
+        every embedding version fits the vector(1536) columns.
+        """
         
         if not openai_key:
             return None
@@ -1233,14 +2407,16 @@ OUTPUT JSON:
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "text-embedding-3-small",
-                    "input": text
+                    "model": model,
+                    "input": text,
+                    "encoding_format": "base64",
+                    **({"dimensions": EMBEDDING_DIMS} if model.startswith("text-embedding-3") else {})
                 }
             )
             
             if response.status_code == 200:
                 result = response.json()
-                return result["data"][0]["embedding"]
+                return decode_base64_embedding(result["data"][0]["embedding"])
                 
         except Exception as e:
             print(f"   ❌ Embedding error: {e}")
@@ -1257,16 +2433,23 @@ OUTPUT JSON:
         run_id: Optional[str],
         strategy: AdaptiveStrategyOutput,
         context: SituationContext,
-        performance_analysis: PerformanceAnalysis
+        performance_analysis: PerformanceAnalysis,
+        block: bool = True
     ):
-        """Record strategy execution for self-learning."""
+        """
+        Record strategy execution for self-learning.
+        
+        With write-behind or a spool enabled the execution id is generated
+        here (it is the record's idempotency key), so strategy.execution_id
+        is set on return; the record is queued or written through the bulk
+        record RPCs, and spooled if that fails. block=False drops the record
+        (counted) instead of waiting when the write-behind queue is full.
+        """
         
         if not self.supabase_url or not self.supabase_key:
             return
         
         try:
-            client = await self._get_client()
-            
             # Get strategy_id from source strategies
             strategy_id = None
             if strategy.source_strategies:
@@ -1285,6 +2468,36 @@ OUTPUT JSON:
                 "situation_tags": context.situation_tags
             }
             
+            if self._write_queue is not None or self._spool is not None:
+                execution_id = str(uuid.uuid4())
+                executed_at = datetime.now()
+                strategy.execution_id = execution_id
+                await self._track_execution(StrategyExecution(
+                    id=execution_id,
+                    user_id=user_id,
+                    run_id=run_id,
+                    strategy_id=strategy_id,
+                    execution_context=execution_context,
+                    strategy_delivered=strategy.strategy_text,
+                    executed_at=executed_at
+                ))
+                record = {
+                    "id": execution_id,
+                    "user_id": user_id,
+                    "run_id": run_id,
+                    "strategy_id": strategy_id,
+                    "execution_context": execution_context,
+                    "strategy_delivered": strategy.strategy_text,
+                    "strategy_title": strategy.strategy_name,
+                    "executed_at": executed_at.astimezone().isoformat()
+                }
+                if self._write_queue is not None:
+                    await self._write_queue.put_execution(record, block=block)
+                else:
+                    await self._write_or_spool_batch([record], [])
+                return
+            
+            client = await self._get_client()
             response = await client.post(
                 f"{self.supabase_url}/rest/v1/rpc/record_strategy_execution",
                 headers={
@@ -1304,7 +2517,7 @@ OUTPUT JSON:
             if response.status_code == 200:
                 execution_id = response.json()
                 strategy.execution_id = execution_id
-                self._pending_executions[execution_id] = StrategyExecution(
+                await self._track_execution(StrategyExecution(
                     id=execution_id,
                     user_id=user_id,
                     run_id=run_id,
@@ -1312,7 +2525,7 @@ OUTPUT JSON:
                     execution_context=execution_context,
                     strategy_delivered=strategy.strategy_text,
                     executed_at=datetime.now()
-                )
+                ))
                 print(f"   ✅ Execution recorded: {execution_id[:8]}")
                 
         except Exception as e:
@@ -1346,8 +2559,23 @@ OUTPUT JSON:
             return False
         
         try:
-            client = await self._get_client()
+            if self._write_queue is not None or self._spool is not None:
+                record = {
+                    "execution_id": execution_id,
+                    "outcome_metrics": outcome_metrics,
+                    "was_effective": was_effective,
+                    "effectiveness_score": effectiveness_score,
+                    "effectiveness_reason": effectiveness_reason
+                }
+                if self._write_queue is not None:
+                    recorded = await self._write_queue.put_outcome(record)
+                else:
+                    recorded = await self._write_or_spool_batch([], [record])
+                if recorded:
+                    self._learn_outcome(self._pending_executions.pop(execution_id), was_effective)
+                return recorded
             
+            client = await self._get_client()
             response = await client.post(
                 f"{self.supabase_url}/rest/v1/rpc/record_strategy_outcome",
                 headers={
@@ -1368,8 +2596,7 @@ OUTPUT JSON:
                 print(f"   ✅ Outcome recorded for {execution_id[:8]}: {'effective' if was_effective else 'ineffective'}")
                 
                 # Remove from pending
-                if execution_id in self._pending_executions:
-                    del self._pending_executions[execution_id]
+                self._learn_outcome(self._pending_executions.pop(execution_id), was_effective)
                 
                 return True
                 
@@ -1378,6 +2605,398 @@ OUTPUT JSON:
         
         return False
     
+    async def _write_record_batch(
+        self,
+        executions: List[Dict[str, Any]],
+        outcomes: List[Dict[str, Any]]
+    ):
+        """
+        Write a batch of execution / outcome records (raises on failure).
+        
+        Executions go through the array RPC record_strategy_executions_kb
+        (one unnest INSERT), then outcomes through record_strategy_batch_kb.
+        Both are idempotent, so a failed batch can be re-sent as a whole.
+        """
+        client = await self._get_client()
+        headers = {
+            "apikey": self.supabase_key,
+            "Authorization": f"Bearer {self.supabase_key}",
+            "Content-Type": "application/json"
+        }
+        
+        inserted = 0
+        if executions:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/record_strategy_executions_kb",
+                headers=headers,
+                json={
+                    "p_ids": [e["id"] for e in executions],
+                    "p_user_ids": [e["user_id"] for e in executions],
+                    "p_run_ids": [e.get("run_id") for e in executions],
+                    "p_strategy_ids": [e.get("strategy_id") for e in executions],
+                    "p_execution_contexts": [e.get("execution_context") or {} for e in executions],
+                    "p_strategies_delivered": [e.get("strategy_delivered") or "" for e in executions],
+                    "p_strategy_titles": [e.get("strategy_title") for e in executions],
+                    "p_condition_match_scores": [e.get("condition_match_score") for e in executions],
+                    "p_executed_at": [e.get("executed_at") for e in executions]
+                }
+            )
+            response.raise_for_status()
+            inserted = response.json() or 0
+        
+        measured = 0
+        if outcomes:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/record_strategy_batch_kb",
+                headers=headers,
+                json={
+                    "p_executions": [],
+                    "p_outcomes": outcomes
+                }
+            )
+            response.raise_for_status()
+            measured = (response.json() or {}).get("outcomes", 0)
+        
+        print(f"   ✅ Batch recorded: {inserted} executions, {measured} outcomes")
+    
+    async def _write_or_spool_batch(
+        self,
+        executions: List[Dict[str, Any]],
+        outcomes: List[Dict[str, Any]]
+    ) -> bool:
+        """Write a batch, spooling it locally if Supabase is unreachable."""
+        if self._spool is None:
+            await self._write_record_batch(executions, outcomes)
+            return True
+        
+        self._spool_drainer.start()
+        if len(self._spool):
+            # Keep order behind the backlog (an outcome needs its execution first)
+            self._spool.append(executions, outcomes)
+            return True
+        try:
+            await self._write_record_batch(executions, outcomes)
+        except Exception as e:
+            self._spool.append(executions, outcomes)
+            print(f"   📦 Spooled {len(executions) + len(outcomes)} records ({e})")
+        return True
+    
+    def start_spool_drainer(self) -> Optional[SpoolDrainer]:
+        """Start replaying spooled records (also started by the first write)."""
+        if self._spool_drainer is not None:
+            self._spool_drainer.start()
+        return self._spool_drainer
+    
+    def spool_metrics(self) -> Dict[str, Any]:
+        """Spool depth, oldest record age and replay counters (empty if disabled)."""
+        return self._spool_drainer.metrics() if self._spool_drainer is not None else {}
+    
+    def requeue_spool_dead_letters(self) -> int:
+        """Replay records Supabase rejected again (e.g. after a migration fix)."""
+        return self._spool.requeue_dead_letters() if self._spool is not None else 0
+    
+    async def flush_records(self) -> int:
+        """Write queued execution / outcome records now (write-behind only)."""
+        if self._write_queue is None:
+            return 0
+        return await self._write_queue.flush()
+    
+    def write_queue_metrics(self) -> Dict[str, Any]:
+        """Write-behind queue depth and throughput (empty if disabled)."""
+        return self._write_queue.metrics() if self._write_queue is not None else {}
+    
+    # ========================================================================
+    # PENDING EXECUTIONS
+    # ========================================================================
+    
+    async def _track_execution(self, execution: StrategyExecution):
+        """Hold an execution for its outcome; close evicted ones in batches."""
+        self._pending_executions.add(execution)
+        if self.close_unmeasured and self._pending_executions.awaiting_close >= CLOSE_BATCH_SIZE:
+            await self._close_unmeasured_executions()
+    
+    async def _close_unmeasured_executions(self) -> int:
+        """
+        Record evicted executions as unmeasured (no success, no score), so
+        they stop looking pending in strategy_executions. Never waits for
+        write-behind queue space: records the queue drops are re-buffered
+        and closed with a later batch.
+        
+        Returns:
+            Number of executions closed
+        """
+        evicted = self._pending_executions.take_evicted()
+        if not evicted or not self.supabase_url or not self.supabase_key:
+            return 0
+        
+        outcomes = [
+            {
+                "execution_id": execution.id,
+                "outcome_metrics": {"unmeasured": True, "evicted": reason},
+                "was_effective": None,
+                "effectiveness_score": None,
+                "effectiveness_reason": f"unmeasured ({reason})"
+            }
+            for execution, reason in evicted
+        ]
+        
+        try:
+            if self._write_queue is not None:
+                accepted = await self._write_queue.put_outcomes(outcomes, block=False)
+                closed = {outcome["execution_id"] for outcome in accepted}
+                dropped = [(execution, reason) for execution, reason in evicted if execution.id not in closed]
+                if dropped:
+                    self._pending_executions.restore_evicted(dropped)
+                    print(f"   ⚠️ Write-behind queue full, {len(dropped)} unmeasured executions kept for a later close")
+            else:
+                await self._write_or_spool_batch([], outcomes)
+                accepted = outcomes
+            if accepted:
+                print(f"   🧹 Closed {len(accepted)} unmeasured executions")
+            return len(accepted)
+        except Exception as e:
+            print(f"   ⚠️ Unmeasured close error: {e}")
+            return 0
+    
+    async def abandon_run(self, run_id: str) -> int:
+        """
+        Drop a run's executions still waiting for an outcome (e.g. the run
+        was discarded); closed as unmeasured if close_unmeasured is on.
+        
+        Returns:
+            Number of executions dropped
+        """
+        dropped = self._pending_executions.pop_run(run_id)
+        self._forget_user_top_strategies(run_id)
+        if self.close_unmeasured:
+            await self._close_unmeasured_executions()
+        return len(dropped)
+    
+    def pending_execution_metrics(self) -> Dict[str, Any]:
+        """Pending execution count, completions and evictions by reason."""
+        return self._pending_executions.metrics()
+    
+    # ========================================================================
+    # STRATEGY BANDIT
+    # ========================================================================
+    
+    def _learn_outcome(self, execution: Optional[StrategyExecution], was_effective: bool):
+        """Feed a recorded outcome to the bandit (O(1))."""
+        if self._bandit is None or execution is None or not execution.strategy_id:
+            return
+        self._bandit.update(
+            execution.strategy_id,
+            execution_bucket(execution.execution_context),
+            was_effective,
+            execution.user_id
+        )
+    
+    async def load_bandit_checkpoint(self) -> int:
+        """
+        Load all workers' bandit checkpoints (call at startup).
+        
+        Returns:
+            Number of arms loaded
+        """
+        if self._bandit is None or not self.supabase_url or not self.supabase_key:
+            return 0
+        
+        try:
+            client = await self._get_client()
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/strategy_bandit_checkpoints",
+                headers={
+                    "apikey": self.supabase_key,
+                    "Authorization": f"Bearer {self.supabase_key}"
+                },
+                params={"select": "worker_id,state"}
+            )
+            response.raise_for_status()
+            
+            rows = response.json()
+            loaded = self._bandit.load_states(((r["worker_id"], r["state"]) for r in rows), self.worker_id)
+            print(f"   ✅ Bandit loaded: {loaded} arms from {len(rows)} checkpoints")
+            return loaded
+        except Exception as e:
+            print(f"   ⚠️ Bandit checkpoint load error: {e}")
+            return 0
+    
+    async def save_bandit_checkpoint(self) -> bool:
+        """Write this worker's bandit observations to Supabase."""
+        if self._bandit is None or not self.supabase_url or not self.supabase_key:
+            return False
+        
+        state = self._bandit.to_state()
+        try:
+            client = await self._get_client()
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/save_strategy_bandit_checkpoint",
+                headers={
+                    "apikey": self.supabase_key,
+                    "Authorization": f"Bearer {self.supabase_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "p_worker_id": self.worker_id,
+                    "p_arms": len(state["keys"]),
+                    "p_state": state
+                }
+            )
+            response.raise_for_status()
+            self._bandit.dirty = False
+            return True
+        except Exception as e:
+            print(f"   ⚠️ Bandit checkpoint save error: {e}")
+            return False
+    
+    def start_bandit_checkpoints(self, interval: float = CHECKPOINT_INTERVAL_SECONDS):
+        """Checkpoint the bandit every interval seconds while it has new outcomes."""
+        if self._bandit is None:
+            return
+        
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                if self._bandit.dirty:
+                    await self.save_bandit_checkpoint()
+        
+        if self._bandit_task is None or self._bandit_task.done():
+            self._bandit_task = asyncio.get_running_loop().create_task(run())
+    
+    def bandit_metrics(self) -> Dict[str, Any]:
+        """Bandit arms and observations (empty if disabled)."""
+        return self._bandit.metrics() if self._bandit is not None else {}
+    
+    # ========================================================================
+    # EFFECTIVENESS ROLLUPS (strategy_effectiveness_evolution)
+    # ========================================================================
+    
+    async def _fetch_measured_outcomes(
+        self,
+        watermark: Watermark,
+        before: str,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch one page of outcomes measured after watermark and before a cutoff.
+        
+        Keyset pagination on (outcome_measured_at, id).
+        """
+        
+        measured_at, last_id = watermark
+        params = {
+            "select": "id,strategy_id,was_effective,effectiveness_score,outcome_measured_at",
+            "outcome_measured": "is.true",
+            "order": "outcome_measured_at.asc,id.asc",
+            "limit": str(limit)
+        }
+        if measured_at and last_id:
+            params["or"] = (
+                f'(outcome_measured_at.gt."{measured_at}",'
+                f'and(outcome_measured_at.eq."{measured_at}",id.gt.{last_id}))'
+            )
+            params["outcome_measured_at"] = f'lt."{before}"'
+        elif measured_at:
+            params["and"] = f'(outcome_measured_at.gt."{measured_at}",outcome_measured_at.lt."{before}")'
+        else:
+            params["outcome_measured_at"] = f'lt."{before}"'
+        
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.supabase_url}/rest/v1/strategy_executions",
+            headers={
+                "apikey": self.supabase_key,
+                "Authorization": f"Bearer {self.supabase_key}"
+            },
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def _load_rollup_watermark(self, job: str) -> Watermark:
+        """Stored stream position of a rollup job ((None, None) if new)."""
+        
+        client = await self._get_client()
+        response = await client.get(
+            f"{self.supabase_url}/rest/v1/strategy_rollup_watermarks",
+            headers={
+                "apikey": self.supabase_key,
+                "Authorization": f"Bearer {self.supabase_key}"
+            },
+            params={"select": "outcome_measured_at,execution_id", "job": f"eq.{job}"}
+        )
+        response.raise_for_status()
+        rows = response.json()
+        if not rows:
+            return (None, None)
+        return (rows[0].get("outcome_measured_at"), rows[0].get("execution_id"))
+    
+    async def _upsert_effectiveness_rollups(
+        self,
+        job: str,
+        rollups: List[Dict[str, Any]],
+        expected: Watermark,
+        watermark: Watermark,
+        outcomes: int
+    ) -> bool:
+        """Merge rollup deltas and advance the watermark (False if it moved)."""
+        
+        client = await self._get_client()
+        response = await client.post(
+            f"{self.supabase_url}/rest/v1/rpc/upsert_strategy_effectiveness_rollups",
+            headers={
+                "apikey": self.supabase_key,
+                "Authorization": f"Bearer {self.supabase_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "p_job": job,
+                "p_rollups": rollups,
+                "p_expected_at": expected[0],
+                "p_expected_id": expected[1],
+                "p_watermark_at": watermark[0],
+                "p_watermark_id": watermark[1],
+                "p_outcomes": outcomes
+            }
+        )
+        response.raise_for_status()
+        return bool(response.json())
+    
+    def start_effectiveness_rollups(
+        self,
+        job: str = "default",
+        interval: float = ROLLUP_INTERVAL_SECONDS,
+        periods: Tuple[str, ...] = PERIODS
+    ) -> Optional[RollupJob]:
+        """
+        Stream measured outcomes into per-period strategy_effectiveness_evolution rows.
+        
+        Run one instance per job name (e.g. in the shared KB publisher); a
+        concurrent instance is harmless, its batches are rejected.
+        
+        Returns:
+            The running RollupJob (metrics via effectiveness_rollup_metrics())
+        """
+        if not self.supabase_url or not self.supabase_key:
+            print("   ⚠️ Effectiveness rollups need Supabase credentials")
+            return None
+        
+        if self._rollup_job is None:
+            self._rollup_job = RollupJob(
+                self._fetch_measured_outcomes,
+                self._load_rollup_watermark,
+                self._upsert_effectiveness_rollups,
+                job=job,
+                periods=periods,
+                interval=interval
+            )
+        self._rollup_job.start()
+        return self._rollup_job
+    
+    def effectiveness_rollup_metrics(self) -> Dict[str, Any]:
+        """Rollup throughput and stream position (empty if not started)."""
+        return self._rollup_job.metrics() if self._rollup_job is not None else {}
+    
     # ========================================================================
     # STRATEGY MONITORING
     # ========================================================================
@@ -1400,76 +3019,114 @@ OUTPUT JSON:
             (was_effective, effectiveness_score, reason)
         """
         
-        was_effective = False
-        score = 0.5
-        reasons = []
-        
         # Get the execution context
         execution = self._pending_executions.get(execution_id)
         if not execution:
             return False, 0.0, "Execution not found"
         
-        context = execution.execution_context
-        
-        # Pace improvement
-        pace_before = before_metrics.get("pace", 0)
-        pace_after = after_metrics.get("pace", 0)
-        if pace_before > 0 and pace_after > 0:
-            pace_change = pace_after - pace_before
-            
-            # If target was "behind", improvement is good
-            if context.get("target_status") in ["slightly_behind", "way_behind"]:
-                if pace_change < -0.05:  # Got faster
-                    score += 0.3
-                    reasons.append("Pace improved")
-                    was_effective = True
-            # If recovery was needed, slight slowdown is okay
-            elif context.get("fatigue") in ["high", "severe"]:
-                if abs(pace_change) < 0.1:  # Stabilized
-                    score += 0.2
-                    reasons.append("Pace stabilized during recovery")
-                    was_effective = True
-        
-        # HR stabilization
-        hr_before = before_metrics.get("hr", 0)
-        hr_after = after_metrics.get("hr", 0)
-        if hr_before > 0 and hr_after > 0:
-            hr_change = hr_after - hr_before
-            
-            # If HR was rising/spiking, stabilization is good
-            if context.get("hr_trend") in ["rising", "spiking"]:
-                if hr_change < 3:  # Stabilized or dropped
-                    score += 0.2
-                    reasons.append("HR stabilized")
-                    was_effective = True
-        
-        # Zone optimization
-        zone_before = before_metrics.get("zone", 0)
-        zone_after = after_metrics.get("zone", 0)
-        if context.get("zone_too_high", False):
-            if zone_after < zone_before:
-                score += 0.2
-                reasons.append("Moved to lower zone")
-                was_effective = True
-        
-        # Cap score
-        score = min(1.0, max(0.0, score))
-        
-        reason = "; ".join(reasons) if reasons else "No significant improvement detected"
+        # Same rules as assess_run, for a batch of one
+        before = {m: np.array([before_metrics.get(m, 0)], dtype=np.float64) for m in METRICS}
+        after = {m: np.array([after_metrics.get(m, 0)], dtype=np.float64) for m in METRICS}
+        effective, scores, reasons = score_executions([execution.execution_context], before, after)
+        was_effective, score, reason = bool(effective[0]), float(scores[0]), reasons[0]
         
         # Record the outcome
         await self.record_strategy_outcome(
             execution_id=execution_id,
-            outcome_metrics={
-                "pace_change": pace_after - pace_before if pace_before and pace_after else None,
-                "hr_change": hr_after - hr_before if hr_before and hr_after else None,
-                "zone_change": zone_after - zone_before if zone_before and zone_after else None
-            },
+            outcome_metrics=outcome_metrics(before, after, 0),
             was_effective=was_effective,
             effectiveness_score=score,
             effectiveness_reason=reason
         )
         
         return was_effective, score, reason
+    
+    async def assess_run(
+        self,
+        run_id: str,
+        telemetry_trace: TelemetryTrace,
+        before_window: float = BEFORE_WINDOW_SECONDS,
+        after_delay: float = AFTER_DELAY_SECONDS,
+        after_window: float = AFTER_WINDOW_SECONDS
+    ) -> List[Dict[str, Any]]:
+        """
+        Assess every pending execution of a run from its telemetry and
+        record all outcomes in one bulk write.
+        
+        Call this at the end of a run. Executions without telemetry on both
+        sides of their delivery stay pending.
+        
+        Args:
+            run_id: Run UUID
+            telemetry_trace: Per-second samples, columnar
+                {"timestamp": [...], "pace": [...], "hr": [...], "zone": [...]}
+                or a list of {"timestamp", "pace", "hr", "zone"} dicts
+                (timestamp in Unix seconds, pace in min/km)
+            before_window: Seconds before delivery averaged as "before"
+            after_delay: Seconds after delivery skipped (reaction time)
+            after_window: Seconds averaged as "after"
+            
+        Returns:
+            Recorded outcomes (execution_id, was_effective, effectiveness_score,
+            effectiveness_reason, outcome_metrics); empty if the write failed.
+            Outcomes the write-behind queue drops are not returned and their
+            executions stay pending
+        """
+        executions = [e for e in self._pending_executions.for_run(run_id) if e.executed_at is not None]
+        if not executions:
+            return []
+        
+        trace = trace_arrays(telemetry_trace)
+        if not len(trace["timestamp"]):
+            return []
+        
+        event_times = np.array([e.executed_at.timestamp() for e in executions])
+        before, after = before_after(trace, event_times, before_window, after_delay, after_window)
+        
+        # Only executions with data on both sides of delivery
+        assessable = np.zeros(len(executions), dtype=bool)
+        for metric in METRICS:
+            assessable |= np.isfinite(before[metric]) & np.isfinite(after[metric])
+        idx = np.flatnonzero(assessable)
+        if not idx.size:
+            print(f"   ⚠️ No telemetry around {len(executions)} executions of run {run_id[:8]}")
+            return []
+        
+        before = {m: values[idx] for m, values in before.items()}
+        after = {m: values[idx] for m, values in after.items()}
+        effective, scores, reasons = score_executions(
+            [executions[i].execution_context for i in idx], before, after
+        )
+        
+        outcomes = [
+            {
+                "execution_id": executions[i].id,
+                "outcome_metrics": outcome_metrics(before, after, j),
+                "was_effective": bool(effective[j]),
+                "effectiveness_score": round(float(scores[j]), 3),
+                "effectiveness_reason": reasons[j]
+            }
+            for j, i in enumerate(idx)
+        ]
+        
+        if self.supabase_url and self.supabase_key:
+            try:
+                if self._write_queue is not None:
+                    assessed = len(outcomes)
+                    outcomes = await self._write_queue.put_outcomes(outcomes)
+                    if len(outcomes) < assessed:
+                        print(f"   ⚠️ Write-behind queue full, {assessed - len(outcomes)} outcomes of run {run_id[:8]} dropped (still pending)")
+                else:
+                    await self._write_or_spool_batch([], outcomes)
+            except Exception as e:
+                print(f"   ❌ Run assessment write error: {e}")
+                return []
+        
+        for outcome in outcomes:
+            self._learn_outcome(self._pending_executions.pop(outcome["execution_id"]), outcome["was_effective"])
+        
+        effective_count = sum(1 for outcome in outcomes if outcome["was_effective"])
+        print(f"   ✅ Assessed {len(outcomes)}/{len(executions)} executions of run {run_id[:8]}: {effective_count} effective")
+        return outcomes
 
 
@@ -0,0 +1,73 @@
+"""
+Export KB Snapshot
+==================
+
+Writes the embedded KB to a memory-mapped snapshot file. Workers started
+with kb_snapshot_path (or COACH_RAG_KB_SNAPSHOT) map it at startup instead
+of pulling the KB over HTTP.
+
+Usage:
+    python -m coach_rag_engine.export_kb_snapshot kb.snap
+    python -m coach_rag_engine.export_kb_snapshot --inspect kb.snap
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+from engine import CoachRAGEngine
+from snapshot import open_snapshot, read_header
+
+
+async def export(path: str):
+    """Fetch the KB from Supabase and write a snapshot."""
+    
+    print("=" * 60)
+    print("COACH RAG KB - Snapshot Export")
+    print("=" * 60)
+    
+    load_dotenv()
+    
+    engine = CoachRAGEngine(
+        supabase_url=os.getenv("SUPABASE_URL"),
+        supabase_anon_key=os.getenv("SUPABASE_ANON_KEY")
+    )
+    
+    try:
+        size = await engine.export_kb_snapshot(path)
+        if size:
+            print(f"✅ Snapshot written: {path} ({size / 1024:.0f} KB)")
+    finally:
+        await engine.close()
+
+
+def inspect(path: str):
+    """Print the snapshot header and cold-open time."""
+    
+    start = time.perf_counter()
+    index = open_snapshot(path)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    header = read_header(index._buffer)
+    print(f"📦 {path}")
+    print(f"   Model: {header['embedding_model']} ({header['dims']} dims, prefix {header['prefix_dims']})")
+    print(f"   Rows: {header['rows']}, created {header['created_at']}")
+    print(f"   Partitions: {header['partitions']}")
+    print(f"   Tags: {len(header['tag_vocab'])}")
+    print(f"   Open time: {elapsed_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--inspect":
+        inspect(sys.argv[2])
+    elif len(sys.argv) == 2:
+        asyncio.run(export(sys.argv[1]))
+    else:
+        print("Usage: python -m coach_rag_engine.export_kb_snapshot [--inspect] <path>")
+        sys.exit(1)
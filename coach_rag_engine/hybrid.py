@@ -0,0 +1,169 @@
+"""
+Hybrid Lexical + Vector Retrieval for Coach RAG AI Engine
+==========================================================
+
+Fuses local BM25 (lexical.py) and vector (local_index.py) results with
+reciprocal rank fusion, so strategies whose conditions_to_use literally
+name the situation flags ("cardiac drift", "zone too high") surface even
+when their embedding is not among the nearest.
+
+    rrf(d) = sum over lists of  weight / (rrf_k + rank(d))
+
+The fused score is normalized to [0, 1] and takes the place of similarity
+in the usual hybrid ranking (50% relevance + 30% success_rate + 20%
+avg_effectiveness_score, ties by times_used). Fused hits below the vector
+similarity threshold are dropped first, as in plain vector search, so weak
+matches leave the result empty and the caller falls back. max_candidates caps
+how many strategies reach the LLM condition matcher.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .lexical import LexicalIndex
+    from .local_index import StrategyIndex
+except ImportError:
+    # Fallback for direct script execution
+    from lexical import LexicalIndex
+    from local_index import StrategyIndex
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+RRF_K = 60              # Standard RRF damping constant
+FUSION_DEPTH = 50       # Results taken from each list before fusion
+MAX_CANDIDATES = 15
+
+
+# ============================================================================
+# FUSION
+# ============================================================================
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[np.ndarray],
+    weights: Optional[List[float]] = None,
+    rrf_k: int = RRF_K
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked position lists.
+
+    Returns:
+        (positions, fused scores normalized to [0, 1]) in no particular order
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    if not any(len(r) for r in ranked_lists):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    positions = np.concatenate(ranked_lists).astype(np.int64)
+    contributions = np.concatenate([
+        weight / (rrf_k + 1.0 + np.arange(len(ranked), dtype=np.float32))
+        for ranked, weight in zip(ranked_lists, weights)
+    ])
+
+    unique, inverse = np.unique(positions, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions).astype(np.float32)
+
+    # Top rank in every list scores 1.0
+    return unique, fused / (sum(weights) / (rrf_k + 1.0))
+
+
+# ============================================================================
+# HYBRID RETRIEVER
+# ============================================================================
+
+class HybridRetriever:
+    """
+    RRF fusion of vector and BM25 results over one KB position space.
+
+    Usage:
+        retriever = HybridRetriever(max_candidates=8)
+        matches = retriever.search(index, lexical, embedding, situation_text, distance="10k")
+    """
+
+    def __init__(
+        self,
+        rrf_k: int = RRF_K,
+        depth: int = FUSION_DEPTH,
+        max_candidates: int = MAX_CANDIDATES,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0
+    ):
+        """
+        Args:
+            rrf_k: RRF damping constant
+            depth: Results taken from each retriever before fusion
+            max_candidates: Strategies returned (fewer = smaller LLM prompts)
+            vector_weight: Weight of the vector ranking in the fusion
+            lexical_weight: Weight of the BM25 ranking in the fusion
+        """
+        self.rrf_k = rrf_k
+        self.depth = depth
+        self.max_candidates = max_candidates
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+
+    def search_positions(
+        self,
+        index: StrategyIndex,
+        lexical: Optional[LexicalIndex],
+        query: np.ndarray,
+        query_text: str,
+        distance: Optional[str] = None,
+        runner_level: str = "all",
+        match_threshold: float = 0.65,
+        mode: str = "exact",
+        max_candidates: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rank rows by fused relevance plus success/effectiveness weighting.
+
+        lexical must share index's positions (LexicalIndex.from_strategy_index);
+        without it this is plain vector ranking. Rows (lexical hits included)
+        whose vector similarity is below match_threshold are dropped.
+
+        Returns:
+            (positions, final scores, similarities), best first
+        """
+        vector_positions, vector_similarity = index.similarity_search(
+            query, distance=distance, runner_level=runner_level, match_count=self.depth, mode=mode
+        )
+
+        ranked, weights = [vector_positions], [self.vector_weight]
+        if lexical is not None:
+            lexical_positions, _ = lexical.search_positions(
+                query_text, distance=distance, runner_level=runner_level, match_count=self.depth
+            )
+            ranked.append(lexical_positions)
+            weights.append(self.lexical_weight)
+
+        positions, relevance = reciprocal_rank_fusion(ranked, weights, self.rrf_k)
+
+        # Similarity for lexical-only hits too (threshold, reported downstream)
+        similarity = index.similarity(positions, query) if positions.size else relevance
+        above = similarity >= match_threshold
+        positions, relevance, similarity = positions[above], relevance[above], similarity[above]
+        if positions.size == 0:
+            return positions, relevance, similarity
+
+        # Shared reranker: top-k by hybrid score, ties by times_used
+        order = index.rank(positions, relevance, max_candidates or self.max_candidates)
+        positions = positions[order]
+        scores = index.hybrid_scores(positions, relevance[order])
+        return positions, scores, similarity[order]
+
+    def search(self, index: StrategyIndex, lexical: Optional[LexicalIndex], *args, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Hybrid search. Accepts the same arguments as search_positions.
+
+        Returns:
+            KB rows with "similarity" and "hybrid_score" fields
+        """
+        positions, scores, similarity = self.search_positions(index, lexical, *args, **kwargs)
+        return [
+            dict(index.rows[p], similarity=float(sim), hybrid_score=float(score))
+            for p, score, sim in zip(positions.tolist(), scores.tolist(), similarity.tolist())
+        ]
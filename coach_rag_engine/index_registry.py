@@ -0,0 +1,192 @@
+"""
+Versioned Index Registry for Coach RAG AI Engine
+================================================
+
+Double-buffered local KB indexes, one per embedding version.
+
+A new version (new embedding model or re-embedded KB) is built in the
+background while the active index keeps serving. Before the flip, shadow
+queries run against both versions and report recall and latency deltas;
+activation is then a single pointer swap.
+
+Versions are stored in the database as embedding sets (see
+005_versioned_kb_embeddings.sql); activate_kb_embedding_set flips the
+server side in one transaction.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from .local_index import StrategyIndex
+except ImportError:
+    # Fallback for direct script execution
+    from local_index import StrategyIndex
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+SHADOW_QUERY_LIMIT = 200    # Recent situation texts kept for shadow runs
+SHADOW_SAMPLE = 50          # Queries per comparison
+
+# (text, model) -> embedding
+EmbedQuery = Callable[[str, str], Awaitable[Optional[np.ndarray]]]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class IndexRegistry:
+    """
+    Active + candidate StrategyIndex per embedding version.
+
+    Usage:
+        registry.add("3-small-v1", index, active=True)
+        await registry.build("3-large-1536", rows)        # background thread
+        report = await registry.compare("3-large-1536", embed_query)
+        registry.activate("3-large-1536")                  # pointer flip
+    """
+
+    def __init__(self, shadow_limit: int = SHADOW_QUERY_LIMIT):
+        self.indexes: Dict[str, StrategyIndex] = {}
+        self.active_version: Optional[str] = None
+        self.reports: Dict[str, Dict[str, Any]] = {}
+
+        # Recent live queries (situation text + search filters) for shadow runs
+        self.shadow_queries: Deque[Dict[str, Any]] = deque(maxlen=shadow_limit)
+
+    @property
+    def active(self) -> Optional[StrategyIndex]:
+        """Index currently serving searches."""
+        return self.indexes.get(self.active_version) if self.active_version else None
+
+    def add(self, version: str, index: StrategyIndex, active: bool = False):
+        """Register a built index (optionally making it active)."""
+        index.embedding_version = version
+        self.indexes[version] = index
+        if active:
+            self.active_version = version
+
+    async def build(self, version: str, rows: List[Dict[str, Any]], **index_kwargs) -> StrategyIndex:
+        """
+        Build a version's index off the event loop; the active one keeps serving.
+
+        Args:
+            version: Embedding version name
+            rows: KB rows whose strategy_embedding holds this version's vectors
+            index_kwargs: StrategyIndex options (embedding_model, quantization, ...)
+        """
+        index = await asyncio.to_thread(StrategyIndex.from_kb_rows, rows, **index_kwargs)
+        self.add(version, index)
+        return index
+
+    def record_query(self, situation_text: str, **search_kwargs):
+        """Remember a live query for later shadow comparisons."""
+        self.shadow_queries.append({"text": situation_text, "search": search_kwargs})
+
+    # ========================================================================
+    # SHADOW COMPARISON
+    # ========================================================================
+
+    async def compare(
+        self,
+        version: str,
+        embed_query: EmbedQuery,
+        k: int = 15,
+        sample: int = SHADOW_SAMPLE,
+        mode: str = "exact"
+    ) -> Dict[str, Any]:
+        """
+        Shadow-run recent queries against the active index and a candidate.
+
+        Each query is embedded with each version's model. recall_at_k is the
+        share of the active version's top-k that the candidate also returns
+        (for a pure re-embed with the same model it is true recall).
+
+        Returns:
+            Report with recall and p50/p99 latency of both versions
+        """
+        current, candidate = self.active, self.indexes[version]
+        if current is None:
+            raise ValueError("No active index to compare against")
+
+        queries = list(self.shadow_queries)[-sample:]
+        recalls, current_ms, candidate_ms = [], [], []
+
+        for query in queries:
+            current_vec = await embed_query(query["text"], current.embedding_model)
+            if candidate.embedding_model == current.embedding_model:
+                candidate_vec = current_vec
+            else:
+                candidate_vec = await embed_query(query["text"], candidate.embedding_model)
+            if current_vec is None or candidate_vec is None:
+                continue
+
+            search = dict(query["search"], match_count=k, match_threshold=-1.0, mode=mode)
+
+            start = time.perf_counter()
+            current_ids, _ = current.search_positions(current_vec, **search)
+            current_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            candidate_ids, _ = candidate.search_positions(candidate_vec, **search)
+            candidate_ms.append((time.perf_counter() - start) * 1000)
+
+            expected = {current.ids[p] for p in current_ids.tolist()}
+            if expected:
+                found = {candidate.ids[p] for p in candidate_ids.tolist()}
+                recalls.append(len(expected & found) / len(expected))
+
+        report = {
+            "version": version,
+            "active_version": self.active_version,
+            "queries": len(recalls),
+            "recall_at_k": float(np.mean(recalls)) if recalls else None,
+            "k": k,
+            "active_p50_ms": _percentile(current_ms, 50),
+            "active_p99_ms": _percentile(current_ms, 99),
+            "candidate_p50_ms": _percentile(candidate_ms, 50),
+            "candidate_p99_ms": _percentile(candidate_ms, 99),
+        }
+        report["p50_delta_ms"] = report["candidate_p50_ms"] - report["active_p50_ms"]
+        report["p99_delta_ms"] = report["candidate_p99_ms"] - report["active_p99_ms"]
+        self.reports[version] = report
+        return report
+
+    # ========================================================================
+    # ACTIVATION
+    # ========================================================================
+
+    def check_recall(self, version: str, min_recall: float):
+        """Raise ValueError unless the last shadow report meets min_recall."""
+        recall = self.reports.get(version, {}).get("recall_at_k")
+        if recall is None or recall < min_recall:
+            raise ValueError(f"Version {version} shadow recall {recall} below {min_recall}")
+
+    def activate(self, version: str, min_recall: Optional[float] = None) -> StrategyIndex:
+        """
+        Make version the active index (single pointer swap).
+
+        With min_recall, refuses unless the last shadow report meets it.
+        Older inactive versions are dropped.
+        """
+        if version not in self.indexes:
+            raise KeyError(f"Unknown index version: {version}")
+        if min_recall is not None:
+            self.check_recall(version, min_recall)
+
+        previous, self.active_version = self.active_version, version
+        for stale in [v for v in self.indexes if v not in (version, previous)]:
+            del self.indexes[stale]
+        return self.indexes[version]
@@ -0,0 +1,230 @@
+"""
+Lexical (BM25) Strategy Index for Coach RAG AI Engine
+======================================================
+
+In-process inverted index over the KB text fields, used when no situation
+embedding is available (instead of a blind query_coaching_strategies_kb
+round trip) and as the lexical half of hybrid retrieval.
+
+Fields are scored separately with BM25 and combined with field weights
+(BM25F-style). when_not_to_use has a negative weight: a situation that
+literally matches a strategy's exclusion conditions pushes it down.
+
+Postings are stored per field in CSR form (term offsets, doc ids, term
+frequencies), so a query is a handful of NumPy gathers per term.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .local_index import StrategyIndex
+except ImportError:
+    # Fallback for direct script execution
+    from local_index import StrategyIndex
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+# Field -> weight in the combined score
+FIELD_WEIGHTS = {
+    "title": 1.5,
+    "conditions_to_use": 2.0,
+    "strategy_text": 1.0,
+    "tags": 1.5,
+    "when_not_to_use": -1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or the "
+    "to was were with this that than then when while".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens without stopwords (snake_case tags split)."""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _field_text(row: Dict[str, Any], field: str) -> str:
+    value = row.get(field)
+    if field == "tags":
+        return " ".join(value or [])
+    return value or ""
+
+
+# ============================================================================
+# FIELD POSTINGS
+# ============================================================================
+
+class FieldPostings:
+    """CSR postings for one text field."""
+
+    def __init__(self, doc_terms: List[Counter], vocab_size: int):
+        term_ids, doc_ids, freqs = [], [], []
+        for doc, counts in enumerate(doc_terms):
+            term_ids.extend(counts.keys())
+            doc_ids.extend([doc] * len(counts))
+            freqs.extend(counts.values())
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+
+        self.docs = np.asarray(doc_ids, dtype=np.int32)[order]
+        self.freqs = np.asarray(freqs, dtype=np.float32)[order]
+        self.offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=vocab_size), out=self.offsets[1:])
+
+        self.doc_len = np.array([sum(c.values()) for c in doc_terms], dtype=np.float32)
+        self.avg_len = float(self.doc_len.mean()) if len(doc_terms) else 0.0
+
+        # Robertson-Sparck Jones IDF (always positive)
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((len(doc_terms) - df + 0.5) / (df + 0.5))
+
+    def score_into(self, scores: np.ndarray, term_ids: Iterable[int], weight: float, k1: float, b: float):
+        """Add weight * BM25(term) for each query term into scores."""
+        norm = k1 * (1 - b + b * self.doc_len / max(self.avg_len, 1e-9))
+        for term in term_ids:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            if start == end:
+                continue
+            docs, tf = self.docs[start:end], self.freqs[start:end]
+            # Each doc appears once per term, so fancy-index += is safe
+            scores[docs] += weight * self.idf[term] * tf * (k1 + 1) / (tf + norm[docs])
+
+
+# ============================================================================
+# LEXICAL INDEX
+# ============================================================================
+
+class LexicalIndex:
+    """
+    BM25 inverted index over KB strategies.
+
+    Usage:
+        lexical = LexicalIndex.from_strategy_index(index)
+        matches = lexical.search("cardiac drift zone too high", distance="10k")
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        filter_index: Optional[StrategyIndex] = None,
+        field_weights: Optional[Dict[str, float]] = None,
+        k1: float = BM25_K1,
+        b: float = BM25_B
+    ):
+        """
+        Build the index.
+
+        Args:
+            rows: KB rows (positions follow this order)
+            filter_index: StrategyIndex over the same rows; when set, its
+                live filters (active flags, partitions) are used
+            field_weights: Per-field weights (default FIELD_WEIGHTS)
+            k1, b: BM25 parameters
+        """
+        self.rows = rows
+        self.filter_index = filter_index
+        # filter_index text generation the postings were built from
+        self.text_generation = filter_index.text_generation if filter_index is not None else 0
+        self.field_weights = dict(field_weights or FIELD_WEIGHTS)
+        self.k1 = k1
+        self.b = b
+
+        # Own filter columns (used without a filter_index)
+        self.distance = np.array([r.get("distance", "") for r in rows], dtype=object)
+        self.runner_level = np.array([r.get("runner_level", "all") for r in rows], dtype=object)
+        self.active = np.array([r.get("is_active", True) for r in rows], dtype=bool)
+
+        # Shared vocabulary across fields
+        self.vocab: Dict[str, int] = {}
+        doc_terms = {field: [] for field in self.field_weights}
+        for row in rows:
+            for field in self.field_weights:
+                counts = Counter(
+                    self.vocab.setdefault(t, len(self.vocab)) for t in tokenize(_field_text(row, field))
+                )
+                doc_terms[field].append(counts)
+
+        self.fields = {
+            field: FieldPostings(terms, len(self.vocab)) for field, terms in doc_terms.items()
+        }
+
+    @classmethod
+    def from_strategy_index(cls, index: StrategyIndex, **kwargs) -> "LexicalIndex":
+        """Build over a StrategyIndex's rows, sharing its position space."""
+        return cls(list(index.rows), filter_index=index, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def candidate_positions(self, distance: Optional[str] = None, runner_level: str = "all") -> np.ndarray:
+        """Positions of active rows matching distance / runner level."""
+        if self.filter_index is not None:
+            return self.filter_index.candidate_positions(distance, runner_level)
+
+        mask = self.active.copy()
+        if distance is not None:
+            mask &= self.distance == distance
+        if runner_level and runner_level != "all":
+            mask &= (self.runner_level == "all") | (self.runner_level == runner_level)
+        return np.flatnonzero(mask)
+
+    def scores(self, query: str) -> np.ndarray:
+        """Combined field-weighted BM25 score of every row."""
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        for field, postings in self.fields.items():
+            postings.score_into(scores, term_ids, self.field_weights[field], self.k1, self.b)
+        return scores
+
+    def search_positions(
+        self,
+        query: str,
+        distance: Optional[str] = None,
+        runner_level: str = "all",
+        match_count: int = 15
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank rows by BM25 for a query text.
+
+        Returns:
+            (positions, scores) of rows with a positive score, best first
+        """
+        candidates = self.candidate_positions(distance, runner_level)
+        scores = self.scores(query)[candidates]
+
+        positive = scores > 0
+        candidates, scores = candidates[positive], scores[positive]
+
+        if candidates.size > match_count:
+            keep = np.argpartition(-scores, match_count - 1)[:match_count]
+            candidates, scores = candidates[keep], scores[keep]
+
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order]
+
+    def search(self, query: str, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Search the index. Accepts the same arguments as search_positions.
+
+        Returns:
+            KB rows with a "lexical_score" field
+        """
+        positions, scores = self.search_positions(query, **kwargs)
+        return [
+            dict(self.rows[p], lexical_score=float(s))
+            for p, s in zip(positions.tolist(), scores.tolist())
+        ]
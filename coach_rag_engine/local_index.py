@@ -0,0 +1,638 @@
+"""
+Local Strategy Index for Coach RAG AI Engine
+=============================================
+
+In-process equivalent of the semantic_search_strategies_kb RPC.
+
+Holds the KB embedding matrix (float32, L2-normalized) plus columnar
+metadata, and supports two search modes:
+- "exact": full 1536-dim cosine similarity for every candidate
+- "two_stage": score candidates on truncated 256-dim normalized prefixes
+  (text-embedding-3 vectors are Matryoshka-trained, so prefixes stay
+  meaningful), then rerank only the top few dozen at full precision.
+  Both stages rank by the hybrid score, as the SQL two-stage RPC does
+  (migration 013)
+
+Ranking matches the RPC: 50% similarity + 30% success_rate +
+20% avg_effectiveness_score, ties broken by times_used.
+
+Embeddings can optionally be held quantized (int8 / float16, see
+quantization.py) to cut per-worker memory ~4x; with a rerank hook the top
+RERANK_DEPTH quantized candidates are rescored at full precision.
+
+The index can be kept fresh in place with apply_changes() (see
+delta_sync.py): stat updates, inserts and deactivations.
+"""
+
+from typing import List, Dict, Optional, Any, Iterable, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .vectors import EMBEDDING_MODEL, from_pgvector, normalize
+    from .quantization import MappedFloat32Store, QuantizedEmbeddingStore, RerankHook, DEFAULT_MIN_RECALL
+    from .reranker import Reranker
+except ImportError:
+    # Fallback for direct script execution
+    from vectors import EMBEDDING_MODEL, from_pgvector, normalize
+    from quantization import MappedFloat32Store, QuantizedEmbeddingStore, RerankHook, DEFAULT_MIN_RECALL
+    from reranker import Reranker
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+SEARCH_MODES = ("exact", "two_stage")
+
+PREFIX_DIMS = 256       # Truncated prefix used by the first stage
+RERANK_DEPTH = 48       # Candidates reranked at full precision
+
+# Row fields the lexical (BM25) index is built from
+TEXT_FIELDS = ("title", "strategy_text", "conditions_to_use", "when_not_to_use", "tags")
+
+# Hybrid ranking weights (same as semantic_search_strategies_kb)
+SIMILARITY_WEIGHT = 0.5
+SUCCESS_WEIGHT = 0.3
+EFFECTIVENESS_WEIGHT = 0.2
+
+HYBRID_RERANKER = Reranker({
+    "similarity": SIMILARITY_WEIGHT,
+    "success_rate": SUCCESS_WEIGHT,
+    "avg_effectiveness": EFFECTIVENESS_WEIGHT,
+})
+
+# KB columns kept as row metadata (everything except the embedding)
+KB_COLUMNS = (
+    "id",
+    "title",
+    "distance",
+    "type",
+    "runner_level",
+    "strategy_text",
+    "conditions_to_use",
+    "when_not_to_use",
+    "tags",
+    "times_used",
+    "success_rate",
+    "avg_effectiveness_score",
+)
+
+# Extra columns read by loaders and the delta sync (embedding_hash:
+# migration 012, tells the sync which vectors changed)
+SYNC_COLUMNS = ("is_active", "updated_at", "embedding_hash")
+
+# Rows per page of full KB loads (below PostgREST's default max-rows of 1000)
+KB_PAGE_SIZE = 500
+
+
+# ============================================================================
+# STRATEGY INDEX
+# ============================================================================
+
+class StrategyIndex:
+    """
+    In-memory KB index with exact and two-stage vector search.
+
+    Usage:
+        index = StrategyIndex.from_kb_rows(rows)
+        matches = index.search(embedding, distance="10k", runner_level="intermediate")
+    """
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        prefix_dims: int = PREFIX_DIMS,
+        embedding_model: str = EMBEDDING_MODEL,
+        quantization: Optional[str] = None,
+        min_recall: float = DEFAULT_MIN_RECALL,
+        exact_rerank: bool = False
+    ):
+        """
+        Build the index.
+
+        Args:
+            rows: KB rows (coaching_strategies_kb columns, without embeddings)
+            embeddings: (n, dims) matrix aligned with rows
+            prefix_dims: Prefix length used by the two-stage first pass
+            embedding_model: Model that produced the embeddings
+            quantization: None (float32), "int8" or "float16"
+            min_recall: Top-k recall bar the quantized store must meet
+            exact_rerank: Keep float32 rows in a memory-mapped file and
+                rerank quantized candidates from it
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(rows):
+            raise ValueError("embeddings must be a (len(rows), dims) matrix")
+
+        self.embedding_model = embedding_model
+        self.embedding_version: Optional[str] = None  # Set by IndexRegistry
+        self.prefix_dims = min(prefix_dims, embeddings.shape[1])
+
+        # Row metadata
+        self.rows: Sequence[Dict[str, Any]] = [
+            {k: v for k, v in r.items() if k != "strategy_embedding"} for r in rows
+        ]
+        self.ids: Sequence[str] = [r["id"] for r in self.rows]
+        self._positions: Optional[Dict[str, int]] = None
+
+        # Newest updated_at seen (ISO string), the delta sync starting point
+        self.watermark: Optional[str] = max((r["updated_at"] for r in self.rows if r.get("updated_at")), default=None)
+
+        # Contiguous (start, end) row ranges per distance, when rows are sorted
+        self.partitions: Optional[Dict[str, Tuple[int, int]]] = None
+
+        # Bumped whenever a row's text fields change (lexical index rebuilds)
+        self.text_generation = 0
+
+        # Columnar filter/ranking fields
+        self.distance = np.array([r.get("distance", "") for r in self.rows], dtype=object)
+        self.runner_level = np.array([r.get("runner_level", "all") for r in self.rows], dtype=object)
+        self.strategy_type = np.array([r.get("type", "") for r in self.rows], dtype=object)
+        self.success_rate = np.array([r.get("success_rate") or 0.0 for r in self.rows], dtype=np.float32)
+        self.avg_effectiveness = np.array([r.get("avg_effectiveness_score") or 0.0 for r in self.rows], dtype=np.float32)
+        self.times_used = np.array([r.get("times_used") or 0 for r in self.rows], dtype=np.int64)
+        self.active = np.array([r.get("is_active", True) for r in self.rows], dtype=bool)
+
+        # Tags as a packed bitmask over a sorted vocabulary
+        self.tag_vocab: List[str] = sorted({t for r in self.rows for t in (r.get("tags") or [])})
+        self.tags_mask = self.encode_tags_matrix([r.get("tags") or [] for r in self.rows])
+
+        # Full-precision and prefix matrices (both L2-normalized)
+        self.embeddings: Optional[np.ndarray] = np.ascontiguousarray(normalize(embeddings))
+        self.prefix: Optional[np.ndarray] = np.ascontiguousarray(normalize(self.embeddings[:, :self.prefix_dims]))
+
+        self.quantized: Optional[QuantizedEmbeddingStore] = None
+        self.quantized_prefix: Optional[QuantizedEmbeddingStore] = None
+        if quantization is not None:
+            rerank_hook = MappedFloat32Store(self.embeddings) if exact_rerank else None
+            self.quantize(quantization, min_recall, rerank_hook)
+
+    def quantize(
+        self,
+        mode: str,
+        min_recall: float = DEFAULT_MIN_RECALL,
+        rerank_hook: Optional[RerankHook] = None
+    ):
+        """
+        Replace both float32 matrices with quantized storage.
+
+        Args:
+            mode: "int8" or "float16"
+            min_recall: Top-k recall bar the quantized store must meet
+            rerank_hook: Exact scorer for the top quantized candidates,
+                e.g. MappedFloat32Store over the snapshot matrix
+        """
+        self.quantized = QuantizedEmbeddingStore.build(self.embeddings, mode, min_recall, rerank_hook=rerank_hook)
+        self.quantized_prefix = QuantizedEmbeddingStore.from_embeddings(self.prefix, self.quantized.mode)
+        self.embeddings = None
+        self.prefix = None
+
+    @classmethod
+    def from_columns(
+        cls,
+        rows: Sequence[Dict[str, Any]],
+        ids: Sequence[str],
+        columns: Dict[str, np.ndarray],
+        tag_vocab: List[str],
+        embeddings: np.ndarray,
+        prefix: np.ndarray,
+        embedding_model: str = EMBEDDING_MODEL,
+        partitions: Optional[Dict[str, Tuple[int, int]]] = None,
+        watermark: Optional[str] = None,
+        embedding_version: Optional[str] = None
+    ) -> "StrategyIndex":
+        """
+        Assemble an index from prebuilt columns without copying.
+
+        Used by snapshot / shared-memory loaders; embeddings and prefix
+        must already be L2-normalized (they may be read-only views).
+        """
+        index = cls.__new__(cls)
+        index.embedding_model = embedding_model
+        index.embedding_version = embedding_version
+        index.prefix_dims = prefix.shape[1]
+        index.rows = rows
+        index.ids = ids
+        index._positions = None
+        index.watermark = watermark
+        index.partitions = partitions
+        index.text_generation = 0
+        index.distance = columns["distance"]
+        index.runner_level = columns["runner_level"]
+        index.strategy_type = columns["strategy_type"]
+        index.success_rate = columns["success_rate"]
+        index.avg_effectiveness = columns["avg_effectiveness"]
+        index.times_used = columns["times_used"]
+        index.active = columns["active"]
+        index.tag_vocab = tag_vocab
+        index.tags_mask = columns["tags_mask"]
+        index.embeddings = embeddings
+        index.prefix = prefix
+        index.quantized = None
+        index.quantized_prefix = None
+        return index
+
+    @classmethod
+    def from_kb_rows(cls, rows: Iterable[Dict[str, Any]], **kwargs) -> "StrategyIndex":
+        """
+        Build from PostgREST coaching_strategies_kb rows.
+
+        strategy_embedding may be a pgvector literal or an array;
+        rows without an embedding are skipped.
+        """
+        kept, vectors = [], []
+        for row in rows:
+            embedding = row.get("strategy_embedding")
+            if embedding is None:
+                continue
+            if isinstance(embedding, str):
+                embedding = from_pgvector(embedding)
+            kept.append(row)
+            vectors.append(np.asarray(embedding, dtype=np.float32))
+
+        if not vectors:
+            raise ValueError("No KB rows with embeddings")
+
+        return cls(kept, np.vstack(vectors), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, strategy_id: str) -> Optional[int]:
+        """Row position of a strategy id (lookup table built on first use)."""
+        if self._positions is None:
+            self._positions = {sid: i for i, sid in enumerate(self.ids)}
+        return self._positions.get(strategy_id)
+
+    # ========================================================================
+    # TAGS
+    # ========================================================================
+
+    def encode_tags(self, tags: Iterable[str]) -> np.ndarray:
+        """Packed bitmask for a tag list (unknown tags are ignored)."""
+        return self.encode_tags_matrix([tags])[0]
+
+    def encode_tags_matrix(self, tag_lists: Sequence[Iterable[str]]) -> np.ndarray:
+        """(n, ceil(vocab/8)) packed bitmask matrix for tag lists."""
+        slots = {t: i for i, t in enumerate(self.tag_vocab)}
+        bits = np.zeros((len(tag_lists), max(len(self.tag_vocab), 1)), dtype=bool)
+        for row, tags in enumerate(tag_lists):
+            for tag in tags:
+                if tag in slots:
+                    bits[row, slots[tag]] = True
+        return np.packbits(bits, axis=1)
+
+    def decode_tags(self, position: int) -> List[str]:
+        """Tag list for the row at position."""
+        bits = np.unpackbits(self.tags_mask[position])[:len(self.tag_vocab)]
+        return [self.tag_vocab[i] for i in np.flatnonzero(bits)]
+
+    def tag_overlap(self, positions: np.ndarray, tags: Iterable[str]) -> np.ndarray:
+        """Number of tags each row at positions shares with tags."""
+        shared = self.tags_mask[positions] & self.encode_tags(tags)
+        return np.unpackbits(shared, axis=1).sum(axis=1)
+
+    def _extend_tag_vocab(self, tags: Iterable[str]):
+        """Add unseen tags to the vocabulary, widening the bitmask if needed."""
+        new = sorted(set(tags) - set(self.tag_vocab))
+        if not new:
+            return
+        self.tag_vocab = list(self.tag_vocab) + new
+        width = -(-len(self.tag_vocab) // 8)
+        if width > self.tags_mask.shape[1]:
+            pad = np.zeros((self.tags_mask.shape[0], width - self.tags_mask.shape[1]), dtype=np.uint8)
+            self.tags_mask = np.hstack([self.tags_mask, pad])
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by embedding storage (full + prefix)."""
+        if self.quantized is not None:
+            return self.quantized.nbytes + self.quantized_prefix.nbytes
+        return self.embeddings.nbytes + self.prefix.nbytes
+
+    # ========================================================================
+    # INCREMENTAL UPDATES
+    # ========================================================================
+
+    def _ensure_writable(self):
+        """
+        Copy read-only storage (snapshot / shared-memory views) before a write.
+
+        Lazy snapshot rows are materialized once as plain dicts.
+        """
+        if not isinstance(self.rows, list):
+            self.rows = [dict(r) for r in self.rows]
+        if not isinstance(self.ids, list):
+            self.ids = list(self.ids)
+        for attr in ("success_rate", "avg_effectiveness", "times_used", "active", "tags_mask", "embeddings", "prefix"):
+            array = getattr(self, attr)
+            if array is not None and not array.flags.writeable:
+                setattr(self, attr, array.copy())
+
+    def _update_row(self, position: int, row: Dict[str, Any]):
+        """Overwrite metadata columns of one row from a KB row."""
+        merged = self.rows[position]
+        if any(field in row and row[field] != merged.get(field) for field in TEXT_FIELDS):
+            self.text_generation += 1
+        merged.update({k: v for k, v in row.items() if k != "strategy_embedding"})
+
+        distance = merged.get("distance", "")
+        if self.distance[position] != distance:
+            # The row leaves its distance slice
+            self.partitions = None
+        self.distance[position] = distance
+        self.runner_level[position] = merged.get("runner_level", "all")
+        self.strategy_type[position] = merged.get("type", "")
+        self.success_rate[position] = merged.get("success_rate") or 0.0
+        self.avg_effectiveness[position] = merged.get("avg_effectiveness_score") or 0.0
+        self.times_used[position] = merged.get("times_used") or 0
+        self.active[position] = merged.get("is_active", True)
+        if "tags" in row:
+            self._extend_tag_vocab(row["tags"] or [])
+            self.tags_mask[position] = self.encode_tags(row["tags"] or [])
+
+    def _set_embeddings(self, positions: np.ndarray, embeddings: np.ndarray):
+        """Replace the stored vectors of rows at positions."""
+        full = normalize(embeddings)
+        prefix = normalize(full[:, :self.prefix_dims])
+        if self.quantized is not None:
+            self.quantized.replace(positions, full)
+            self.quantized_prefix.replace(positions, prefix)
+        else:
+            self.embeddings[positions] = full
+            self.prefix[positions] = prefix
+
+    def _append(self, rows: List[Dict[str, Any]], embeddings: np.ndarray):
+        """Append new rows (one array reallocation per column per batch)."""
+        start = len(self)
+        rows = [{k: v for k, v in r.items() if k != "strategy_embedding"} for r in rows]
+        self._extend_tag_vocab(t for r in rows for t in (r.get("tags") or []))
+
+        self.rows.extend(rows)
+        self.ids.extend(r["id"] for r in rows)
+        if self._positions is not None:
+            self._positions.update((r["id"], start + i) for i, r in enumerate(rows))
+
+        def grow(column: np.ndarray, values: List[Any]) -> np.ndarray:
+            return np.concatenate([column, np.array(values, dtype=column.dtype)])
+
+        self.distance = grow(self.distance, [r.get("distance", "") for r in rows])
+        self.runner_level = grow(self.runner_level, [r.get("runner_level", "all") for r in rows])
+        self.strategy_type = grow(self.strategy_type, [r.get("type", "") for r in rows])
+        self.success_rate = grow(self.success_rate, [r.get("success_rate") or 0.0 for r in rows])
+        self.avg_effectiveness = grow(self.avg_effectiveness, [r.get("avg_effectiveness_score") or 0.0 for r in rows])
+        self.times_used = grow(self.times_used, [r.get("times_used") or 0 for r in rows])
+        self.active = grow(self.active, [r.get("is_active", True) for r in rows])
+        self.tags_mask = np.vstack([self.tags_mask, self.encode_tags_matrix([r.get("tags") or [] for r in rows])])
+
+        full = normalize(embeddings)
+        prefix = normalize(full[:, :self.prefix_dims])
+        if self.quantized is not None:
+            self.quantized.append(full)
+            self.quantized_prefix.append(prefix)
+        else:
+            self.embeddings = np.vstack([self.embeddings, full])
+            self.prefix = np.vstack([self.prefix, prefix])
+
+        # Appended rows break the distance-sorted layout
+        self.partitions = None
+        self.text_generation += 1
+
+    def apply_changes(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Apply changed coaching_strategies_kb rows in place.
+
+        - Known id: metadata/stats updated (vector too, if the row has one;
+          a changed distance drops the partition layout, changed text
+          fields bump text_generation)
+        - is_active false: row is deactivated (kept, filtered from search)
+        - Unknown active id with a strategy_embedding: appended
+        - Unknown id without an embedding: skipped
+
+        Returns:
+            Counts of inserted / updated / deactivated / skipped rows
+        """
+        counts = {"inserted": 0, "updated": 0, "deactivated": 0, "skipped": 0}
+        new_rows, new_vectors = [], []
+        changed_positions, changed_vectors = [], []
+
+        self._ensure_writable()
+
+        for row in rows:
+            position = self.position(row["id"])
+            embedding = row.get("strategy_embedding")
+            if isinstance(embedding, str):
+                embedding = from_pgvector(embedding)
+
+            if row.get("updated_at") and (self.watermark is None or row["updated_at"] > self.watermark):
+                self.watermark = row["updated_at"]
+
+            if position is None:
+                if embedding is None or row.get("is_active") is False:
+                    counts["skipped"] += 1
+                    continue
+                new_rows.append(row)
+                new_vectors.append(np.asarray(embedding, dtype=np.float32))
+                counts["inserted"] += 1
+                continue
+
+            was_active = bool(self.active[position])
+            self._update_row(position, row)
+            if embedding is not None:
+                changed_positions.append(position)
+                changed_vectors.append(np.asarray(embedding, dtype=np.float32))
+            counts["deactivated" if was_active and not self.active[position] else "updated"] += 1
+
+        if changed_positions:
+            self._set_embeddings(np.array(changed_positions), np.vstack(changed_vectors))
+        if new_rows:
+            self._append(new_rows, np.vstack(new_vectors))
+
+        return counts
+
+    # ========================================================================
+    # SEARCH
+    # ========================================================================
+
+    def candidate_positions(
+        self,
+        distance: Optional[str] = None,
+        runner_level: str = "all",
+        strategy_type: Optional[str] = None
+    ) -> np.ndarray:
+        """Positions of active rows matching the RPC filters."""
+        start, end = 0, len(self)
+
+        # Distance partitions are contiguous: only scan that slice
+        if distance is not None and self.partitions is not None:
+            start, end = self.partitions.get(distance, (0, 0))
+            distance = None
+
+        window = slice(start, end)
+        mask = self.active[window].copy()
+        if distance is not None:
+            mask &= self.distance[window] == distance
+        if runner_level and runner_level != "all":
+            levels = self.runner_level[window]
+            mask &= (levels == "all") | (levels == runner_level)
+        if strategy_type is not None:
+            mask &= self.strategy_type[window] == strategy_type
+        return np.flatnonzero(mask) + start
+
+    def similarity(self, positions: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Full-dimension cosine similarity for rows at positions."""
+        if self.quantized is not None:
+            return self.quantized.scores(normalize(query), positions)
+        return self.embeddings[positions] @ normalize(query)
+
+    def _prefix_similarity(self, positions: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Truncated-prefix cosine similarity for rows at positions."""
+        query_prefix = normalize(query[:self.prefix_dims])
+        if self.quantized_prefix is not None:
+            return self.quantized_prefix.scores(query_prefix, positions)
+        return self.prefix[positions] @ query_prefix
+
+    def rank_features(self, positions: np.ndarray, similarity: np.ndarray) -> Dict[str, np.ndarray]:
+        """Reranker features for rows at positions."""
+        return {
+            "similarity": similarity,
+            "success_rate": self.success_rate[positions],
+            "avg_effectiveness": self.avg_effectiveness[positions],
+            "times_used": self.times_used[positions],
+        }
+
+    def hybrid_scores(self, positions: np.ndarray, similarity: np.ndarray) -> np.ndarray:
+        """Hybrid ranking score for rows at positions."""
+        return HYBRID_RERANKER.scores(self.rank_features(positions, similarity))
+
+    def rank(self, positions: np.ndarray, similarity: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+        """Indices (into positions) of the top k by hybrid score, ties by times_used."""
+        return HYBRID_RERANKER.top_k(self.rank_features(positions, similarity), k)
+
+    def _scored_candidates(
+        self,
+        query: np.ndarray,
+        distance: Optional[str],
+        runner_level: str,
+        strategy_type: Optional[str],
+        mode: str,
+        rerank_depth: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Filtered candidates and their full-precision similarities."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        query = np.asarray(query, dtype=np.float32)
+        candidates = self.candidate_positions(distance, runner_level, strategy_type)
+
+        # Stage 1: hybrid score over prefix similarity, keep the top
+        # rerank_depth (same criterion as semantic_search_strategies_kb_two_stage)
+        if mode == "two_stage" and candidates.size > rerank_depth:
+            coarse = self.hybrid_scores(candidates, self._prefix_similarity(candidates, query))
+            keep = np.argpartition(-coarse, rerank_depth - 1)[:rerank_depth]
+            candidates = candidates[keep]
+
+        # Stage 2 (or exact): full-dimension cosine similarity
+        similarity = self.similarity(candidates, query)
+
+        # Exact rerank of the best quantized hits (the rest keep their
+        # approximate similarity)
+        if self.quantized is not None and self.quantized.rerank_hook is not None:
+            top = np.arange(candidates.size)
+            if candidates.size > rerank_depth:
+                top = np.argpartition(-self.hybrid_scores(candidates, similarity), rerank_depth - 1)[:rerank_depth]
+            similarity[top] = self.quantized.rerank_hook(candidates[top], normalize(query))
+        return candidates, similarity
+
+    def search_positions(
+        self,
+        query: np.ndarray,
+        distance: Optional[str] = None,
+        runner_level: str = "all",
+        strategy_type: Optional[str] = None,
+        match_threshold: float = 0.65,
+        match_count: int = 15,
+        mode: str = "exact",
+        rerank_depth: int = RERANK_DEPTH
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank rows for a query embedding.
+
+        Returns:
+            (positions, similarities) ordered by hybrid score
+        """
+        candidates, similarity = self._scored_candidates(
+            query, distance, runner_level, strategy_type, mode, rerank_depth
+        )
+        above = similarity >= match_threshold
+        candidates, similarity = candidates[above], similarity[above]
+
+        order = self.rank(candidates, similarity, match_count)
+        return candidates[order], similarity[order]
+
+    def similarity_search(
+        self,
+        query: np.ndarray,
+        distance: Optional[str] = None,
+        runner_level: str = "all",
+        strategy_type: Optional[str] = None,
+        match_count: int = 50,
+        mode: str = "exact",
+        rerank_depth: int = RERANK_DEPTH
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest rows by similarity alone (no success weighting).
+
+        Returns:
+            (positions, similarities) ordered by similarity
+        """
+        candidates, similarity = self._scored_candidates(
+            query, distance, runner_level, strategy_type, mode, rerank_depth
+        )
+        if candidates.size > match_count:
+            keep = np.argpartition(-similarity, match_count - 1)[:match_count]
+            candidates, similarity = candidates[keep], similarity[keep]
+        order = np.argsort(-similarity, kind="stable")
+        return candidates[order], similarity[order]
+
+    def search(self, query: np.ndarray, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Search the index. Accepts the same arguments as search_positions.
+
+        Returns:
+            KB rows with a "similarity" field, like semantic_search_strategies_kb
+        """
+        positions, similarity = self.search_positions(query, **kwargs)
+        return [
+            dict(self.rows[p], similarity=float(s))
+            for p, s in zip(positions.tolist(), similarity.tolist())
+        ]
+
+
+# ============================================================================
+# EVALUATION
+# ============================================================================
+
+def recall_at_k(
+    index: StrategyIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    mode: str = "two_stage",
+    **search_kwargs
+) -> float:
+    """
+    Mean recall@k of a search mode against exact search.
+
+    Queries with no exact results are skipped.
+    """
+    recalls = []
+    for query in np.atleast_2d(queries):
+        exact, _ = index.search_positions(query, match_count=k, mode="exact", **search_kwargs)
+        if exact.size == 0:
+            continue
+        approx, _ = index.search_positions(query, match_count=k, mode=mode, **search_kwargs)
+        recalls.append(np.intersect1d(exact, approx).size / exact.size)
+
+    return float(np.mean(recalls)) if recalls else 1.0
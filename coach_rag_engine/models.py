@@ -56,6 +56,17 @@ class TargetStatus(Enum):
     WAY_BEHIND = "way_behind"
 
 
+# Derived SituationContext flags
+SITUATION_FLAGS = (
+    "cardiac_drift",
+    "zone_too_high",
+    "injury_risk",
+    "form_breakdown",
+    "push_possible",
+    "recovery_needed"
+)
+
+
 # ============================================================================
 # INPUT MODELS
 # ============================================================================
@@ -209,6 +220,19 @@ class SituationContext:
         
         self.situation_tags = tags
         return tags
+    
+    def signature(self) -> str:
+        """Canonical situation signature (equal situations, equal strings)."""
+        flags = [name for name in SITUATION_FLAGS if getattr(self, name)]
+        return "|".join([
+            self.pace_trend.value,
+            self.hr_trend.value,
+            self.fatigue_level.value,
+            self.target_status.value,
+            ",".join(flags),
+            self.personality.value,
+            self.energy_level.value
+        ])
 
 
 # ============================================================================
@@ -295,6 +319,7 @@ class AdaptiveStrategyOutput:
     # Monitoring flags
     requires_outcome_check: bool = True  # Should check if this worked
     expected_outcome: str = ""  # What we expect to see if strategy works
+    suppressed: bool = False  # Situation unchanged: cached or hold result
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization."""
@@ -306,7 +331,8 @@ class AdaptiveStrategyOutput:
             "confidence_score": self.confidence_score,
             "priority_tags": self.priority_tags,
             "expected_outcome": self.expected_outcome,
-            "execution_id": self.execution_id
+            "execution_id": self.execution_id,
+            "suppressed": self.suppressed
         }
 
 
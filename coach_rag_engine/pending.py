@@ -0,0 +1,204 @@
+"""
+Pending Execution Store for Coach RAG AI Engine
+===============================================
+
+Executions wait here for their outcome (record_strategy_outcome,
+assess_strategy_effectiveness). Many never get one: abandoned runs,
+network failures, callers that never assess. The store is bounded so
+those do not accumulate for the life of the process:
+
+- entries expire ttl_seconds after the execution was recorded
+- beyond max_entries the oldest entries are evicted
+- entries are grouped by run (for_run / pop_run)
+
+Evicted executions are buffered so the engine can close them as
+"unmeasured" in one batch (take_evicted).
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .models import StrategyExecution
+except ImportError:
+    # Fallback for direct script execution
+    from models import StrategyExecution
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+PENDING_TTL_SECONDS = 3 * 3600.0    # Longer than any run + post-run assessment
+MAX_PENDING_EXECUTIONS = 10000
+MAX_EVICTED_BUFFER = 5000           # Evictions kept for auto-close
+CLOSE_BATCH_SIZE = 50               # Evictions closed as unmeasured per write
+
+
+# ============================================================================
+# PENDING EXECUTION STORE
+# ============================================================================
+
+class PendingExecutionStore:
+    """
+    Bounded, TTL-evicting map of execution id -> StrategyExecution.
+
+    Usage:
+        store = PendingExecutionStore()
+        store.add(execution)
+        execution = store.pop(execution_id)       # outcome recorded
+        for execution, reason in store.take_evicted():
+            ...                                   # close as unmeasured
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = PENDING_TTL_SECONDS,
+        max_entries: int = MAX_PENDING_EXECUTIONS,
+        keep_evicted: bool = False
+    ):
+        """
+        Args:
+            ttl_seconds: Lifetime of an execution without an outcome
+            max_entries: Executions kept (oldest evicted first)
+            keep_evicted: Buffer evicted executions for take_evicted()
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.keep_evicted = keep_evicted
+
+        # Insertion order == expiry order (one TTL for all entries)
+        self._entries: "OrderedDict[str, Tuple[StrategyExecution, float]]" = OrderedDict()
+        self._by_run: Dict[str, Dict[str, None]] = {}   # run -> ids, oldest first
+        self._evicted: List[Tuple[StrategyExecution, str]] = []
+
+        # Counters
+        self.added = 0
+        self.completed = 0
+        self.evictions = {"ttl": 0, "size": 0, "run": 0}
+        self.evicted_dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, execution_id: str) -> bool:
+        return self.get(execution_id) is not None
+
+    @property
+    def awaiting_close(self) -> int:
+        """Evicted executions buffered for take_evicted()."""
+        return len(self._evicted)
+
+    # ========================================================================
+    # ACCESS
+    # ========================================================================
+
+    def add(self, execution: StrategyExecution):
+        """Track an execution (evicts expired and, if full, the oldest)."""
+        self._expire()
+        if execution.id in self._entries:
+            self._remove(execution.id)
+
+        self._entries[execution.id] = (execution, time.monotonic())
+        if execution.run_id:
+            self._by_run.setdefault(execution.run_id, {})[execution.id] = None
+        self.added += 1
+
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)), "size")
+
+    def get(self, execution_id: str) -> Optional[StrategyExecution]:
+        """Pending execution, None if unknown or expired."""
+        entry = self._entries.get(execution_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl_seconds:
+            self._expire()
+            return None
+        return entry[0]
+
+    def pop(self, execution_id: str) -> Optional[StrategyExecution]:
+        """Remove an execution whose outcome was recorded."""
+        execution = self._remove(execution_id)
+        if execution is not None:
+            self.completed += 1
+        return execution
+
+    def for_run(self, run_id: str) -> List[StrategyExecution]:
+        """Pending executions of a run, oldest first."""
+        self._expire()
+        return [self._entries[i][0] for i in self._by_run.get(run_id, ())]
+
+    def pop_run(self, run_id: str) -> List[StrategyExecution]:
+        """Remove all pending executions of a run (evicted as "run")."""
+        executions = self.for_run(run_id)
+        for execution in executions:
+            self._evict(execution.id, "run")
+        return executions
+
+    # ========================================================================
+    # EVICTION
+    # ========================================================================
+
+    def _remove(self, execution_id: str) -> Optional[StrategyExecution]:
+        entry = self._entries.pop(execution_id, None)
+        if entry is None:
+            return None
+
+        execution = entry[0]
+        run_ids = self._by_run.get(execution.run_id)
+        if run_ids is not None:
+            run_ids.pop(execution_id, None)
+            if not run_ids:
+                del self._by_run[execution.run_id]
+        return execution
+
+    def _evict(self, execution_id: str, reason: str):
+        execution = self._remove(execution_id)
+        if execution is None:
+            return
+        self.evictions[reason] += 1
+        if self.keep_evicted:
+            if len(self._evicted) >= MAX_EVICTED_BUFFER:
+                self._evicted.pop(0)
+                self.evicted_dropped += 1
+            self._evicted.append((execution, reason))
+
+    def _expire(self):
+        """Evict expired entries (front of the insertion order)."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            execution_id, (_, added_at) = next(iter(self._entries.items()))
+            if added_at > cutoff:
+                break
+            self._evict(execution_id, "ttl")
+
+    def take_evicted(self) -> List[Tuple[StrategyExecution, str]]:
+        """Evicted (execution, reason) pairs since the last call."""
+        self._expire()
+        evicted, self._evicted = self._evicted, []
+        return evicted
+
+    def restore_evicted(self, evicted: List[Tuple[StrategyExecution, str]]):
+        """Put back evicted pairs whose close was not written (retried first)."""
+        self._evicted[:0] = evicted
+        overflow = len(self._evicted) - MAX_EVICTED_BUFFER
+        if overflow > 0:
+            del self._evicted[:overflow]
+            self.evicted_dropped += overflow
+
+    def metrics(self) -> Dict[str, Any]:
+        """Size, completion and eviction counts."""
+        self._expire()
+        return {
+            "pending": len(self._entries),
+            "runs": len(self._by_run),
+            "added": self.added,
+            "completed": self.completed,
+            "evicted_ttl": self.evictions["ttl"],
+            "evicted_size": self.evictions["size"],
+            "evicted_run": self.evictions["run"],
+            "awaiting_close": self.awaiting_close,
+            "evicted_dropped": self.evicted_dropped,
+        }
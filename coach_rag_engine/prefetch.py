@@ -0,0 +1,324 @@
+"""
+Speculative Strategy Prefetch for Coach RAG AI Engine
+=====================================================
+
+Runner situations evolve predictably: moderate fatigue becomes high
+fatigue, rising HR becomes spiking HR with cardiac drift. Between coaching
+ticks a run session precomputes strategies for the most likely next
+situations, so the next real request is a cache hit.
+
+Predictions come from a transition table over situation states
+(pace trend, HR trend, fatigue, target status), counted from consecutive
+strategy_executions of the same run. States without history fall back to
+a small escalation prior (fatigue one level up, HR rising -> spiking,
+stable pace -> declining).
+
+A predicted state is turned into a SituationContext by applying it to the
+current PerformanceAnalysis (derived flags such as cardiac drift are
+recomputed), and cached by its canonical signature.
+"""
+
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        PaceTrend,
+        HRTrend,
+        FatigueLevel,
+        TargetStatus
+    )
+except ImportError:
+    # Fallback for direct script execution
+    from models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        PaceTrend,
+        HRTrend,
+        FatigueLevel,
+        TargetStatus
+    )
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+HISTORY_LIMIT = 5000        # Recent executions used for the transition table
+PREFETCH_BREADTH = 2        # Next situations precomputed per tick
+MIN_PROBABILITY = 0.15      # Skip unlikely transitions
+PRIOR_WEIGHT = 0.5          # Pseudo-count of each escalation prior
+CACHE_TTL_SECONDS = 300.0
+CACHE_SIZE = 32
+
+# (pace_trend, hr_trend, fatigue, target_status) values
+State = Tuple[str, str, str, str]
+
+FATIGUE_ORDER = [f.value for f in FatigueLevel]
+
+ComputeStrategy = Callable[[SituationContext, PerformanceAnalysis], Awaitable[AdaptiveStrategyOutput]]
+BuildContext = Callable[[PerformanceAnalysis], SituationContext]
+
+
+def perf_state(perf: PerformanceAnalysis) -> State:
+    """Situation state of a performance analysis."""
+    return (perf.pace_trend.value, perf.hr_trend.value, perf.fatigue_level.value, perf.target_status.value)
+
+
+def execution_state(execution_context: Dict[str, Any]) -> Optional[State]:
+    """Situation state of a strategy_executions.execution_context (None if incomplete)."""
+    state = tuple(execution_context.get(k) for k in ("pace_trend", "hr_trend", "fatigue", "target_status"))
+    try:
+        PaceTrend(state[0]), HRTrend(state[1]), FatigueLevel(state[2]), TargetStatus(state[3])
+    except ValueError:
+        return None
+    return state
+
+
+def apply_state(perf: PerformanceAnalysis, state: State) -> PerformanceAnalysis:
+    """Copy of perf in another situation state (numbers unchanged)."""
+    return replace(
+        perf,
+        pace_trend=PaceTrend(state[0]),
+        hr_trend=HRTrend(state[1]),
+        fatigue_level=FatigueLevel(state[2]),
+        target_status=TargetStatus(state[3])
+    )
+
+
+# ============================================================================
+# TRANSITION TABLE
+# ============================================================================
+
+class TransitionTable:
+    """
+    Next-state counts between consecutive executions of a run.
+
+    Usage:
+        table = TransitionTable.from_executions(rows)
+        table.predict(perf_state(perf))   # [(state, probability), ...]
+    """
+
+    def __init__(self, prior_weight: float = PRIOR_WEIGHT):
+        self.prior_weight = prior_weight
+        self.counts: Dict[State, Counter] = {}
+        self.runs = 0
+
+    @classmethod
+    def from_executions(cls, rows: Iterable[Dict[str, Any]], **kwargs) -> "TransitionTable":
+        """
+        Build from strategy_executions rows (run_id, executed_at, execution_context).
+
+        Rows may come in any order; they are grouped by run and sorted by time.
+        """
+        runs: Dict[str, List[Tuple[str, State]]] = {}
+        for row in rows:
+            state = execution_state(row.get("execution_context") or {})
+            if row.get("run_id") and state is not None:
+                runs.setdefault(row["run_id"], []).append((row.get("executed_at") or "", state))
+
+        table = cls(**kwargs)
+        for executions in runs.values():
+            executions.sort(key=lambda e: e[0])
+            table.add_run([state for _, state in executions])
+        return table
+
+    def add_run(self, states: List[State]):
+        """Count the state changes of one run."""
+        self.runs += 1
+        for current, following in zip(states, states[1:]):
+            if following != current:
+                self.counts.setdefault(current, Counter())[following] += 1
+
+    def _prior(self, state: State) -> Dict[State, float]:
+        """Escalation prior for states with little history."""
+        pace, hr, fatigue, target = state
+        prior = {}
+
+        level = FATIGUE_ORDER.index(fatigue)
+        if level + 1 < len(FATIGUE_ORDER):
+            prior[(pace, hr, FATIGUE_ORDER[level + 1], target)] = self.prior_weight
+        if hr == HRTrend.RISING.value:
+            prior[(pace, HRTrend.SPIKING.value, fatigue, target)] = self.prior_weight
+        elif hr == HRTrend.STABLE.value:
+            prior[(pace, HRTrend.RISING.value, fatigue, target)] = self.prior_weight
+        if pace == PaceTrend.STABLE.value:
+            prior[(PaceTrend.DECLINING.value, hr, fatigue, target)] = self.prior_weight
+        return prior
+
+    def predict(
+        self,
+        state: State,
+        n: int = PREFETCH_BREADTH,
+        min_probability: float = MIN_PROBABILITY
+    ) -> List[Tuple[State, float]]:
+        """Most likely next states, most likely first."""
+        weights = Counter(self._prior(state))
+        weights.update(self.counts.get(state, {}))
+
+        total = sum(weights.values())
+        if not total:
+            return []
+        return [
+            (following, count / total)
+            for following, count in weights.most_common(n)
+            if count / total >= min_probability
+        ]
+
+
+# ============================================================================
+# SPECULATIVE PREFETCHER
+# ============================================================================
+
+class SpeculativePrefetcher:
+    """
+    Strategy cache keyed by situation signature, filled ahead of time.
+
+    Usage:
+        prefetcher = SpeculativePrefetcher(compute, build_context, table)
+        strategy = await prefetcher.get(context, perf)   # hit, in-flight or computed
+        prefetcher.speculate(perf)                       # idle-time precompute
+    """
+
+    def __init__(
+        self,
+        compute: ComputeStrategy,
+        build_context: BuildContext,
+        table: TransitionTable,
+        breadth: int = PREFETCH_BREADTH,
+        min_probability: float = MIN_PROBABILITY,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        max_entries: int = CACHE_SIZE
+    ):
+        """
+        Args:
+            compute: (context, perf) -> strategy (retrieval + selection, no recording)
+            build_context: perf -> SituationContext for the run
+            table: Transition table used for predictions
+            breadth: Next situations precomputed per tick
+            min_probability: Minimum transition probability to precompute
+            ttl_seconds: Cached strategy lifetime
+            max_entries: Cache size (oldest dropped first)
+        """
+        self.compute = compute
+        self.build_context = build_context
+        self.table = table
+        self.breadth = breadth
+        self.min_probability = min_probability
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # signature -> (strategy, computed at, speculative and not yet used)
+        self._cache: "OrderedDict[str, Tuple[AdaptiveStrategyOutput, float, bool]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        # Counters
+        self.hits = 0
+        self.inflight_hits = 0
+        self.misses = 0
+        self.speculated = 0
+        self.wasted = 0
+        self.errors = 0
+
+    def _get_cached(self, signature: str) -> Optional[AdaptiveStrategyOutput]:
+        entry = self._cache.get(signature)
+        if entry is None:
+            return None
+        strategy, computed_at, unused = entry
+        if time.monotonic() - computed_at > self.ttl_seconds:
+            self._evict(signature)
+            return None
+        self._cache[signature] = (strategy, computed_at, False)
+        self._cache.move_to_end(signature)
+        return strategy
+
+    def _is_cached(self, signature: str) -> bool:
+        """Fresh cache entry present (does not count as use)."""
+        entry = self._cache.get(signature)
+        return entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds
+
+    def _store(self, signature: str, strategy: AdaptiveStrategyOutput, speculative: bool):
+        self._cache[signature] = (strategy, time.monotonic(), speculative)
+        self._cache.move_to_end(signature)
+        while len(self._cache) > self.max_entries:
+            self._evict(next(iter(self._cache)))
+
+    def _evict(self, signature: str):
+        _, _, unused = self._cache.pop(signature)
+        if unused:
+            self.wasted += 1
+
+    async def get(self, context: SituationContext, perf: PerformanceAnalysis) -> AdaptiveStrategyOutput:
+        """Strategy for the current situation (fresh copy, no execution id)."""
+        signature = context.signature()
+
+        strategy = self._get_cached(signature)
+        if strategy is not None:
+            self.hits += 1
+        elif signature in self._inflight:
+            self.inflight_hits += 1
+            await asyncio.shield(self._inflight[signature])
+            strategy = self._get_cached(signature)
+
+        if strategy is None:
+            self.misses += 1
+            strategy = await self.compute(context, perf)
+            self._store(signature, strategy, speculative=False)
+
+        return replace(strategy, execution_id=None)
+
+    def speculate(self, perf: PerformanceAnalysis):
+        """Start background precomputes for the likely next situations."""
+        for state, _ in self.table.predict(perf_state(perf), self.breadth, self.min_probability):
+            predicted_perf = apply_state(perf, state)
+            context = self.build_context(predicted_perf)
+            signature = context.signature()
+            if signature in self._inflight or self._is_cached(signature):
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._precompute(signature, context, predicted_perf))
+            self._inflight[signature] = task
+            task.add_done_callback(lambda _, s=signature: self._inflight.pop(s, None))
+
+    async def _precompute(self, signature: str, context: SituationContext, perf: PerformanceAnalysis):
+        try:
+            strategy = await self.compute(context, perf)
+            self._store(signature, strategy, speculative=True)
+            self.speculated += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            print(f"   ⚠️ Speculative prefetch error: {e}")
+
+    async def close(self):
+        """Cancel in-flight precomputes and drop the cache."""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.wasted += sum(1 for _, _, unused in self._cache.values() if unused)
+        self._cache.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Cache and speculation counters."""
+        requests = self.hits + self.inflight_hits + self.misses
+        return {
+            "hits": self.hits,
+            "inflight_hits": self.inflight_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.inflight_hits) / requests, 3) if requests else 0.0,
+            "speculated": self.speculated,
+            "wasted": self.wasted,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+            "cached": len(self._cache),
+        }
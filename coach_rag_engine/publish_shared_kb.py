@@ -0,0 +1,103 @@
+"""
+Publish Shared KB
+=================
+
+Loader process for the host-level shared-memory KB. Loads the KB (from
+Supabase or a snapshot file), publishes it into shared memory and, every
+interval, applies KB changes with the delta sync and republishes when
+anything changed. Engine workers attach with
+shared_kb_name (or COACH_RAG_SHARED_KB) and swap atomically to each new
+version.
+
+Usage:
+    python -m coach_rag_engine.publish_shared_kb runbot_kb --interval 300
+    python -m coach_rag_engine.publish_shared_kb runbot_kb --snapshot kb.snap
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+from engine import CoachRAGEngine
+from delta_sync import KBDeltaSync
+from local_index import StrategyIndex
+from shared_kb import SharedKBPublisher
+from snapshot import open_snapshot
+
+
+async def load_index(engine: CoachRAGEngine, snapshot_path: str) -> StrategyIndex:
+    """Load the KB index to publish (tagged with the active embedding set)."""
+    if snapshot_path:
+        return open_snapshot(snapshot_path)
+    rows = await engine._fetch_kb_rows()
+    return await engine._kb_index_from_rows(rows) if rows else None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Publish the KB into shared memory")
+    parser.add_argument("name", help="Shared memory name (e.g. runbot_kb)")
+    parser.add_argument("--snapshot", default="", help="Publish from a snapshot file instead of Supabase")
+    parser.add_argument("--interval", type=float, default=0, help="Sync and republish every N seconds (0 = publish once)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("COACH RAG KB - Shared Memory Publisher")
+    print("=" * 60)
+
+    load_dotenv()
+
+    engine = CoachRAGEngine(
+        supabase_url=os.getenv("SUPABASE_URL"),
+        supabase_anon_key=os.getenv("SUPABASE_ANON_KEY")
+    )
+    publisher = SharedKBPublisher(args.name)
+
+    try:
+        index = await load_index(engine, args.snapshot)
+        if index is None:
+            print("   ⚠️ No KB to publish")
+            return
+        publisher.publish(index)
+
+        if args.interval <= 0:
+            # Keep the segments alive until interrupted
+            await asyncio.Event().wait()
+
+        sync = KBDeltaSync(engine._fetch_kb_changes, engine._fetch_kb_embeddings, lambda: index)
+        while True:
+            await asyncio.sleep(args.interval)
+            try:
+                # A newly activated embedding set: republish it whole, so the
+                # header names the model workers embed queries with
+                active_set = await engine._fetch_active_embedding_set()
+                if active_set and active_set["version"] != index.embedding_version:
+                    rebuilt = await load_index(engine, "")
+                    if rebuilt is not None:
+                        index = rebuilt
+                        publisher.publish(index)
+                        continue
+
+                # Rows re-read in the overlap window don't move the watermark
+                watermark = index.watermark
+                await sync.sync_once()
+                if index.watermark != watermark:
+                    publisher.publish(index)
+            except Exception as e:
+                print(f"   ⚠️ KB delta sync error: {e}")
+
+    finally:
+        publisher.close()
+        await engine.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
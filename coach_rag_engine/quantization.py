@@ -0,0 +1,325 @@
+"""
+Quantized Embedding Store for Coach RAG AI Engine
+==================================================
+
+Compact in-memory storage for 1536-dim embeddings (KB strategies or
+run_performance history) that scores queries directly on quantized data.
+
+Modes:
+- "int8": per-vector scale/offset, 1 byte per dim (~4x smaller than float32)
+- "float16": half precision, 2 bytes per dim (~2x smaller)
+
+For int8, x ≈ scale * codes + offset, so
+    x · q ≈ scale * (codes · q) + offset * sum(q)
+and the kernel only ever upcasts one block of rows at a time.
+
+build() checks top-k recall against float32 exact search on perturbed KB
+rows (a stored row queried as-is always finds itself, inflating recall).
+
+An optional rerank hook rescores the top candidates at full precision,
+e.g. from a MappedFloat32Store (float32 rows in a memory-mapped file or
+snapshot, read only for the reranked rows).
+"""
+
+import tempfile
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .vectors import normalize
+except ImportError:
+    # Fallback for direct script execution
+    from vectors import normalize
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+QUANTIZATION_MODES = ("int8", "float16")
+
+BLOCK_ROWS = 2048       # Rows upcast per kernel block (~12 MB at 1536 dims)
+DEFAULT_MIN_RECALL = 0.95
+QUERY_NOISE = 1.0       # Recall-check noise norm relative to the (unit) row
+
+# (positions, normalized query) -> exact scores for those positions
+RerankHook = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+# ============================================================================
+# FULL-PRECISION RERANK SOURCE
+# ============================================================================
+
+class MappedFloat32Store:
+    """
+    L2-normalized float32 rows in a memory-mapped file, usable as a rerank
+    hook. Only the pages of the rows being reranked are read, so the
+    full-precision matrix stays out of the worker's resident memory.
+
+    Usage:
+        hook = MappedFloat32Store(embeddings)
+        scores = hook(positions, query)
+    """
+
+    def __init__(self, embeddings: np.ndarray):
+        """
+        Args:
+            embeddings: (n, dims) L2-normalized rows; read-only arrays
+                (snapshot / shared-memory views) are used in place until
+                the first write
+        """
+        if embeddings.flags.writeable:
+            embeddings = self._spill(embeddings)
+        self.embeddings = embeddings
+
+    @staticmethod
+    def _spill(embeddings: np.ndarray, rows: Optional[int] = None) -> np.ndarray:
+        """Copy into a new anonymous temp file mapping (rows >= len, zero padded)."""
+        rows = embeddings.shape[0] if rows is None else rows
+        mapped = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode="w+", shape=(rows, embeddings.shape[1]))
+        for start in range(0, embeddings.shape[0], BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, embeddings.shape[0])
+            mapped[start:end] = embeddings[start:end]
+        return mapped
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def __call__(self, positions: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return self.embeddings[positions] @ query
+
+    def append(self, embeddings: np.ndarray):
+        """Append normalized rows."""
+        start = len(self)
+        grown = self._spill(self.embeddings, start + embeddings.shape[0])
+        grown[start:] = embeddings
+        self.embeddings = grown
+
+    def replace(self, positions: np.ndarray, embeddings: np.ndarray):
+        """Overwrite normalized rows at positions."""
+        if not self.embeddings.flags.writeable:
+            self.embeddings = self._spill(self.embeddings)
+        self.embeddings[positions] = embeddings
+
+
+# ============================================================================
+# QUANTIZED STORE
+# ============================================================================
+
+class QuantizedEmbeddingStore:
+    """
+    Quantized embedding matrix with a blocked NumPy dot-product kernel.
+
+    Usage:
+        store = QuantizedEmbeddingStore.build(embeddings, mode="int8", min_recall=0.95)
+        positions, scores = store.top_k(query, k=15)
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scale: Optional[np.ndarray] = None,
+        offset: Optional[np.ndarray] = None,
+        rerank_hook: Optional[RerankHook] = None
+    ):
+        """
+        Wrap already-quantized data. Use from_embeddings()/build() to quantize.
+
+        Args:
+            codes: (n, dims) int8 codes or float16 values
+            scale: (n,) float32 per-vector scale (int8 only)
+            offset: (n,) float32 per-vector offset (int8 only)
+            rerank_hook: Optional exact scorer for top-k rerank (a
+                MappedFloat32Store follows append() / replace())
+        """
+        if codes.dtype == np.int8:
+            if scale is None or offset is None:
+                raise ValueError("int8 codes require per-vector scale and offset")
+            self.mode = "int8"
+        elif codes.dtype == np.float16:
+            self.mode = "float16"
+        else:
+            raise ValueError(f"Unsupported code dtype: {codes.dtype}")
+
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+        self.rerank_hook = rerank_hook
+
+        # Filled in by build()
+        self.measured_recall: Optional[float] = None
+
+    @classmethod
+    def from_embeddings(
+        cls,
+        embeddings: np.ndarray,
+        mode: str = "int8",
+        rerank_hook: Optional[RerankHook] = None
+    ) -> "QuantizedEmbeddingStore":
+        """Quantize a float matrix (rows are L2-normalized first)."""
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+
+        embeddings = normalize(embeddings)
+
+        if mode == "float16":
+            return cls(np.ascontiguousarray(embeddings, dtype=np.float16), rerank_hook=rerank_hook)
+
+        lo = embeddings.min(axis=1)
+        hi = embeddings.max(axis=1)
+        offset = ((hi + lo) / 2).astype(np.float32)
+        scale = ((hi - lo) / 254).astype(np.float32)
+        scale[scale == 0] = 1.0
+
+        codes = np.rint((embeddings - offset[:, None]) / scale[:, None])
+        codes = np.clip(codes, -127, 127).astype(np.int8)
+        return cls(np.ascontiguousarray(codes), scale, offset, rerank_hook)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        mode: str = "int8",
+        min_recall: float = DEFAULT_MIN_RECALL,
+        k: int = 15,
+        sample_queries: int = 64,
+        fallback: bool = True,
+        query_noise: float = QUERY_NOISE,
+        rerank_hook: Optional[RerankHook] = None
+    ) -> "QuantizedEmbeddingStore":
+        """
+        Quantize and check top-k recall against float32 exact search.
+
+        Recall is measured with sample_queries KB rows plus Gaussian noise
+        of norm ~query_noise as queries, so they are not stored rows. If the
+        bar is missed, int8 falls back to float16 (when fallback=True);
+        otherwise ValueError is raised. The bar applies to the quantized
+        scores alone, without the rerank hook.
+        """
+        embeddings = normalize(embeddings)
+        store = cls.from_embeddings(embeddings, mode)
+
+        rng = np.random.default_rng(0)
+        picks = rng.choice(len(embeddings), size=min(sample_queries, len(embeddings)), replace=False)
+        noise = rng.standard_normal((picks.size, embeddings.shape[1]), dtype=np.float32)
+        queries = embeddings[picks] + noise * (query_noise / np.sqrt(embeddings.shape[1]))
+        store.measured_recall = store.recall_at_k(embeddings, queries, k=k)
+
+        if store.measured_recall >= min_recall:
+            store.rerank_hook = rerank_hook
+            return store
+
+        if fallback and mode == "int8":
+            print(f"   ⚠️ int8 recall@{k} {store.measured_recall:.3f} < {min_recall:.3f}, falling back to float16")
+            return cls.build(embeddings, "float16", min_recall, k, sample_queries, False, query_noise, rerank_hook)
+
+        raise ValueError(f"{mode} recall@{k} {store.measured_recall:.3f} below bar {min_recall:.3f}")
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by codes and per-vector parameters."""
+        extra = 0 if self.scale is None else self.scale.nbytes + self.offset.nbytes
+        return self.codes.nbytes + extra
+
+    def append(self, embeddings: np.ndarray):
+        """Quantize and append new rows."""
+        embeddings = normalize(embeddings)
+        new = self.from_embeddings(embeddings, self.mode)
+        self.codes = np.vstack([self.codes, new.codes])
+        if self.mode == "int8":
+            self.scale = np.concatenate([self.scale, new.scale])
+            self.offset = np.concatenate([self.offset, new.offset])
+        if isinstance(self.rerank_hook, MappedFloat32Store):
+            self.rerank_hook.append(embeddings)
+
+    def replace(self, positions: np.ndarray, embeddings: np.ndarray):
+        """Re-quantize the rows at positions from new float vectors."""
+        embeddings = normalize(embeddings)
+        new = self.from_embeddings(embeddings, self.mode)
+        self.codes[positions] = new.codes
+        if self.mode == "int8":
+            self.scale[positions] = new.scale
+            self.offset[positions] = new.offset
+        if isinstance(self.rerank_hook, MappedFloat32Store):
+            self.rerank_hook.replace(positions, embeddings)
+
+    # ========================================================================
+    # SCORING KERNEL
+    # ========================================================================
+
+    def scores(self, query: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate dot products of query against stored rows.
+
+        Args:
+            query: (dims,) float query (normalize it for cosine similarity)
+            positions: Optional row subset; all rows when None
+
+        Returns:
+            (len(positions),) float32 scores
+        """
+        query = np.asarray(query, dtype=np.float32)
+        codes = self.codes if positions is None else self.codes[positions]
+
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS]
+            out[start:start + block.shape[0]] = block.astype(np.float32) @ query
+
+        if self.mode == "int8":
+            scale = self.scale if positions is None else self.scale[positions]
+            offset = self.offset if positions is None else self.offset[positions]
+            out = out * scale + offset * query.sum()
+
+        return out
+
+    def top_k(
+        self,
+        query: np.ndarray,
+        k: int = 15,
+        positions: Optional[np.ndarray] = None,
+        rerank_depth: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by score, optionally reranked exactly.
+
+        When a rerank hook is set, the top rerank_depth (default 4k)
+        approximate hits are rescored with it before the final cut.
+
+        Returns:
+            (positions, scores) sorted by descending score
+        """
+        if positions is None:
+            positions = np.arange(len(self))
+        scores = self.scores(query, positions)
+
+        depth = min(len(positions), rerank_depth or 4 * k) if self.rerank_hook else min(len(positions), k)
+        if depth == 0:
+            return positions[:0], scores[:0]
+
+        keep = np.argpartition(-scores, depth - 1)[:depth]
+        positions, scores = positions[keep], scores[keep]
+
+        if self.rerank_hook is not None:
+            scores = np.asarray(self.rerank_hook(positions, query), dtype=np.float32)
+
+        order = np.argsort(-scores)[:k]
+        return positions[order], scores[order]
+
+    # ========================================================================
+    # EVALUATION
+    # ========================================================================
+
+    def recall_at_k(self, reference: np.ndarray, queries: np.ndarray, k: int = 15) -> float:
+        """Mean recall@k against exact search over the float reference matrix."""
+        reference = normalize(reference)
+        recalls = []
+        for query in normalize(np.atleast_2d(queries)):
+            exact = np.argpartition(-(reference @ query), min(k, len(reference)) - 1)[:k]
+            approx, _ = self.top_k(query, k=k)
+            recalls.append(np.intersect1d(exact, approx).size / exact.size)
+        return float(np.mean(recalls)) if recalls else 1.0
@@ -0,0 +1,192 @@
+"""
+Vectorized Re-Ranker for Coach RAG AI Engine
+=============================================
+
+One scoring path for every place that orders strategy candidates: local
+and hybrid retrieval, the LLM condition-matcher sorts and the simple
+(no-LLM) strategy selection.
+
+Candidates are described by feature arrays:
+- similarity, match_score: vector / LLM relevance
+- success_rate, avg_effectiveness, times_used: self-learning stats
+- tag_overlap: tags shared with the current situation
+- source_tier: retrieval source prior (see SOURCE_TIERS)
+
+A Reranker scores them as one weighted sum (feature matrix @ weights),
+selects the top k with a partial partition (no full sort) and breaks ties
+lexicographically (e.g. by times_used) with lexsort.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .models import CoachingStrategy
+except ImportError:
+    # Fallback for direct script execution
+    from models import CoachingStrategy
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+FEATURES = (
+    "similarity",
+    "match_score",
+    "success_rate",
+    "avg_effectiveness",
+    "times_used",
+    "tag_overlap",
+    "source_tier",
+)
+
+# Retrieval source prior (with weight 0.2: database 0.2, other sources 0.1)
+SOURCE_TIERS = {"database": 1.0}
+DEFAULT_SOURCE_TIER = 0.5
+
+# No-LLM strategy selection
+SELECTION_WEIGHTS = {"success_rate": 0.4, "similarity": 0.3, "tag_overlap": 0.1, "source_tier": 0.2}
+
+# Ordering without relevance (no LLM / parse failure)
+SUCCESS_WEIGHTS = {"success_rate": 1.0}
+
+# Ordering of LLM-matched strategies (ties: success_rate, then times_used)
+MATCH_WEIGHTS = {"match_score": 1.0}
+
+
+# ============================================================================
+# FEATURE EXTRACTION
+# ============================================================================
+
+def _tag_overlap(tag_lists: Iterable[Iterable[str]], situation_tags: Optional[Iterable[str]]) -> np.ndarray:
+    situation = frozenset(situation_tags or ())
+    return np.fromiter(
+        (len(situation.intersection(tags or ())) for tags in tag_lists), dtype=np.float32
+    )
+
+
+def features_from_rows(
+    rows: Sequence[Dict[str, Any]],
+    situation_tags: Optional[Iterable[str]] = None
+) -> Dict[str, np.ndarray]:
+    """Feature arrays for KB row dicts (RPC / local search results)."""
+    def column(key: str, default: float = 0.0) -> np.ndarray:
+        return np.array([r.get(key) or default for r in rows], dtype=np.float32)
+
+    return {
+        "similarity": column("similarity"),
+        "match_score": column("match_score"),
+        "success_rate": column("success_rate"),
+        "avg_effectiveness": column("avg_effectiveness_score"),
+        "times_used": column("times_used"),
+        "tag_overlap": _tag_overlap((r.get("tags") for r in rows), situation_tags),
+        "source_tier": np.full(len(rows), DEFAULT_SOURCE_TIER, dtype=np.float32),
+    }
+
+
+def features_from_strategies(
+    strategies: Sequence[CoachingStrategy],
+    situation_tags: Optional[Iterable[str]] = None
+) -> Dict[str, np.ndarray]:
+    """Feature arrays for CoachingStrategy objects."""
+    return {
+        "similarity": np.array([s.similarity_score for s in strategies], dtype=np.float32),
+        "match_score": np.array([s.similarity_score for s in strategies], dtype=np.float32),
+        "success_rate": np.array([s.success_rate for s in strategies], dtype=np.float32),
+        "avg_effectiveness": np.array([s.avg_effectiveness_score for s in strategies], dtype=np.float32),
+        "times_used": np.array([s.times_used for s in strategies], dtype=np.float32),
+        "tag_overlap": _tag_overlap((s.tags for s in strategies), situation_tags),
+        "source_tier": np.array(
+            [SOURCE_TIERS.get(s.source, DEFAULT_SOURCE_TIER) for s in strategies], dtype=np.float32
+        ),
+    }
+
+
+# ============================================================================
+# RERANKER
+# ============================================================================
+
+class Reranker:
+    """
+    Weighted linear scorer with partial top-k selection.
+
+    Usage:
+        reranker = Reranker(SELECTION_WEIGHTS)
+        best = reranker.rank_strategies(strategies, k=1, situation_tags=tags)
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        tiebreak: Sequence[str] = ("times_used",)
+    ):
+        """
+        Args:
+            weights: Feature name -> weight (unknown features raise)
+            tiebreak: Features that break score ties, in priority order
+        """
+        unknown = (set(weights) | set(tiebreak)) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown rerank features: {sorted(unknown)}")
+
+        self.weights = dict(weights)
+        self.tiebreak = tuple(tiebreak)
+        self._names = list(self.weights)
+        self._vector = np.array([self.weights[n] for n in self._names], dtype=np.float32)
+
+    def scores(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Weighted score of every candidate."""
+        matrix = np.column_stack([np.asarray(features[n], dtype=np.float32) for n in self._names])
+        return matrix @ self._vector
+
+    def top_k(
+        self,
+        features: Dict[str, np.ndarray],
+        k: Optional[int] = None,
+        scores: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Indices of the best k candidates, best first.
+
+        The partition keeps every candidate tied with the k-th score, so the
+        tiebreak order is exact.
+        """
+        scores = self.scores(features) if scores is None else scores
+        n = scores.shape[0]
+        candidates = np.arange(n)
+
+        if k is not None and k < n:
+            if k <= 0:
+                return candidates[:0]
+            kth = np.partition(scores, n - k)[n - k]
+            candidates = np.flatnonzero(scores >= kth)
+
+        # lexsort: last key is primary
+        keys = [-np.asarray(features[name])[candidates] for name in reversed(self.tiebreak)]
+        order = np.lexsort(keys + [-scores[candidates]])
+        return candidates[order][:k]
+
+    def rank_rows(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        k: Optional[int] = None,
+        situation_tags: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k KB row dicts, best first."""
+        if not rows:
+            return []
+        return [rows[i] for i in self.top_k(features_from_rows(rows, situation_tags), k).tolist()]
+
+    def rank_strategies(
+        self,
+        strategies: Sequence[CoachingStrategy],
+        k: Optional[int] = None,
+        situation_tags: Optional[Iterable[str]] = None
+    ) -> List[CoachingStrategy]:
+        """Top-k CoachingStrategy objects, best first."""
+        if not strategies:
+            return []
+        features = features_from_strategies(strategies, situation_tags)
+        return [strategies[i] for i in self.top_k(features, k).tolist()]
@@ -0,0 +1,371 @@
+"""
+Streaming Effectiveness Rollups for Coach RAG AI Engine
+=======================================================
+
+Maintains strategy_effectiveness_evolution as per-strategy, per-period
+running statistics (outcome count, success ratio, effectiveness score
+mean and variance) without re-aggregating strategy_executions.
+
+A job consumes measured outcomes as a stream, keyset-paginated on
+(outcome_measured_at, id) past a watermark:
+
+    order=outcome_measured_at.asc,id.asc
+    or=(outcome_measured_at.gt.<ts>,and(outcome_measured_at.eq.<ts>,id.gt.<id>))
+
+Every outcome is an O(1) Welford update of its (strategy, period)
+accumulator. Accumulated deltas are upserted in one batch through
+upsert_strategy_effectiveness_rollups, which merges them into the stored
+rows (Chan's parallel combination of mean / M2) and advances the job's
+watermark in the same transaction. The RPC only applies a batch whose
+starting watermark matches the stored one, so a retried or concurrent
+batch is never counted twice.
+
+Outcomes younger than settle_seconds are left for the next cycle:
+outcome_measured_at is the writer's transaction start, so a slow
+transaction can commit a row older than the newest one already seen.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .timestamps import parse_timestamp
+except ImportError:
+    # Fallback for direct script execution
+    from timestamps import parse_timestamp
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+PERIODS = ("day", "week")
+ROLLUP_INTERVAL_SECONDS = 60.0
+PAGE_SIZE = 1000
+SETTLE_SECONDS = 120.0
+MAX_ROLLUP_KEYS = 5000          # Accumulators held before an intermediate flush
+
+# (outcome_measured_at, execution_id) of the last outcome folded in
+Watermark = Tuple[Optional[str], Optional[str]]
+
+# (watermark, before, limit) -> measured outcome rows
+FetchOutcomes = Callable[[Watermark, str, int], Awaitable[List[Dict[str, Any]]]]
+
+# (job) -> stored watermark
+LoadWatermark = Callable[[str], Awaitable[Watermark]]
+
+# (job, rollups, expected watermark, new watermark, outcomes) -> applied
+UpsertRollups = Callable[[str, List[Dict[str, Any]], Watermark, Watermark, int], Awaitable[bool]]
+
+
+def period_start(moment: datetime, period: str) -> datetime:
+    """Start (UTC) of the day / ISO week containing moment."""
+    day = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown period: {period}")
+
+
+# ============================================================================
+# RUNNING STATISTICS
+# ============================================================================
+
+class RunningStats:
+    """Outcome count, successes and Welford mean / M2 of effectiveness scores."""
+
+    __slots__ = ("count", "successes", "score_count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.successes = 0
+        self.score_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, was_effective: bool, score: Optional[float] = None):
+        """Fold in one outcome (O(1))."""
+        self.count += 1
+        if was_effective:
+            self.successes += 1
+        if score is not None:
+            self.score_count += 1
+            delta = score - self.mean
+            self.mean += delta / self.score_count
+            self.m2 += delta * (score - self.mean)
+
+    def merge(self, other: "RunningStats"):
+        """Combine with another accumulator (Chan et al.)."""
+        n = self.score_count + other.score_count
+        if other.score_count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.score_count / n
+            self.m2 += other.m2 + delta * delta * self.score_count * other.score_count / n
+        self.count += other.count
+        self.successes += other.successes
+        self.score_count = n
+
+    @property
+    def success_ratio(self) -> float:
+        return self.successes / self.count if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of the scores."""
+        return self.m2 / (self.score_count - 1) if self.score_count > 1 else 0.0
+
+
+class EffectivenessRollup:
+    """
+    Running statistics per (strategy, period, period start).
+
+    Usage:
+        rollup = EffectivenessRollup()
+        rollup.add("S12", True, 0.8, measured_at)
+        rows = rollup.drain()       # upsert, accumulators reset
+    """
+
+    def __init__(self, periods: Sequence[str] = PERIODS):
+        unknown = set(periods) - set(PERIODS)
+        if unknown:
+            raise ValueError(f"Unknown periods: {sorted(unknown)}")
+        self.periods = tuple(periods)
+        self._stats: Dict[Tuple[str, str, datetime], RunningStats] = {}
+        self.outcomes = 0
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def add(self, strategy_id: str, was_effective: bool, score: Optional[float], measured_at: datetime):
+        """Fold one outcome into each of its periods."""
+        for period in self.periods:
+            key = (strategy_id, period, period_start(measured_at, period))
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RunningStats()
+            stats.add(was_effective, score)
+        self.outcomes += 1
+
+    def add_rows(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """
+        Fold in strategy_executions rows (strategy_id, was_effective,
+        effectiveness_score, outcome_measured_at).
+
+        Returns:
+            Number of outcomes folded in
+        """
+        added = 0
+        for row in rows:
+            if not row.get("strategy_id") or row.get("was_effective") is None:
+                continue
+            score = row.get("effectiveness_score")
+            self.add(
+                row["strategy_id"],
+                bool(row["was_effective"]),
+                float(score) if score is not None else None,
+                parse_timestamp(row["outcome_measured_at"])
+            )
+            added += 1
+        return added
+
+    def get(self, strategy_id: str, period: str, start: datetime) -> Optional[RunningStats]:
+        return self._stats.get((strategy_id, period, start))
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Accumulated deltas as upsert rows; resets the accumulators."""
+        rows = [
+            {
+                "strategy_id": strategy_id,
+                "period": period,
+                "period_start": start.isoformat(),
+                "outcome_count": stats.count,
+                "success_count": stats.successes,
+                "score_count": stats.score_count,
+                "score_mean": stats.mean if stats.score_count else None,
+                "score_m2": stats.m2,
+            }
+            for (strategy_id, period, start), stats in self._stats.items()
+        ]
+        self._stats = {}
+        self.outcomes = 0
+        return rows
+
+
+# ============================================================================
+# ROLLUP JOB
+# ============================================================================
+
+class RollupJob:
+    """
+    Background consumer of measured outcomes into strategy_effectiveness_evolution.
+
+    Usage:
+        job = RollupJob(fetch_outcomes, load_watermark, upsert_rollups)
+        job.start()
+        ...
+        print(job.metrics())
+        await job.stop()
+    """
+
+    def __init__(
+        self,
+        fetch_outcomes: FetchOutcomes,
+        load_watermark: LoadWatermark,
+        upsert_rollups: UpsertRollups,
+        job: str = "default",
+        periods: Sequence[str] = PERIODS,
+        interval: float = ROLLUP_INTERVAL_SECONDS,
+        page_size: int = PAGE_SIZE,
+        settle_seconds: float = SETTLE_SECONDS,
+        max_keys: int = MAX_ROLLUP_KEYS
+    ):
+        """
+        Args:
+            fetch_outcomes: Keyset-paginated measured-outcome query
+            load_watermark: Stored watermark of a job
+            upsert_rollups: Batch merge + watermark advance (False on conflict)
+            job: Watermark name (one stream position per job)
+            periods: Rollup periods ("day", "week")
+            interval: Seconds between cycles
+            page_size: Outcomes per page
+            settle_seconds: Age below which outcomes wait for the next cycle
+            max_keys: Accumulators held before flushing mid-cycle
+        """
+        self.fetch_outcomes = fetch_outcomes
+        self.load_watermark = load_watermark
+        self.upsert_rollups = upsert_rollups
+        self.job = job
+        self.interval = interval
+        self.page_size = page_size
+        self.settle_seconds = settle_seconds
+        self.max_keys = max_keys
+
+        self._rollup = EffectivenessRollup(periods)
+        self._watermark: Optional[Watermark] = None     # Stored position (None = reload)
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.cycles = 0
+        self.errors = 0
+        self.conflicts = 0
+        self.outcomes_applied = 0
+        self.batches = 0
+        self.rows_upserted = 0
+        self.last_outcomes_per_second = 0.0
+        self.caught_up_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def _flush(self, expected: Watermark, cursor: Watermark) -> bool:
+        """Upsert accumulated deltas and move the watermark to cursor."""
+        outcomes = self._rollup.outcomes
+        rows = self._rollup.drain()
+        if cursor == expected:
+            return True
+
+        if not await self.upsert_rollups(self.job, rows, expected, cursor, outcomes):
+            # Another run advanced the watermark: restart from the stored one
+            self.conflicts += 1
+            self._watermark = None
+            return False
+
+        self._watermark = cursor
+        self.batches += 1
+        self.rows_upserted += len(rows)
+        self.outcomes_applied += outcomes
+        return True
+
+    async def run_once(self) -> int:
+        """
+        Fold all settled outcomes past the watermark into the rollups.
+
+        Returns:
+            Number of outcomes applied
+        """
+        started = time.perf_counter()
+        before = (datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)).isoformat()
+        applied = self.outcomes_applied
+
+        try:
+            if self._watermark is None:
+                self._watermark = await self.load_watermark(self.job)
+            expected = cursor = self._watermark
+
+            while True:
+                rows = await self.fetch_outcomes(cursor, before, self.page_size)
+                if not rows:
+                    break
+
+                self._rollup.add_rows(rows)
+                cursor = (rows[-1]["outcome_measured_at"], rows[-1]["id"])
+
+                if len(self._rollup) >= self.max_keys:
+                    if not await self._flush(expected, cursor):
+                        return self.outcomes_applied - applied
+                    expected = cursor
+                if len(rows) < self.page_size:
+                    break
+
+            if not await self._flush(expected, cursor):
+                return self.outcomes_applied - applied
+        except BaseException:
+            # Unknown whether the last batch landed: drop the deltas, the
+            # stored watermark decides where the next cycle resumes
+            self._rollup.drain()
+            self._watermark = None
+            raise
+
+        elapsed = time.perf_counter() - started
+        applied = self.outcomes_applied - applied
+        self.cycles += 1
+        self.last_outcomes_per_second = applied / elapsed if elapsed > 0 else 0.0
+        self.caught_up_at = time.time()
+        return applied
+
+    async def _run(self):
+        """Poll loop; errors are counted and retried on the next tick."""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"   ⚠️ Effectiveness rollup error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background task (needs a running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Throughput, batches and stream position."""
+        watermark = self._watermark[0] if self._watermark else None
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "job": self.job,
+            "cycles": self.cycles,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "conflicts": self.conflicts,
+            "outcomes_applied": self.outcomes_applied,
+            "batches": self.batches,
+            "rows_upserted": self.rows_upserted,
+            "outcomes_per_second": round(self.last_outcomes_per_second, 1),
+            "lag_seconds": round(time.time() - self.caught_up_at, 1) if self.caught_up_at else None,
+            "watermark": watermark,
+        }
@@ -0,0 +1,266 @@
+"""
+Semantic Response Cache for Coach RAG AI Engine
+===============================================
+
+Similarity-keyed cache of final AdaptiveStrategyOutputs. Exact situation
+signatures miss when two runners are in nearly the same state; here a
+situation is a small feature vector and a lookup hits when a stored vector
+lies within a cosine radius.
+
+Situation vector (unit-normalized float32):
+- one-hot pace trend, HR trend, fatigue level, target status
+- derived flags (cardiac drift, zone too high, ...)
+- pace deviation, HR as a fraction of max HR, zone, run progress
+
+Entries are scoped by (personality, energy, distance category), so a hit
+always matches the coach settings and race distance. The cache is bounded
+(max_entries, least recently used evicted first) and entries expire after
+ttl_seconds.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        PaceTrend,
+        HRTrend,
+        FatigueLevel,
+        TargetStatus,
+        SITUATION_FLAGS
+    )
+except ImportError:
+    # Fallback for direct script execution
+    from models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        PaceTrend,
+        HRTrend,
+        FatigueLevel,
+        TargetStatus,
+        SITUATION_FLAGS
+    )
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+CACHE_RADIUS = 0.02         # Max cosine distance (1 - cosine similarity) for a hit
+RESPONSE_TTL_SECONDS = 600.0
+MAX_ENTRIES = 2048
+
+CATEGORIES = (
+    ("pace_trend", list(PaceTrend)),
+    ("hr_trend", list(HRTrend)),
+    ("fatigue_level", list(FatigueLevel)),
+    ("target_status", list(TargetStatus)),
+)
+
+VECTOR_DIMS = sum(len(values) for _, values in CATEGORIES) + len(SITUATION_FLAGS) + 4
+
+# (personality, energy, distance category)
+Scope = Tuple[str, str, str]
+
+
+def situation_vector(context: SituationContext, perf: PerformanceAnalysis) -> np.ndarray:
+    """Unit-normalized situation feature vector."""
+    vector = np.zeros(VECTOR_DIMS, dtype=np.float32)
+
+    offset = 0
+    for name, values in CATEGORIES:
+        vector[offset + values.index(getattr(context, name))] = 1.0
+        offset += len(values)
+
+    for i, flag in enumerate(SITUATION_FLAGS):
+        vector[offset + i] = float(getattr(context, flag))
+    offset += len(SITUATION_FLAGS)
+
+    vector[offset] = np.clip(perf.pace_deviation / 20.0, -1.0, 1.0)
+    if perf.current_hr and perf.max_hr:
+        vector[offset + 1] = min(perf.current_hr / perf.max_hr, 1.2)
+    vector[offset + 2] = (perf.current_zone or 0) / 5.0
+    if perf.target_distance > 0:
+        vector[offset + 3] = min(perf.current_distance / perf.target_distance, 1.2)
+
+    return vector / np.linalg.norm(vector)
+
+
+# ============================================================================
+# SCOPE STORAGE
+# ============================================================================
+
+class _ScopeEntries:
+    """Vectors and outputs of one scope (slots are reused after eviction)."""
+
+    def __init__(self, capacity: int = 16):
+        self.vectors = np.zeros((capacity, VECTOR_DIMS), dtype=np.float32)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.outputs: List[Optional[AdaptiveStrategyOutput]] = [None] * capacity
+        self.stored_at = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return int(self.valid.sum())
+
+    def nearest(self, vector: np.ndarray) -> Tuple[int, float]:
+        """(slot, cosine distance) of the closest valid entry."""
+        scores = np.where(self.valid, self.vectors @ vector, -np.inf)
+        slot = int(np.argmax(scores))
+        return slot, 1.0 - float(scores[slot])
+
+    def put(self, slot: Optional[int], vector: np.ndarray, output: AdaptiveStrategyOutput, now: float) -> int:
+        if slot is None:
+            free = np.flatnonzero(~self.valid)
+            if free.size == 0:
+                self._grow()
+                free = np.flatnonzero(~self.valid)
+            slot = int(free[0])
+
+        self.vectors[slot] = vector
+        self.valid[slot] = True
+        self.outputs[slot] = output
+        self.stored_at[slot] = now
+        return slot
+
+    def remove(self, slot: int):
+        self.valid[slot] = False
+        self.outputs[slot] = None
+
+    def _grow(self):
+        capacity = len(self.valid)
+        self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+        self.valid = np.concatenate([self.valid, np.zeros(capacity, dtype=bool)])
+        self.stored_at = np.concatenate([self.stored_at, np.zeros(capacity)])
+        self.outputs.extend([None] * capacity)
+
+
+# ============================================================================
+# SEMANTIC CACHE
+# ============================================================================
+
+class SemanticResponseCache:
+    """
+    Cosine-radius cache of strategy outputs per coach scope.
+
+    Usage:
+        cache = SemanticResponseCache(radius=0.02)
+        scope = ("strategist", "medium", "10k")
+        output = cache.lookup(scope, situation_vector(context, perf))
+        if output is None:
+            output = await select(...)
+            cache.store(scope, situation_vector(context, perf), output)
+    """
+
+    def __init__(
+        self,
+        radius: float = CACHE_RADIUS,
+        ttl_seconds: float = RESPONSE_TTL_SECONDS,
+        max_entries: int = MAX_ENTRIES
+    ):
+        """
+        Args:
+            radius: Max cosine distance between situations for a hit
+            ttl_seconds: Entry lifetime
+            max_entries: Entries kept across all scopes (LRU eviction)
+        """
+        self.radius = radius
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._scopes: Dict[Scope, _ScopeEntries] = {}
+        self._lru: "OrderedDict[Tuple[Scope, int], None]" = OrderedDict()
+
+        # Counters
+        self.lookups = 0
+        self.hits = 0
+        self.expired = 0
+        self.evicted = 0
+        self._hit_age_total = 0.0
+        self.max_hit_age = 0.0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def _remove(self, scope: Scope, slot: int):
+        entries = self._scopes[scope]
+        entries.remove(slot)
+        self._lru.pop((scope, slot), None)
+        if not len(entries):
+            del self._scopes[scope]
+
+    def lookup(self, scope: Scope, vector: np.ndarray) -> Optional[AdaptiveStrategyOutput]:
+        """Cached output for a situation within the radius (copy, no execution id)."""
+        self.lookups += 1
+        entries = self._scopes.get(scope)
+        if entries is None:
+            return None
+
+        slot, distance = entries.nearest(vector)
+        if distance > self.radius:
+            return None
+
+        age = time.monotonic() - float(entries.stored_at[slot])
+        if age > self.ttl_seconds:
+            self.expired += 1
+            self._remove(scope, slot)
+            return None
+
+        self.hits += 1
+        self._hit_age_total += age
+        self.max_hit_age = max(self.max_hit_age, age)
+        self._lru.move_to_end((scope, slot))
+        return replace(entries.outputs[slot], execution_id=None)
+
+    def store(self, scope: Scope, vector: np.ndarray, output: AdaptiveStrategyOutput):
+        """Cache an output (replaces a stored situation within the radius)."""
+        entries = self._scopes.get(scope)
+        if entries is None:
+            entries = self._scopes[scope] = _ScopeEntries()
+
+        slot = None
+        if len(entries):
+            nearest, distance = entries.nearest(vector)
+            if distance <= self.radius:
+                slot = nearest
+
+        slot = entries.put(slot, vector, output, time.monotonic())
+        self._lru[(scope, slot)] = None
+        self._lru.move_to_end((scope, slot))
+
+        while len(self._lru) > self.max_entries:
+            (old_scope, old_slot), _ = self._lru.popitem(last=False)
+            self.evicted += 1
+            self._remove(old_scope, old_slot)
+
+    def clear(self):
+        """Drop every entry (e.g. after a KB index swap)."""
+        self._scopes.clear()
+        self._lru.clear()
+
+    @property
+    def nbytes(self) -> int:
+        """Vector storage footprint."""
+        return sum(e.vectors.nbytes + e.stored_at.nbytes + e.valid.nbytes for e in self._scopes.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit rate, staleness and size."""
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "entries": len(self),
+            "scopes": len(self._scopes),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "mean_hit_age_seconds": round(self._hit_age_total / self.hits, 1) if self.hits else 0.0,
+            "max_hit_age_seconds": round(self.max_hit_age, 1),
+            "vector_bytes": self.nbytes,
+        }
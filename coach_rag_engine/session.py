@@ -0,0 +1,266 @@
+"""
+Run Sessions for Coach RAG AI Engine
+====================================
+
+Per-run retrieval context, resolved once at run start instead of on
+every coaching tick:
+- distance category (from the run's target distance)
+- runner level (pinned on the first tick unless given)
+- the KB fallback partition for the run's distance
+- the user's top strategies and run-level Mem0 memories
+
+start_run() prefetches all of it concurrently; each tick then runs the
+direct retrieval + selection path with that context. Execution records
+are written in the background and flushed by end_run().
+
+With speculative prefetch enabled, strategies for the likely next
+situations are computed between ticks (see prefetch.py).
+"""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+
+try:
+    from .models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        Mem0CoachingMemory,
+        CoachPersonality,
+        CoachEnergy
+    )
+    from .prefetch import SpeculativePrefetcher
+except ImportError:
+    # Fallback for direct script execution
+    from models import (
+        PerformanceAnalysis,
+        AdaptiveStrategyOutput,
+        SituationContext,
+        Mem0CoachingMemory,
+        CoachPersonality,
+        CoachEnergy
+    )
+    from prefetch import SpeculativePrefetcher
+
+if TYPE_CHECKING:
+    from .engine import CoachRAGEngine
+
+
+# ============================================================================
+# RUN SESSION
+# ============================================================================
+
+class RunSession:
+    """
+    Preloaded retrieval context for one run.
+
+    Usage:
+        session = await engine.start_run(user_id, run_id, 10000, personality, energy)
+        strategy = await session.get_adaptive_strategy(perf_analysis)   # every tick
+        await session.end_run()
+    """
+
+    def __init__(
+        self,
+        engine: "CoachRAGEngine",
+        user_id: str,
+        run_id: str,
+        target_distance: float,
+        personality: CoachPersonality,
+        energy: CoachEnergy,
+        runner_level: Optional[str] = None
+    ):
+        """
+        Args:
+            engine: Engine whose retrieval / selection path serves the ticks
+            user_id: User UUID
+            run_id: Run UUID
+            target_distance: Target distance in meters
+            personality: Coach personality for the run
+            energy: Coach energy for the run
+            runner_level: Runner level (resolved on the first tick if None)
+        """
+        self.engine = engine
+        self.user_id = user_id
+        self.run_id = run_id
+        self.target_distance = target_distance
+        self.personality = personality
+        self.energy = energy
+
+        self.distance_category = engine._get_distance_category(target_distance)
+        self.runner_level = runner_level
+
+        # Prefetched context
+        self.user_top_strategies: List[Dict[str, Any]] = []
+        self.mem0_memories: List[Mem0CoachingMemory] = []
+        self.kb_fallback: Optional[List[Dict[str, Any]]] = None
+
+        # Background execution writes (flushed by end_run)
+        self._pending_writes: Set[asyncio.Task] = set()
+
+        # KB partition fetch, deferred to the first tick without runner_level
+        self._partition_task: Optional[asyncio.Task] = None
+
+        # Next-situation strategy cache (speculative prefetch)
+        self._prefetcher: Optional[SpeculativePrefetcher] = None
+
+        self.started_at = time.time()
+        self.prefetch_ms = 0.0
+        self.ticks = 0
+        self.closed = False
+
+    async def prefetch(self):
+        """
+        Load user history, Mem0 memories and the KB partition concurrently.
+
+        The KB partition depends on the runner level; without one it is
+        fetched in the background once the first tick resolves it.
+        """
+        started = time.perf_counter()
+        engine = self.engine
+
+        user_top, memories, kb_fallback, transitions = await asyncio.gather(
+            engine._get_user_top_strategies(self.user_id, self.run_id),
+            engine._fetch_mem0_coaching_memories(self.user_id),
+            self._fetch_partition(),
+            engine._get_transition_table(),
+        )
+        self.user_top_strategies = user_top
+        self.mem0_memories = memories
+        self.kb_fallback = kb_fallback or None
+
+        if transitions is not None:
+            self._prefetcher = SpeculativePrefetcher(self._compute_strategy, self._build_context, transitions)
+
+        self.prefetch_ms = (time.perf_counter() - started) * 1000
+        print(f"   ✅ Run session {self.run_id[:8]} ready: {self.distance_category}, {len(user_top)} top strategies, {len(memories)} memories ({self.prefetch_ms:.0f} ms)")
+
+    # ========================================================================
+    # PER-TICK STRATEGY
+    # ========================================================================
+
+    async def get_adaptive_strategy(self, performance_analysis: PerformanceAnalysis) -> AdaptiveStrategyOutput:
+        """
+        Adaptive strategy for the current tick, using the session context.
+
+        The execution record is written in the background; its id is set on
+        the returned strategy once the write lands (at the latest by end_run,
+        immediately with the engine's write-behind queue).
+        """
+        if self.closed:
+            raise RuntimeError(f"Run session {self.run_id} has ended")
+
+        engine = self.engine
+        self.ticks += 1
+
+        context = self._build_context(performance_analysis)
+
+        suppressed = engine._check_situation_change(self.run_id, context, performance_analysis)
+        if suppressed is not None:
+            return suppressed
+
+        if self.runner_level is None:
+            self.runner_level = engine._get_runner_level(performance_analysis)
+            # Until it lands, retrieval queries the fallback itself if needed
+            self._partition_task = asyncio.get_running_loop().create_task(self._load_partition())
+
+        strategy = engine._lookup_cached_response(context, performance_analysis)
+        if strategy is None:
+            if self._prefetcher is not None:
+                strategy = await self._prefetcher.get(context, performance_analysis)
+            else:
+                strategy = await self._compute_strategy(context, performance_analysis)
+            engine._cache_response(context, performance_analysis, strategy)
+        engine._record_delivered(self.run_id, context, performance_analysis, strategy)
+
+        task = asyncio.get_running_loop().create_task(
+            engine._record_execution(self.user_id, self.run_id, strategy, context, performance_analysis)
+        )
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+        # Idle time until the next tick: precompute likely next situations
+        if self._prefetcher is not None:
+            self._prefetcher.speculate(performance_analysis)
+
+        return strategy
+
+    async def _fetch_partition(self) -> List[Dict[str, Any]]:
+        """KB fallback candidates for the run (none until the runner level is known)."""
+        if self.runner_level is None:
+            return []
+        return await self.engine._prefetch_kb_partition(self.distance_category, self.runner_level)
+
+    async def _load_partition(self):
+        try:
+            self.kb_fallback = await self._fetch_partition() or None
+        except Exception as e:
+            print(f"   ⚠️ KB partition prefetch error: {e}")
+
+    def _build_context(self, performance_analysis: PerformanceAnalysis) -> SituationContext:
+        return self.engine._build_situation_context(performance_analysis, self.personality, self.energy)
+
+    async def _compute_strategy(
+        self,
+        context: SituationContext,
+        performance_analysis: PerformanceAnalysis
+    ) -> AdaptiveStrategyOutput:
+        """Retrieval + selection with the session context (nothing recorded)."""
+        engine = self.engine
+        strategies = await engine._retrieve_strategies(
+            context,
+            self.user_id,
+            performance_analysis,
+            distance_category=self.distance_category,
+            runner_level=self.runner_level,
+            kb_fallback=self.kb_fallback
+        )
+
+        return await engine._select_and_adapt_strategy(
+            context=context,
+            strategies=strategies,
+            mem0_memories=self.mem0_memories,
+            user_top_strategies=self.user_top_strategies,
+            performance_analysis=performance_analysis,
+            user_id=self.user_id
+        )
+
+    # ========================================================================
+    # LIFECYCLE
+    # ========================================================================
+
+    def prefetch_metrics(self) -> Dict[str, Any]:
+        """Speculative prefetch counters (empty if disabled)."""
+        return self._prefetcher.metrics() if self._prefetcher is not None else {}
+
+    async def flush(self):
+        """Wait for background execution writes."""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    async def end_run(self):
+        """Flush pending writes (session and write-behind queue) and release the session's context."""
+        if self.closed:
+            return
+        self.closed = True
+
+        if self._partition_task is not None:
+            self._partition_task.cancel()
+        if self._prefetcher is not None:
+            await self._prefetcher.close()
+        await self.flush()
+        # Queued records of this run (write-behind) are written now, not on the next interval
+        try:
+            await self.engine.flush_records()
+        except Exception as e:
+            print(f"   ⚠️ Record flush error at end of run: {e}")
+
+        self.user_top_strategies = []
+        self.mem0_memories = []
+        self.kb_fallback = None
+        if self.engine._change_detector is not None:
+            self.engine._change_detector.forget(self.run_id)
+        self.engine._sessions.pop(self.run_id, None)
+        self.engine._forget_user_top_strategies(self.run_id)
+        print(f"   🏁 Run session {self.run_id[:8]} ended after {self.ticks} ticks")
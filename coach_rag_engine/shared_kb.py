@@ -0,0 +1,228 @@
+"""
+Shared-Memory KB for Coach RAG AI Engine
+=========================================
+
+Host-level shared copy of the local strategy index, so many engine worker
+processes serve local search from one copy of the KB matrix and metadata.
+
+One loader process publishes the KB (snapshot format, see snapshot.py) into
+a versioned data segment; engine instances attach read-only.
+
+Segments:
+- Control block "<name>": magic, seqlock counter, version, data size and
+  the name of the current data segment
+- Data segment "<name>.<version>": snapshot bytes
+
+Refresh is an atomic swap: the publisher fills a new data segment, then
+flips the control block under the seqlock. Readers pick up the new version
+on their next refresh(); mappings of the old segment stay valid until they
+are released.
+"""
+
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+try:
+    from .local_index import StrategyIndex
+    from .snapshot import build_snapshot_bytes, index_from_buffer
+except ImportError:
+    # Fallback for direct script execution
+    from local_index import StrategyIndex
+    from snapshot import build_snapshot_bytes, index_from_buffer
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+CONTROL_MAGIC = b"CRKBSHM1"
+CONTROL = struct.Struct("<8sQQQ64s")  # magic, seq, version, size, data segment name
+
+ATTACH_RETRIES = 50
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing segment without resource-tracker ownership.
+
+    Otherwise the tracker would unlink the segment when a reader exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _release_segment(segment: shared_memory.SharedMemory) -> bool:
+    """Close a segment; False while arrays still view it."""
+    try:
+        segment.close()
+        return True
+    except BufferError:
+        return False
+
+
+# ============================================================================
+# PUBLISHER (loader process)
+# ============================================================================
+
+class SharedKBPublisher:
+    """
+    Publishes a StrategyIndex into shared memory.
+
+    Usage:
+        publisher = SharedKBPublisher("runbot_kb")
+        publisher.publish(index)   # again on every KB refresh
+        publisher.close()          # unlinks all segments
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self._data: Optional[shared_memory.SharedMemory] = None
+
+        try:
+            self._control = shared_memory.SharedMemory(name=name, create=True, size=CONTROL.size)
+            self._control.buf[:CONTROL.size] = bytes(CONTROL.size)
+        except FileExistsError:
+            # Take over a control block left by a previous loader
+            self._control = _attach_segment(name)
+            _, seq, self.version, _, data_name = CONTROL.unpack_from(self._control.buf, 0)
+            if seq % 2:
+                self._write_seq(seq + 1)
+
+            # Adopt its data segment so the next publish unlinks it
+            try:
+                self._data = _attach_segment(data_name.rstrip(b"\0").decode("utf-8"))
+            except (OSError, ValueError):
+                pass
+
+    def _write_seq(self, seq: int):
+        struct.pack_into("<Q", self._control.buf, 8, seq)
+
+    def publish(self, index: StrategyIndex) -> int:
+        """
+        Publish a new KB version and swap readers over to it.
+
+        Returns:
+            The published version number
+        """
+        data = build_snapshot_bytes(index)
+        version = self.version + 1
+        segment_name = f"{self.name}.{version}"
+
+        segment = shared_memory.SharedMemory(name=segment_name, create=True, size=len(data))
+        segment.buf[:len(data)] = data
+
+        # Seqlock flip: odd while the control block is being rewritten
+        _, seq, _, _, _ = CONTROL.unpack_from(self._control.buf, 0)
+        self._write_seq(seq + 1)
+        CONTROL.pack_into(
+            self._control.buf, 0,
+            CONTROL_MAGIC, seq + 1, version, len(data), segment_name.encode("utf-8")
+        )
+        self._write_seq(seq + 2)
+
+        # Readers already mapped keep the old pages until they release them
+        previous, self._data, self.version = self._data, segment, version
+        if previous is not None:
+            previous.close()
+            previous.unlink()
+
+        print(f"   ✅ Shared KB v{version} published: {len(index)} strategies ({len(data) / 1024:.0f} KB)")
+        return version
+
+    def close(self):
+        """Unlink the data and control segments."""
+        for segment in (self._data, self._control):
+            if segment is not None:
+                segment.close()
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    pass
+        self._data = None
+
+
+# ============================================================================
+# READER (engine worker processes)
+# ============================================================================
+
+class SharedKBReader:
+    """
+    Read-only view of a published shared KB.
+
+    Usage:
+        reader = SharedKBReader("runbot_kb")
+        if reader.refresh():
+            index = reader.index
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self.index: Optional[StrategyIndex] = None
+        self._control = _attach_segment(name)
+        self._data: Optional[shared_memory.SharedMemory] = None
+        self._retired: List[shared_memory.SharedMemory] = []
+
+    def _release_retired(self):
+        """Close old segments once no index or result views them any more."""
+        self._retired = [s for s in self._retired if not _release_segment(s)]
+
+    def _read_control(self) -> Tuple[int, int, str]:
+        """Consistent (version, size, segment name) snapshot of the control block."""
+        for _ in range(ATTACH_RETRIES):
+            magic, seq, version, size, name = CONTROL.unpack_from(self._control.buf, 0)
+            if seq % 2 == 0:
+                _, seq_after, _, _, _ = CONTROL.unpack_from(self._control.buf, 0)
+                if seq_after == seq:
+                    if magic != CONTROL_MAGIC:
+                        return 0, 0, ""
+                    return version, size, name.rstrip(b"\0").decode("utf-8")
+            time.sleep(0.001)
+        raise TimeoutError("Shared KB control block is being rewritten")
+
+    def refresh(self) -> bool:
+        """
+        Attach to the latest published version if it changed.
+
+        Returns:
+            True if a new version was attached
+        """
+        for _ in range(ATTACH_RETRIES):
+            version, size, segment_name = self._read_control()
+            if version == 0 or version == self.version:
+                return False
+
+            try:
+                segment = _attach_segment(segment_name)
+            except FileNotFoundError:
+                # Swapped again between reading the control block and attaching
+                continue
+
+            buffer = memoryview(segment.buf)[:size].toreadonly()
+            index = index_from_buffer(buffer)
+
+            previous, self._data = self._data, segment
+            self.index, self.version = index, version
+            if previous is not None:
+                self._retired.append(previous)
+            self._release_retired()
+            return True
+
+        return False
+
+    def close(self):
+        """Detach from shared memory (segments stay published)."""
+        self.index = None
+        if self._data is not None:
+            self._retired.append(self._data)
+        self._data = None
+        self._release_retired()
+        _release_segment(self._control)
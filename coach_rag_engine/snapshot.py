@@ -0,0 +1,306 @@
+"""
+KB Snapshot Files for Coach RAG AI Engine
+==========================================
+
+Memory-mapped snapshot of the local strategy index, so a new worker can
+serve local search in milliseconds instead of pulling the KB over HTTP.
+Every worker on a host maps the same file, so they share one copy in the
+OS page cache.
+
+File layout:
+    [magic "CRKBSNP1"][uint64 header length][JSON header]
+    [page-aligned sections ...]
+
+The JSON header holds the embedding model and version, delta-sync
+watermark, row count, vocabularies (distance, runner_level, type, tags),
+distance partition offsets and a section table (offset, dtype, shape).
+Sections are columnar:
+- embeddings / prefix: L2-normalized float32 matrices
+- success_rate, avg_effectiveness, times_used, active
+- distance / runner_level / type codes (uint8)
+- tags_mask: packed tag bitmask per row
+- id, title, strategy_text, conditions_to_use, when_not_to_use:
+  int64 offsets + UTF-8 blob
+
+Rows are sorted by distance so each distance category is one contiguous
+partition.
+
+Export with: python -m coach_rag_engine.export_kb_snapshot kb.snap
+"""
+
+import json
+import mmap
+import os
+import struct
+import weakref
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from .local_index import StrategyIndex
+except ImportError:
+    # Fallback for direct script execution
+    from local_index import StrategyIndex
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+MAGIC = b"CRKBSNP1"
+FORMAT_VERSION = 1
+PAGE_SIZE = 4096
+
+PREAMBLE = struct.Struct("<8sQ")  # magic, header length
+
+STRING_COLUMNS = ("id", "title", "strategy_text", "conditions_to_use", "when_not_to_use", "embedding_hash")
+CATEGORY_COLUMNS = {"distance": "distance", "runner_level": "runner_level", "type": "strategy_type"}
+
+
+# ============================================================================
+# LAZY COLUMN VIEWS
+# ============================================================================
+
+class StringColumn(Sequence):
+    """Read-only string column over an offsets array and a UTF-8 blob."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.data[start:end].tobytes().decode("utf-8")
+
+
+class SnapshotRows(Sequence):
+    """KB row dicts decoded on access from a snapshot's columns."""
+
+    def __init__(self, index: StrategyIndex, strings: Dict[str, StringColumn]):
+        # Proxy avoids an index <-> rows cycle, so a swapped-out index (and
+        # its mapped buffer) is released as soon as it is unreferenced
+        self._index = weakref.proxy(index)
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return len(self._index.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        index = self._index
+        row = {name: column[i] for name, column in self._strings.items()}
+        row.update(
+            distance=index.distance[i],
+            type=index.strategy_type[i],
+            runner_level=index.runner_level[i],
+            tags=index.decode_tags(i),
+            times_used=int(index.times_used[i]),
+            success_rate=float(index.success_rate[i]),
+            avg_effectiveness_score=float(index.avg_effectiveness[i])
+        )
+        return row
+
+
+# ============================================================================
+# ENCODING
+# ============================================================================
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as (int64 offsets, uint8 blob)."""
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _encode_category(values: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """Encode a string column as (vocabulary, uint8 codes)."""
+    vocab, codes = np.unique(values.astype(str), return_inverse=True)
+    if len(vocab) > 255:
+        raise ValueError("Too many categories for a uint8 column")
+    return vocab.tolist(), codes.astype(np.uint8)
+
+
+def build_snapshot_bytes(index: StrategyIndex) -> bytearray:
+    """
+    Serialize a float32 StrategyIndex into the snapshot format.
+
+    Rows are reordered by distance to form contiguous partitions.
+    """
+    if index.embeddings is None:
+        raise ValueError("Snapshots require a float32 (non-quantized) index")
+
+    order = np.argsort(index.distance.astype(str), kind="stable")
+    rows = [index.rows[p] for p in order.tolist()]
+
+    arrays: Dict[str, np.ndarray] = {
+        "embeddings": index.embeddings[order],
+        "prefix": index.prefix[order],
+        "success_rate": index.success_rate[order],
+        "avg_effectiveness": index.avg_effectiveness[order],
+        "times_used": index.times_used[order],
+        "active": index.active[order],
+        "tags_mask": index.tags_mask[order],
+    }
+
+    vocabularies = {}
+    for column, attr in CATEGORY_COLUMNS.items():
+        vocabularies[column], arrays[f"{column}_codes"] = _encode_category(getattr(index, attr)[order])
+
+    for column in STRING_COLUMNS:
+        arrays[f"{column}_offsets"], arrays[f"{column}_data"] = _encode_strings(
+            [r.get(column, "") for r in rows]
+        )
+
+    # Distance partition offsets (rows are sorted by distance)
+    distances = index.distance[order].astype(str)
+    partitions = {}
+    for name in np.unique(distances).tolist():
+        hits = np.flatnonzero(distances == name)
+        partitions[name] = [int(hits[0]), int(hits[-1]) + 1]
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": index.embedding_model,
+        "embedding_version": index.embedding_version,
+        "watermark": index.watermark,
+        "rows": len(rows),
+        "dims": int(index.embeddings.shape[1]),
+        "prefix_dims": int(index.prefix_dims),
+        "created_at": datetime.now().isoformat(),
+        "vocabularies": vocabularies,
+        "tag_vocab": list(index.tag_vocab),
+        "partitions": partitions,
+        "sections": {},
+    }
+
+    # Lay out sections at page-aligned offsets after the header. The
+    # header size depends on the offsets, so reserve whole pages for it.
+    header_pages = 1
+    while True:
+        offset = header_pages * PAGE_SIZE
+        for name, array in arrays.items():
+            header["sections"][name] = {
+                "offset": offset,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+            }
+            offset += -(-array.nbytes // PAGE_SIZE) * PAGE_SIZE
+        header_bytes = json.dumps(header).encode("utf-8")
+        if PREAMBLE.size + len(header_bytes) <= header_pages * PAGE_SIZE:
+            break
+        header_pages += 1
+
+    buffer = bytearray(offset)
+    PREAMBLE.pack_into(buffer, 0, MAGIC, len(header_bytes))
+    buffer[PREAMBLE.size:PREAMBLE.size + len(header_bytes)] = header_bytes
+    for name, array in arrays.items():
+        start = header["sections"][name]["offset"]
+        data = np.ascontiguousarray(array).tobytes()
+        buffer[start:start + len(data)] = data
+
+    return buffer
+
+
+def write_snapshot(index: StrategyIndex, path: Union[str, os.PathLike]) -> int:
+    """
+    Write a snapshot file atomically (temp file + rename).
+
+    Returns:
+        Snapshot size in bytes
+    """
+    data = build_snapshot_bytes(index)
+    tmp_path = f"{os.fspath(path)}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+# ============================================================================
+# DECODING
+# ============================================================================
+
+def read_header(buffer) -> Dict[str, Any]:
+    """Parse and validate the snapshot header from a buffer."""
+    magic, header_len = PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a Coach RAG KB snapshot")
+    header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]))
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('format_version')}")
+    return header
+
+
+def index_from_buffer(buffer, header: Optional[Dict[str, Any]] = None) -> StrategyIndex:
+    """
+    Build a StrategyIndex whose arrays are zero-copy views into buffer.
+
+    The buffer (mmap, shared memory, bytes) must outlive the index.
+    """
+    header = header or read_header(buffer)
+
+    def section(name: str) -> np.ndarray:
+        spec = header["sections"][name]
+        shape = tuple(spec["shape"])
+        count = int(np.prod(shape)) if shape else 1
+        return np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]), count=count, offset=spec["offset"]).reshape(shape)
+
+    columns = {
+        "success_rate": section("success_rate"),
+        "avg_effectiveness": section("avg_effectiveness"),
+        "times_used": section("times_used"),
+        "active": section("active"),
+        "tags_mask": section("tags_mask"),
+    }
+    for column, attr in CATEGORY_COLUMNS.items():
+        vocab = np.array(header["vocabularies"][column], dtype=object)
+        columns[attr] = vocab[section(f"{column}_codes")]
+
+    # Older snapshots lack embedding_hash (the delta sync then re-fetches
+    # the vectors of changed rows once)
+    strings = {
+        column: StringColumn(section(f"{column}_offsets"), section(f"{column}_data"))
+        for column in STRING_COLUMNS
+        if f"{column}_offsets" in header["sections"]
+    }
+
+    index = StrategyIndex.from_columns(
+        rows=[],
+        ids=strings["id"],
+        columns=columns,
+        tag_vocab=header["tag_vocab"],
+        embeddings=section("embeddings"),
+        prefix=section("prefix"),
+        embedding_model=header["embedding_model"],
+        partitions={k: tuple(v) for k, v in header["partitions"].items()},
+        watermark=header.get("watermark"),
+        embedding_version=header.get("embedding_version")
+    )
+    index.rows = SnapshotRows(index, strings)
+    return index
+
+
+def open_snapshot(path: Union[str, os.PathLike]) -> StrategyIndex:
+    """
+    Open a snapshot file with mmap (read-only, zero-copy).
+
+    The mapping stays referenced by the returned index.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    index = index_from_buffer(mapped)
+    index._buffer = mapped
+    return index
@@ -0,0 +1,420 @@
+"""
+Durable Record Spool for Coach RAG AI Engine
+============================================
+
+Self-learning writes (strategy executions and outcomes) that cannot reach
+Supabase are appended to a local SQLite file (WAL mode) instead of being
+lost, and a background drainer replays them through the bulk record RPCs
+once connectivity returns.
+
+- Every record carries an idempotency key (the client-generated execution
+  id): spooling the same execution twice keeps one row, a newer outcome
+  for an execution replaces the spooled one, and the RPC skips executions
+  and outcomes it already has, so replays never double count
+- Records are replayed oldest first, in batches
+- Disk use is bounded (max_records, max_bytes); the oldest records are
+  dropped first and counted
+- The drainer backs off exponentially while Supabase stays unreachable
+- Records Supabase rejects (4xx, or max_attempts server errors) are
+  isolated by splitting the batch and moved to a local dead_letter table,
+  so they never block the records behind them; requeue_dead_letters()
+  puts them back after a fix
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+MAX_RECORDS = 50000
+MAX_BYTES = 64 * 1024 * 1024
+DRAIN_BATCH_SIZE = 200
+DRAIN_INTERVAL_SECONDS = 10.0
+MAX_BACKOFF_SECONDS = 300.0
+MAX_ATTEMPTS = 10           # Server errors per record before it is dead-lettered
+
+# Supabase not reached: retried with backoff, no attempt counted
+UNREACHABLE_ERRORS = (httpx.TransportError, OSError, asyncio.TimeoutError)
+
+# Server errors worth retrying (others in 4xx reject the records themselves)
+RETRYABLE_STATUS = (408, 429)
+
+# Record kind -> field holding its idempotency key
+KEY_FIELDS = {"execution": "id", "outcome": "execution_id"}
+
+# (executions, outcomes) -> None, raises on failure
+WriteBatch = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Awaitable[Any]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS dead_letter (
+    seq INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+# (seq, kind, record, attempts)
+SpoolRow = Tuple[int, str, Dict[str, Any], int]
+
+
+# ============================================================================
+# SPOOL
+# ============================================================================
+
+class RecordSpool:
+    """
+    Append-only SQLite spool of execution / outcome records.
+
+    Usage:
+        spool = RecordSpool("/var/lib/coach/spool.db")
+        spool.append(executions, outcomes)
+        seqs, executions, outcomes = spool.peek(200)
+        spool.ack(seqs)
+    """
+
+    def __init__(self, path: str, max_records: int = MAX_RECORDS, max_bytes: int = MAX_BYTES):
+        """
+        Args:
+            path: SQLite file (created if missing)
+            max_records: Spooled records kept before the oldest are dropped
+            max_bytes: Database size kept before the oldest are dropped
+        """
+        self.path = path
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, isolation_level=None)
+        # auto_vacuum only takes effect before the first table is created
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        # Metrics
+        self.appended = 0
+        self.acked = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes in use by the database (excluding free pages)."""
+        page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._db.execute("PRAGMA page_count").fetchone()[0]
+        free = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free) * page_size
+
+    def append(self, executions: List[Dict[str, Any]], outcomes: List[Dict[str, Any]]) -> int:
+        """Spool records in one transaction (same key: payload replaced)."""
+        now = time.time()
+        rows = [
+            (kind, str(record[KEY_FIELDS[kind]]), json.dumps(record, default=str), now)
+            for kind, records in (("execution", executions), ("outcome", outcomes))
+            for record in records
+        ]
+        if not rows:
+            return 0
+
+        with self._transaction():
+            self._db.executemany(
+                """
+                INSERT INTO spool (kind, key, payload, created_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET payload = excluded.payload
+                """,
+                rows
+            )
+        self.appended += len(rows)
+        self._enforce_bounds()
+        return len(rows)
+
+    def peek_rows(self, limit: int = DRAIN_BATCH_SIZE) -> List[SpoolRow]:
+        """Oldest records: (seq, kind, record, attempts) each."""
+        return [
+            (seq, kind, json.loads(payload), attempts)
+            for seq, kind, payload, attempts in self._db.execute(
+                "SELECT seq, kind, payload, attempts FROM spool ORDER BY seq LIMIT ?", (limit,)
+            )
+        ]
+
+    def peek(self, limit: int = DRAIN_BATCH_SIZE) -> Tuple[List[int], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Oldest records: (seqs, executions, outcomes)."""
+        seqs, executions, outcomes = [], [], []
+        for seq, kind, record, _ in self.peek_rows(limit):
+            seqs.append(seq)
+            (executions if kind == "execution" else outcomes).append(record)
+        return seqs, executions, outcomes
+
+    def ack(self, seqs: List[int]):
+        """Remove replayed records."""
+        if not seqs:
+            return
+        with self._transaction():
+            self._db.executemany("DELETE FROM spool WHERE seq = ?", [(s,) for s in seqs])
+        self.acked += len(seqs)
+
+    def mark_failed(self, seqs: List[int]):
+        """Count a failed replay attempt."""
+        with self._transaction():
+            self._db.executemany("UPDATE spool SET attempts = attempts + 1 WHERE seq = ?", [(s,) for s in seqs])
+
+    def dead_letter(self, seqs: List[int], error: str):
+        """Move records Supabase rejects out of the replay queue."""
+        now = time.time()
+        with self._transaction():
+            self._db.executemany(
+                """
+                INSERT OR REPLACE INTO dead_letter
+                SELECT seq, kind, key, payload, created_at, attempts, ?, ? FROM spool WHERE seq = ?
+                """,
+                [(error, now, s) for s in seqs]
+            )
+            self._db.executemany("DELETE FROM spool WHERE seq = ?", [(s,) for s in seqs])
+        self.dead_lettered += len(seqs)
+
+    def dead_letter_count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+
+    def requeue_dead_letters(self) -> int:
+        """Put dead-lettered records back at the end of the queue (attempts reset)."""
+        with self._transaction():
+            cursor = self._db.execute(
+                """
+                INSERT INTO spool (kind, key, payload, created_at)
+                SELECT kind, key, payload, created_at FROM dead_letter ORDER BY seq
+                ON CONFLICT (kind, key) DO NOTHING
+                """
+            )
+            self._db.execute("DELETE FROM dead_letter")
+        return cursor.rowcount
+
+    def compact(self):
+        """Return free pages to the filesystem and truncate the WAL."""
+        self._db.execute("PRAGMA incremental_vacuum")
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def oldest_age(self) -> float:
+        """Seconds since the oldest spooled record was written (0 if empty)."""
+        oldest = self._db.execute("SELECT MIN(created_at) FROM spool").fetchone()[0]
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def _enforce_bounds(self):
+        """Drop the oldest records beyond max_records / max_bytes."""
+        excess = len(self) - self.max_records
+        if excess <= 0 and self.nbytes <= self.max_bytes:
+            return
+        # Over the byte bound: drop a tenth at a time until it fits
+        excess = max(excess, len(self) // 10, 1)
+
+        with self._transaction():
+            cursor = self._db.execute(
+                "DELETE FROM spool WHERE seq IN (SELECT seq FROM spool ORDER BY seq LIMIT ?)", (excess,)
+            )
+        self.dropped += cursor.rowcount
+        self.compact()
+        print(f"   ⚠️ Record spool full, dropped {cursor.rowcount} oldest records")
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+    def close(self):
+        self.compact()
+        self._db.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT / ROLLBACK (connection is in autocommit mode)."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# ============================================================================
+# DRAINER
+# ============================================================================
+
+class SpoolDrainer:
+    """
+    Background replay of a RecordSpool.
+
+    Usage:
+        drainer = SpoolDrainer(spool, engine._write_record_batch)
+        drainer.start()
+        ...
+        await drainer.stop()
+    """
+
+    def __init__(
+        self,
+        spool: RecordSpool,
+        write_batch: WriteBatch,
+        interval: float = DRAIN_INTERVAL_SECONDS,
+        batch_size: int = DRAIN_BATCH_SIZE,
+        max_backoff: float = MAX_BACKOFF_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS
+    ):
+        """
+        Args:
+            spool: Spool to replay
+            write_batch: Bulk writer (raises while Supabase is unreachable)
+            interval: Seconds between checks while healthy
+            batch_size: Records per replay call
+            max_backoff: Longest wait between attempts while failing
+            max_attempts: Server errors (5xx, 408, 429) a record may get
+                before it is dead-lettered
+        """
+        self.spool = spool
+        self.write_batch = write_batch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+
+        self._task: Optional[asyncio.Task] = None
+        self._backoff = interval
+
+        # Metrics
+        self.replayed = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_drained_at: Optional[float] = None
+
+    async def drain_once(self) -> int:
+        """
+        Replay everything spooled, oldest first.
+
+        Returns:
+            Records replayed; raises (records kept) while Supabase is
+            unreachable or a batch gets a retryable server error
+        """
+        replayed = 0
+        while True:
+            rows = self.spool.peek_rows(self.batch_size)
+            if not rows:
+                break
+            replayed += await self._replay(rows)
+
+        if replayed:
+            self.spool.compact()
+            self.replayed += replayed
+            print(f"   ✅ Replayed {replayed} spooled records")
+        self.last_drained_at = time.time()
+        return replayed
+
+    async def _replay(self, rows: List[SpoolRow]) -> int:
+        """
+        Write rows as one batch. A rejected batch is split in halves until
+        the rejected records are isolated and dead-lettered.
+
+        Returns:
+            Records written
+        """
+        seqs = [row[0] for row in rows]
+        try:
+            await self.write_batch(
+                [record for _, kind, record, _ in rows if kind == "execution"],
+                [record for _, kind, record, _ in rows if kind == "outcome"]
+            )
+        except UNREACHABLE_ERRORS:
+            raise
+        except Exception as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            retryable = status is not None and (status >= 500 or status in RETRYABLE_STATUS)
+            self.spool.mark_failed(seqs)
+            if retryable and min(row[3] for row in rows) + 1 < self.max_attempts:
+                raise
+
+            if len(rows) == 1:
+                self.spool.dead_letter(seqs, f"{status or type(e).__name__}: {e}"[:500])
+                print(f"   ⚠️ Spooled {rows[0][1]} {rows[0][2].get(KEY_FIELDS[rows[0][1]])} dead-lettered: {status or e}")
+                return 0
+            middle = len(rows) // 2
+            return await self._replay(rows[:middle]) + await self._replay(rows[middle:])
+
+        self.spool.ack(seqs)
+        self.batches += 1
+        return len(rows)
+
+    async def _run(self):
+        """Drain loop with exponential backoff while writes fail."""
+        while True:
+            try:
+                await self.drain_once()
+                self._backoff = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                print(f"   ⚠️ Spool replay failed, retrying in {self._backoff:.0f}s: {e}")
+            await asyncio.sleep(self._backoff)
+
+    def start(self):
+        """Start the background drain task (needs a running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task (spooled records stay on disk)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Spool depth, age and replay counters."""
+        return {
+            "pending": len(self.spool),
+            "oldest_age_seconds": round(self.spool.oldest_age(), 1),
+            "bytes": self.spool.nbytes,
+            "appended": self.spool.appended,
+            "replayed": self.replayed,
+            "batches": self.batches,
+            "dropped": self.spool.dropped,
+            "dead_lettered": self.spool.dead_lettered,
+            "dead_letter_pending": self.spool.dead_letter_count(),
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "backoff_seconds": self._backoff,
+        }
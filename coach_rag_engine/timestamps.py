@@ -0,0 +1,49 @@
+"""
+Timestamps for Coach RAG AI Engine
+==================================
+
+Parsing of Postgres timestamptz text as PostgREST and psql return it.
+
+datetime.fromisoformat only accepts these forms from Python 3.11 on;
+before that it needs exactly 3 or 6 fractional digits and a "+HH:MM"
+offset. Postgres trims trailing zeros from the fraction
+("12:00:00.12+00:00") and psql CSV exports write "+00" offsets, so the
+text is normalized first:
+- "Z" and "+HH" / "+HHMM" offsets become "+HH:MM"
+- the fraction is padded (or cut) to 6 digits
+- a space separator becomes "T"
+"""
+
+import re
+from datetime import datetime
+
+
+# ============================================================================
+# PARSING
+# ============================================================================
+
+_TIMESTAMP = re.compile(
+    r"(?P<base>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?)"
+    r"(?:\.(?P<fraction>\d+))?"
+    r"(?P<offset>Z|[+-]\d{2}(?::?\d{2})?)?"
+)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a Postgres timestamptz (PostgREST JSON or psql text)."""
+    match = _TIMESTAMP.fullmatch(value.strip())
+    if match is None:
+        return datetime.fromisoformat(value)
+
+    text = match["base"].replace(" ", "T")
+    if match["fraction"]:
+        text += "." + match["fraction"][:6].ljust(6, "0")
+
+    offset = match["offset"]
+    if offset == "Z":
+        offset = "+00:00"
+    elif offset and len(offset) == 3:
+        offset += ":00"
+    elif offset and ":" not in offset:
+        offset = f"{offset[:3]}:{offset[3:]}"
+    return datetime.fromisoformat(text + (offset or ""))
@@ -0,0 +1,72 @@
+"""
+Embedding Vectors for Coach RAG AI Engine
+==========================================
+
+NumPy plumbing for strategy and situation embeddings.
+
+Embeddings travel as a single float32 buffer end to end:
+- OpenAI returns them base64-encoded (encoding_format="base64")
+- They are decoded with np.frombuffer (no per-float Python objects)
+- They are rendered as a pgvector literal only at the PostgREST boundary
+"""
+
+import base64
+from typing import Union
+
+import numpy as np
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMS = 1536
+
+# OpenAI base64 payloads are little-endian float32
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+# Embeddings per bulk RPC call (update_strategy_embeddings_kb, ~20 KB each)
+EMBEDDING_WRITE_BATCH = 100
+
+
+# ============================================================================
+# DECODING
+# ============================================================================
+
+def decode_base64_embedding(payload: Union[str, bytes]) -> np.ndarray:
+    """
+    Decode a base64 embedding payload from the OpenAI embeddings API.
+
+    The returned array is a read-only view over the decoded bytes.
+    """
+    return np.frombuffer(base64.b64decode(payload), dtype=EMBEDDING_DTYPE)
+
+
+def from_pgvector(literal: str) -> np.ndarray:
+    """Parse a pgvector text literal ("[0.1,0.2,...]") into a float32 array."""
+    return np.fromstring(literal.strip()[1:-1], dtype=np.float32, sep=",")
+
+
+# ============================================================================
+# ENCODING
+# ============================================================================
+
+def to_pgvector(vector: np.ndarray) -> str:
+    """
+    Render an embedding as a pgvector text literal for RPC parameters.
+
+    Uses 9 significant digits so float32 values round-trip exactly.
+    """
+    return "[" + ",".join(np.char.mod("%.9g", np.asarray(vector, dtype=np.float32))) + "]"
+
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector or each row of a matrix (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
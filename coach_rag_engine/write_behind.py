@@ -0,0 +1,300 @@
+"""
+Write-Behind Recording for Coach RAG AI Engine
+==============================================
+
+Execution and outcome bookkeeping leaves the request path: records are
+queued and return immediately, and a background task writes them in bulk:
+executions through record_strategy_executions_kb (010_bulk_kb_writes.sql),
+then outcomes through record_strategy_batch_kb (006_write_behind_batches.sql).
+
+- Executions get client-generated ids (uuid4), so callers have the
+  execution_id before anything is written
+- Records are coalesced by key: a later outcome for the same execution
+  replaces the queued one
+- A flush runs when batch_size records are queued or every flush_interval
+- When max_pending records are queued, producers wait (backpressure); after
+  put_timeout the record is dropped and counted. Request-path producers pass
+  block=False and drop (and count) at once instead of waiting; put_outcomes
+  waits once per call and returns the records it accepted
+- Failed batches are re-queued ahead of newer records and retried
+- close() stops the task and flushes what is left
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 2.0
+MAX_PENDING = 5000
+PUT_TIMEOUT_SECONDS = 5.0
+CLOSE_RETRIES = 3
+
+# (executions, outcomes) -> None, raises on failure
+FlushBatch = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Awaitable[Any]]
+
+
+# ============================================================================
+# WRITE-BEHIND QUEUE
+# ============================================================================
+
+class WriteBehindQueue:
+    """
+    Coalescing bulk writer for strategy executions and outcomes.
+
+    Usage:
+        queue = WriteBehindQueue(flush_batch)
+        await queue.put_execution({"id": execution_id, ...})
+        await queue.put_outcome({"execution_id": execution_id, ...})
+        await queue.close()
+    """
+
+    def __init__(
+        self,
+        flush_batch: FlushBatch,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        max_pending: int = MAX_PENDING,
+        put_timeout: float = PUT_TIMEOUT_SECONDS
+    ):
+        """
+        Args:
+            flush_batch: Bulk writer (one call per batch)
+            batch_size: Queued records that trigger a flush
+            flush_interval: Seconds between time-triggered flushes
+            max_pending: Queued records before producers wait
+            put_timeout: Longest producer wait before a record is dropped
+        """
+        self.flush_batch = flush_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+
+        # Coalesced pending records: execution id -> record
+        self._executions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._outcomes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+        # Metrics
+        self.queued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._executions) + len(self._outcomes)
+
+    def _ensure_started(self):
+        """Create loop-bound primitives and the flush task on first use."""
+        if self._task is None or self._task.done():
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+                self._space = asyncio.Condition()
+                self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # ========================================================================
+    # PRODUCERS
+    # ========================================================================
+
+    async def _put(
+        self,
+        buffer: "OrderedDict[str, Dict[str, Any]]",
+        key: str,
+        record: Dict[str, Any],
+        block: bool = True
+    ) -> bool:
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        self._ensure_started()
+
+        if key not in buffer and self.pending >= self.max_pending:
+            self._wakeup.set()
+            if not block:
+                self.dropped += 1
+                print(f"   ⚠️ Write-behind queue full, dropped record {key[:8]} (request path)")
+                return False
+            self.backpressure_waits += 1
+            try:
+                async with self._space:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: self.pending < self.max_pending),
+                        self.put_timeout
+                    )
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                print(f"   ⚠️ Write-behind queue full, dropped record {key[:8]}")
+                return False
+
+        if key in buffer:
+            self.coalesced += 1
+            buffer[key].update(record)
+        else:
+            buffer[key] = dict(record)
+        self.queued += 1
+
+        if self.pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def put_execution(self, record: Dict[str, Any], block: bool = True) -> bool:
+        """Queue an execution (record["id"] is its client-generated id)."""
+        return await self._put(self._executions, record["id"], record, block)
+
+    async def put_outcome(self, record: Dict[str, Any], block: bool = True) -> bool:
+        """Queue an outcome (a later outcome for the same execution replaces it)."""
+        return await self._put(self._outcomes, record["execution_id"], record, block)
+
+    async def put_outcomes(self, records: List[Dict[str, Any]], block: bool = True) -> List[Dict[str, Any]]:
+        """
+        Queue several outcomes; waits at most once (put_timeout) per call.
+
+        Returns:
+            The records accepted; once one is dropped the rest are only
+            queued if there is space, without waiting again
+        """
+        accepted = []
+        for record in records:
+            if await self.put_outcome(record, block):
+                accepted.append(record)
+            else:
+                block = False
+        return accepted
+
+    # ========================================================================
+    # FLUSHING
+    # ========================================================================
+
+    async def flush(self) -> int:
+        """
+        Write everything queued in bulk (batch_size records per call).
+
+        Returns:
+            Records written; on failure the batch is re-queued and the error raised
+        """
+        if self._flush_lock is None:
+            return 0
+
+        written = 0
+        async with self._flush_lock:
+            while self.pending:
+                executions = self._take(self._executions)
+                outcomes = self._take(self._outcomes, self.batch_size - len(executions))
+
+                started = time.perf_counter()
+                try:
+                    await self.flush_batch(list(executions.values()), list(outcomes.values()))
+                except BaseException as e:
+                    # Also on cancellation: the batch may or may not have
+                    # landed, and re-sending it is idempotent
+                    self._requeue(self._executions, executions)
+                    self._requeue(self._outcomes, outcomes)
+                    if not isinstance(e, asyncio.CancelledError):
+                        self.failures += 1
+                        self.last_error = str(e)
+                    raise
+
+                self.flushes += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                written += len(executions) + len(outcomes)
+                self.written += len(executions) + len(outcomes)
+
+                async with self._space:
+                    self._space.notify_all()
+        return written
+
+    def _take(self, buffer: "OrderedDict[str, Dict[str, Any]]", limit: Optional[int] = None) -> "OrderedDict[str, Dict[str, Any]]":
+        """Pop up to limit (default batch_size) oldest records."""
+        limit = self.batch_size if limit is None else limit
+        taken = OrderedDict()
+        while buffer and len(taken) < limit:
+            key, record = buffer.popitem(last=False)
+            taken[key] = record
+        return taken
+
+    def _requeue(self, buffer: "OrderedDict[str, Dict[str, Any]]", failed: "OrderedDict[str, Dict[str, Any]]"):
+        """Put a failed batch back ahead of newer records (newer fields win)."""
+        for key, record in failed.items():
+            if key in buffer:
+                record.update(buffer[key])
+        newer = OrderedDict((k, v) for k, v in buffer.items() if k not in failed)
+        buffer.clear()
+        buffer.update(failed)
+        buffer.update(newer)
+
+    async def _run(self):
+        """Flush on size (wakeup) or every flush_interval; errors retry next tick."""
+        # Not only the cancel: wait_for can swallow it when the wakeup is already set
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"   ⚠️ Write-behind flush error: {e}")
+
+    async def close(self):
+        """Stop the flush task and write what is left (a few retries)."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for attempt in range(CLOSE_RETRIES):
+            try:
+                await self.flush()
+                break
+            except Exception as e:
+                print(f"   ⚠️ Final write-behind flush failed ({attempt + 1}/{CLOSE_RETRIES}): {e}")
+                await asyncio.sleep(0.5 * (attempt + 1))
+
+        if self.pending:
+            print(f"   ❌ {self.pending} execution records not written")
+
+    # ========================================================================
+    # METRICS
+    # ========================================================================
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, throughput and failure counters."""
+        return {
+            "pending": self.pending,
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "flushes": self.flushes,
+            "records_per_flush": round(self.written / self.flushes, 1) if self.flushes else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "backpressure_waits": self.backpressure_waits,
+            "dropped": self.dropped,
+        }
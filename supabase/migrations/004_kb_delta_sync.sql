@@ -0,0 +1,33 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - KB Delta Sync Support
+-- ============================================================================
+--
+-- The engine keeps its local KB index fresh by polling coaching_strategies_kb
+-- for rows with updated_at past a watermark, paginated on (updated_at, id).
+--
+-- 1. Trigger: every UPDATE bumps updated_at, so direct PostgREST updates and
+--    future RPCs cannot be missed by the sync
+-- 2. Index: (updated_at, id) for the keyset-paginated change query
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION coaching_strategies_kb_touch_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS coaching_strategies_kb_touch_updated_at ON coaching_strategies_kb;
+
+CREATE TRIGGER coaching_strategies_kb_touch_updated_at
+BEFORE UPDATE ON coaching_strategies_kb
+FOR EACH ROW
+EXECUTE FUNCTION coaching_strategies_kb_touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_updated_at_idx
+ON coaching_strategies_kb(updated_at, id);
+
+COMMENT ON INDEX coaching_strategies_kb_updated_at_idx IS 'Keyset pagination for the engine KB delta sync (updated_at, id).';
@@ -0,0 +1,108 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Versioned KB Embedding Sets
+-- ============================================================================
+--
+-- Lets the KB be re-embedded (new model, new embedding text) without the
+-- live search and the data disagreeing while the job runs:
+-- 1. kb_embedding_sets: one row per embedding version (model, status)
+-- 2. coaching_strategy_embeddings: per-version vectors, written in the
+--    background while coaching_strategies_kb.strategy_embedding keeps serving
+-- 3. activate_kb_embedding_set: copies a complete version into the live
+--    column in one transaction, so server-side search flips atomically
+--
+-- All versions are 1536-dim (text-embedding-3 models are requested with
+-- dimensions=1536), so any version fits the live vector(1536) column.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS kb_embedding_sets (
+    version TEXT PRIMARY KEY,           -- e.g. "3-small-v2", "3-large-1536"
+    model TEXT NOT NULL,                -- OpenAI embedding model
+    dims INTEGER NOT NULL DEFAULT 1536,
+    status TEXT NOT NULL DEFAULT 'building',  -- 'building', 'active', 'retired'
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    activated_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS coaching_strategy_embeddings (
+    strategy_id TEXT NOT NULL REFERENCES coaching_strategies_kb(id) ON DELETE CASCADE,
+    embedding_version TEXT NOT NULL REFERENCES kb_embedding_sets(version) ON DELETE CASCADE,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (embedding_version, strategy_id)
+);
+
+-- ============================================================================
+-- RPC: Store one strategy embedding for a version
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION store_strategy_embedding_version(
+    p_strategy_id TEXT,
+    p_version TEXT,
+    p_model TEXT,
+    p_embedding vector(1536)
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO kb_embedding_sets (version, model)
+    VALUES (p_version, p_model)
+    ON CONFLICT (version) DO NOTHING;
+
+    INSERT INTO coaching_strategy_embeddings (strategy_id, embedding_version, embedding)
+    VALUES (p_strategy_id, p_version, p_embedding)
+    ON CONFLICT (embedding_version, strategy_id) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        created_at = NOW();
+
+    RETURN FOUND;
+END;
+$$;
+
+-- ============================================================================
+-- RPC: Activate a complete embedding version (atomic flip)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION activate_kb_embedding_set(
+    p_version TEXT
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_missing INTEGER;
+    v_updated INTEGER;
+BEGIN
+    -- Refuse partial versions: every active strategy needs a vector
+    SELECT COUNT(*) INTO v_missing
+    FROM coaching_strategies_kb cs
+    LEFT JOIN coaching_strategy_embeddings e
+        ON e.strategy_id = cs.id AND e.embedding_version = p_version
+    WHERE cs.is_active = true AND e.strategy_id IS NULL;
+
+    IF v_missing > 0 THEN
+        RAISE EXCEPTION 'Embedding version % is missing % active strategies', p_version, v_missing;
+    END IF;
+
+    UPDATE coaching_strategies_kb cs
+    SET strategy_embedding = e.embedding,
+        updated_at = NOW()
+    FROM coaching_strategy_embeddings e
+    WHERE e.strategy_id = cs.id AND e.embedding_version = p_version;
+    GET DIAGNOSTICS v_updated = ROW_COUNT;
+
+    UPDATE kb_embedding_sets
+    SET status = CASE WHEN version = p_version THEN 'active' ELSE 'retired' END,
+        activated_at = CASE WHEN version = p_version THEN NOW() ELSE activated_at END
+    WHERE version = p_version OR status = 'active';
+
+    RETURN v_updated;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION store_strategy_embedding_version TO authenticated;
+GRANT EXECUTE ON FUNCTION activate_kb_embedding_set TO authenticated;
+
+COMMENT ON TABLE kb_embedding_sets IS 'Embedding versions of the coaching KB (model + lifecycle status).';
+COMMENT ON TABLE coaching_strategy_embeddings IS 'Per-version strategy embeddings, built in the background before activation.';
+COMMENT ON FUNCTION activate_kb_embedding_set IS 'Copy a complete embedding version into coaching_strategies_kb.strategy_embedding in one transaction.';
@@ -0,0 +1,135 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Batched Execution / Outcome Recording
+-- ============================================================================
+--
+-- Bulk counterpart of record_strategy_execution_kb and
+-- record_strategy_outcome_kb for the engine's write-behind queue: one call
+-- writes a batch of executions and outcomes set-based.
+--
+-- - Execution ids are generated by the client, so re-sending a batch after
+--   a timeout is safe (ON CONFLICT DO NOTHING, times_used only counts rows
+--   actually inserted)
+-- - Outcomes only apply to executions not measured yet, so a retried
+--   outcome does not count twice
+-- - Executions are inserted before outcomes are applied, so an execution
+--   and its outcome may arrive in the same batch
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION record_strategy_batch_kb(
+    p_executions JSONB DEFAULT '[]',
+    p_outcomes JSONB DEFAULT '[]'
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_executions INTEGER;
+    v_outcomes INTEGER;
+BEGIN
+    -- 1. Executions (skip ids already written by an earlier attempt)
+    WITH inserted AS (
+        INSERT INTO strategy_executions (
+            id,
+            user_id,
+            run_id,
+            strategy_id,
+            execution_context,
+            strategy_delivered,
+            strategy_title,
+            condition_match_score,
+            executed_at
+        )
+        SELECT
+            e.id,
+            e.user_id,
+            e.run_id,
+            e.strategy_id,
+            COALESCE(e.execution_context, '{}'),
+            COALESCE(e.strategy_delivered, ''),
+            e.strategy_title,
+            e.condition_match_score,
+            COALESCE(e.executed_at, NOW())
+        FROM jsonb_to_recordset(p_executions) AS e(
+            id UUID,
+            user_id UUID,
+            run_id UUID,
+            strategy_id TEXT,
+            execution_context JSONB,
+            strategy_delivered TEXT,
+            strategy_title TEXT,
+            condition_match_score REAL,
+            executed_at TIMESTAMPTZ
+        )
+        ON CONFLICT (id) DO NOTHING
+        RETURNING strategy_id
+    ),
+    used AS (
+        SELECT strategy_id, COUNT(*) AS n
+        FROM inserted
+        WHERE strategy_id IS NOT NULL
+        GROUP BY strategy_id
+    ),
+    bumped AS (
+        UPDATE coaching_strategies_kb cs
+        SET times_used = cs.times_used + used.n,
+            updated_at = NOW()
+        FROM used
+        WHERE cs.id = used.strategy_id
+    )
+    SELECT COUNT(*) INTO v_executions FROM inserted;
+
+    -- 2. Outcomes (first measurement wins)
+    WITH measured AS (
+        UPDATE strategy_executions se
+        SET outcome_measured = true,
+            outcome_metrics = o.outcome_metrics,
+            was_effective = o.was_effective,
+            effectiveness_score = o.effectiveness_score,
+            effectiveness_reason = o.effectiveness_reason,
+            outcome_measured_at = NOW()
+        FROM jsonb_to_recordset(p_outcomes) AS o(
+            execution_id UUID,
+            outcome_metrics JSONB,
+            was_effective BOOLEAN,
+            effectiveness_score REAL,
+            effectiveness_reason TEXT
+        )
+        WHERE se.id = o.execution_id
+          AND NOT COALESCE(se.outcome_measured, false)
+        RETURNING se.strategy_id, o.was_effective, o.effectiveness_score
+    ),
+    per_strategy AS (
+        SELECT
+            strategy_id,
+            COUNT(*) FILTER (WHERE was_effective) AS successes,
+            COUNT(effectiveness_score) AS scored,
+            COALESCE(SUM(effectiveness_score), 0) AS score_sum
+        FROM measured
+        WHERE strategy_id IS NOT NULL
+        GROUP BY strategy_id
+    ),
+    learned AS (
+        -- Same rolling average as record_strategy_outcome_kb, for n scores at once
+        UPDATE coaching_strategies_kb cs
+        SET times_successful = cs.times_successful + p.successes,
+            avg_effectiveness_score = CASE
+                WHEN p.scored > 0 AND cs.times_used >= p.scored THEN
+                    (COALESCE(cs.avg_effectiveness_score, 0) * (cs.times_used - p.scored) + p.score_sum) / cs.times_used
+                ELSE cs.avg_effectiveness_score
+            END,
+            updated_at = NOW()
+        FROM per_strategy p
+        WHERE cs.id = p.strategy_id
+    )
+    SELECT COUNT(*) INTO v_outcomes FROM measured;
+
+    RETURN jsonb_build_object(
+        'executions', v_executions,
+        'outcomes', v_outcomes
+    );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION record_strategy_batch_kb TO authenticated;
+
+COMMENT ON FUNCTION record_strategy_batch_kb IS 'Bulk, idempotent recording of strategy executions and outcomes (write-behind queue).';
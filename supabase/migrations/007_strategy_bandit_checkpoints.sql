@@ -0,0 +1,52 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Strategy Bandit Checkpoints
+-- ============================================================================
+--
+-- Compact checkpoints of the engine's in-process strategy bandit
+-- (coach_rag_engine/bandit.py). One row per worker: each worker stores
+-- only the outcomes it observed itself, and a starting worker sums all
+-- rows, so concurrent workers never overwrite each other.
+--
+-- state = {
+--   "version": 1,
+--   "keys": [[strategy_id, situation_bucket, user_id or ""], ...],
+--   "successes": base64 float32[],
+--   "failures": base64 float32[]
+-- }
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS strategy_bandit_checkpoints (
+    worker_id TEXT PRIMARY KEY,
+    arms INTEGER NOT NULL DEFAULT 0,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- ============================================================================
+-- RPC: Save a worker's checkpoint
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION save_strategy_bandit_checkpoint(
+    p_worker_id TEXT,
+    p_arms INTEGER,
+    p_state JSONB
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO strategy_bandit_checkpoints (worker_id, arms, state, updated_at)
+    VALUES (p_worker_id, p_arms, p_state, NOW())
+    ON CONFLICT (worker_id) DO UPDATE
+    SET arms = EXCLUDED.arms,
+        state = EXCLUDED.state,
+        updated_at = NOW();
+
+    RETURN true;
+END;
+$$;
+
+GRANT SELECT ON strategy_bandit_checkpoints TO authenticated;
+GRANT EXECUTE ON FUNCTION save_strategy_bandit_checkpoint TO authenticated;
+
+COMMENT ON TABLE strategy_bandit_checkpoints IS 'Per-worker checkpoints of the in-process strategy bandit (outcome counts per strategy / situation bucket / user).';
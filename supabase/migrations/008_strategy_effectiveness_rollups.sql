@@ -0,0 +1,169 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Streaming Effectiveness Rollups
+-- ============================================================================
+--
+-- Per-strategy, per-period running statistics in
+-- strategy_effectiveness_evolution, maintained incrementally by the
+-- engine's rollup job (coach_rag_engine/rollups.py) instead of
+-- re-aggregating strategy_executions:
+--
+-- - outcome_count, success_count (success_ratio generated)
+-- - score_count, score_mean, score_m2 (score_variance generated):
+--   Welford accumulators, merged with Chan's parallel formula
+--
+-- The job reads measured outcomes past a watermark (keyset on
+-- outcome_measured_at, id) and upserts accumulated deltas in batches.
+-- upsert_strategy_effectiveness_rollups applies a batch and advances the
+-- watermark in one transaction, only if the stored watermark still equals
+-- the one the batch started from: a retried or concurrent batch is
+-- rejected instead of counted twice.
+--
+-- Existing rows (LLM analyses) keep period NULL and are untouched.
+-- ============================================================================
+
+-- ============================================================================
+-- 1. PERIOD STATISTICS
+-- ============================================================================
+
+ALTER TABLE strategy_effectiveness_evolution
+    ADD COLUMN IF NOT EXISTS period TEXT,                 -- 'day' | 'week'
+    ADD COLUMN IF NOT EXISTS period_start TIMESTAMPTZ,    -- UTC day / ISO week start
+    ADD COLUMN IF NOT EXISTS outcome_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS success_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS score_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS score_mean DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS score_m2 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+ALTER TABLE strategy_effectiveness_evolution
+    ADD COLUMN IF NOT EXISTS success_ratio REAL GENERATED ALWAYS AS (
+        CASE WHEN outcome_count > 0 THEN success_count::REAL / outcome_count END
+    ) STORED,
+    ADD COLUMN IF NOT EXISTS score_variance DOUBLE PRECISION GENERATED ALWAYS AS (
+        CASE WHEN score_count > 1 THEN score_m2 / (score_count - 1) END
+    ) STORED;
+
+-- Upsert target (NULL periods never conflict)
+CREATE UNIQUE INDEX IF NOT EXISTS strategy_effectiveness_evolution_period_idx
+ON strategy_effectiveness_evolution(strategy_id, period, period_start);
+
+-- Outcome stream (keyset pagination)
+CREATE INDEX IF NOT EXISTS strategy_executions_outcome_stream_idx
+ON strategy_executions(outcome_measured_at, id)
+WHERE outcome_measured;
+
+-- ============================================================================
+-- 2. STREAM POSITIONS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS strategy_rollup_watermarks (
+    job TEXT PRIMARY KEY,
+    outcome_measured_at TIMESTAMPTZ,
+    execution_id UUID,
+    outcomes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- ============================================================================
+-- 3. RPC: Merge a batch of rollup deltas
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION upsert_strategy_effectiveness_rollups(
+    p_job TEXT,
+    p_rollups JSONB,
+    p_expected_at TIMESTAMPTZ,
+    p_expected_id UUID,
+    p_watermark_at TIMESTAMPTZ,
+    p_watermark_id UUID,
+    p_outcomes INTEGER DEFAULT 0
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_at TIMESTAMPTZ;
+    v_id UUID;
+BEGIN
+    INSERT INTO strategy_rollup_watermarks (job)
+    VALUES (p_job)
+    ON CONFLICT (job) DO NOTHING;
+
+    SELECT outcome_measured_at, execution_id INTO v_at, v_id
+    FROM strategy_rollup_watermarks
+    WHERE job = p_job
+    FOR UPDATE;
+
+    -- Batch built from a stale position (retry or concurrent job)
+    IF v_at IS DISTINCT FROM p_expected_at OR v_id IS DISTINCT FROM p_expected_id THEN
+        RETURN false;
+    END IF;
+
+    INSERT INTO strategy_effectiveness_evolution AS e (
+        strategy_id,
+        period,
+        period_start,
+        outcome_count,
+        success_count,
+        score_count,
+        score_mean,
+        score_m2,
+        analyzed_at,
+        updated_at
+    )
+    SELECT
+        r.strategy_id,
+        r.period,
+        r.period_start,
+        r.outcome_count,
+        r.success_count,
+        r.score_count,
+        r.score_mean,
+        COALESCE(r.score_m2, 0),
+        NOW(),
+        NOW()
+    FROM jsonb_to_recordset(p_rollups) AS r(
+        strategy_id TEXT,
+        period TEXT,
+        period_start TIMESTAMPTZ,
+        outcome_count INTEGER,
+        success_count INTEGER,
+        score_count INTEGER,
+        score_mean DOUBLE PRECISION,
+        score_m2 DOUBLE PRECISION
+    )
+    WHERE EXISTS (SELECT 1 FROM coaching_strategies_kb cs WHERE cs.id = r.strategy_id)
+    ON CONFLICT (strategy_id, period, period_start) DO UPDATE
+    SET outcome_count = e.outcome_count + EXCLUDED.outcome_count,
+        success_count = e.success_count + EXCLUDED.success_count,
+        score_count = e.score_count + EXCLUDED.score_count,
+        score_mean = CASE
+            WHEN EXCLUDED.score_count = 0 THEN e.score_mean
+            WHEN e.score_count = 0 THEN EXCLUDED.score_mean
+            ELSE e.score_mean + (EXCLUDED.score_mean - e.score_mean)
+                * EXCLUDED.score_count / (e.score_count + EXCLUDED.score_count)
+        END,
+        score_m2 = CASE
+            WHEN EXCLUDED.score_count = 0 OR e.score_count = 0 THEN e.score_m2 + EXCLUDED.score_m2
+            ELSE e.score_m2 + EXCLUDED.score_m2
+                + (EXCLUDED.score_mean - e.score_mean) ^ 2
+                * e.score_count * EXCLUDED.score_count / (e.score_count + EXCLUDED.score_count)
+        END,
+        analyzed_at = NOW(),
+        updated_at = NOW();
+
+    UPDATE strategy_rollup_watermarks
+    SET outcome_measured_at = p_watermark_at,
+        execution_id = p_watermark_id,
+        outcomes = outcomes + p_outcomes,
+        updated_at = NOW()
+    WHERE job = p_job;
+
+    RETURN true;
+END;
+$$;
+
+GRANT SELECT ON strategy_rollup_watermarks TO authenticated;
+GRANT EXECUTE ON FUNCTION upsert_strategy_effectiveness_rollups TO authenticated;
+
+COMMENT ON TABLE strategy_rollup_watermarks IS 'Outcome stream position of each effectiveness rollup job.';
+COMMENT ON FUNCTION upsert_strategy_effectiveness_rollups IS 'Merges per-period rollup deltas (count, successes, Welford mean / M2) and advances the job watermark atomically.';
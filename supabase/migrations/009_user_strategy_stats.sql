@@ -0,0 +1,242 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Maintained Per-User Strategy Stats
+-- ============================================================================
+--
+-- get_user_top_strategies used to aggregate a user's whole execution
+-- history on every call, so its cost grew with tenure. user_strategy_stats
+-- keeps the per-(user, strategy) counters instead, and the RPCs read the
+-- top rows with an index lookup.
+--
+-- Counters are maintained by statement-level triggers on
+-- strategy_executions: every statement that measures outcomes (single
+-- record_strategy_outcome* calls or a whole record_strategy_batch_kb batch)
+-- adds its newly measured rows with one grouped upsert over the
+-- transition table. Outcomes closed as unmeasured (was_effective NULL) do
+-- not count.
+--
+-- Existing history is backfilled once below.
+-- ============================================================================
+
+-- ============================================================================
+-- 1. USER STRATEGY STATS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS user_strategy_stats (
+    user_id UUID NOT NULL,
+    strategy_id TEXT NOT NULL,
+
+    -- Measured outcomes of this strategy for this user
+    times_used INTEGER NOT NULL DEFAULT 0,
+    times_successful INTEGER NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+
+    success_rate REAL GENERATED ALWAYS AS (
+        CASE WHEN times_used > 0 THEN times_successful::REAL / times_used::REAL END
+    ) STORED,
+    avg_effectiveness REAL GENERATED ALWAYS AS (
+        CASE WHEN score_count > 0 THEN (score_sum / score_count)::REAL END
+    ) STORED,
+
+    last_outcome_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+
+    PRIMARY KEY (user_id, strategy_id)
+);
+
+-- Top strategies of a user, in RPC order (at least 2 uses for reliability)
+CREATE INDEX IF NOT EXISTS user_strategy_stats_top_idx
+ON user_strategy_stats(user_id, success_rate DESC, avg_effectiveness DESC)
+WHERE times_used >= 2;
+
+ALTER TABLE user_strategy_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own strategy stats"
+ON user_strategy_stats FOR SELECT
+TO authenticated
+USING (auth.uid() = user_id);
+
+-- ============================================================================
+-- 2. TRIGGERS: Add newly measured outcomes
+-- ============================================================================
+
+-- SECURITY DEFINER: the stats are written on behalf of whoever records the
+-- outcome, and clients have no write access to the table
+CREATE OR REPLACE FUNCTION apply_user_strategy_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_strategy_stats AS s (
+            user_id, strategy_id, times_used, times_successful, score_count, score_sum, last_outcome_at
+        )
+        SELECT
+            n.user_id,
+            n.strategy_id::TEXT,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE n.was_effective),
+            COUNT(n.effectiveness_score),
+            COALESCE(SUM(n.effectiveness_score), 0),
+            MAX(n.outcome_measured_at)
+        FROM new_rows n
+        WHERE n.outcome_measured
+          AND n.was_effective IS NOT NULL
+          AND n.user_id IS NOT NULL
+          AND n.strategy_id IS NOT NULL
+        GROUP BY n.user_id, n.strategy_id
+        ON CONFLICT (user_id, strategy_id) DO UPDATE
+        SET times_used = s.times_used + EXCLUDED.times_used,
+            times_successful = s.times_successful + EXCLUDED.times_successful,
+            score_count = s.score_count + EXCLUDED.score_count,
+            score_sum = s.score_sum + EXCLUDED.score_sum,
+            last_outcome_at = GREATEST(s.last_outcome_at, EXCLUDED.last_outcome_at),
+            updated_at = NOW();
+    ELSE
+        INSERT INTO user_strategy_stats AS s (
+            user_id, strategy_id, times_used, times_successful, score_count, score_sum, last_outcome_at
+        )
+        SELECT
+            n.user_id,
+            n.strategy_id::TEXT,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE n.was_effective),
+            COUNT(n.effectiveness_score),
+            COALESCE(SUM(n.effectiveness_score), 0),
+            MAX(n.outcome_measured_at)
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.outcome_measured
+          AND NOT COALESCE(o.outcome_measured, false)    -- first measurement only
+          AND n.was_effective IS NOT NULL
+          AND n.user_id IS NOT NULL
+          AND n.strategy_id IS NOT NULL
+        GROUP BY n.user_id, n.strategy_id
+        ON CONFLICT (user_id, strategy_id) DO UPDATE
+        SET times_used = s.times_used + EXCLUDED.times_used,
+            times_successful = s.times_successful + EXCLUDED.times_successful,
+            score_count = s.score_count + EXCLUDED.score_count,
+            score_sum = s.score_sum + EXCLUDED.score_sum,
+            last_outcome_at = GREATEST(s.last_outcome_at, EXCLUDED.last_outcome_at),
+            updated_at = NOW();
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS user_strategy_stats_on_insert ON strategy_executions;
+CREATE TRIGGER user_strategy_stats_on_insert
+AFTER INSERT ON strategy_executions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION apply_user_strategy_stats();
+
+DROP TRIGGER IF EXISTS user_strategy_stats_on_update ON strategy_executions;
+CREATE TRIGGER user_strategy_stats_on_update
+AFTER UPDATE ON strategy_executions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION apply_user_strategy_stats();
+
+-- ============================================================================
+-- 3. BACKFILL (existing measured outcomes)
+-- ============================================================================
+
+INSERT INTO user_strategy_stats (
+    user_id, strategy_id, times_used, times_successful, score_count, score_sum, last_outcome_at
+)
+SELECT
+    se.user_id,
+    se.strategy_id::TEXT,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE se.was_effective),
+    COUNT(se.effectiveness_score),
+    COALESCE(SUM(se.effectiveness_score), 0),
+    MAX(se.outcome_measured_at)
+FROM strategy_executions se
+WHERE se.outcome_measured
+  AND se.was_effective IS NOT NULL
+  AND se.user_id IS NOT NULL
+  AND se.strategy_id IS NOT NULL
+GROUP BY se.user_id, se.strategy_id
+ON CONFLICT (user_id, strategy_id) DO NOTHING;
+
+-- ============================================================================
+-- 4. RPC FUNCTIONS: Top strategies for a user (index lookup)
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION get_user_top_strategies_kb(
+    p_user_id UUID,
+    p_distance TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    strategy_id TEXT,
+    title TEXT,
+    strategy_text TEXT,
+    distance TEXT,
+    user_times_used INTEGER,
+    user_success_rate REAL,
+    user_avg_effectiveness REAL
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        cs.id AS strategy_id,
+        cs.title,
+        cs.strategy_text,
+        cs.distance,
+        uss.times_used AS user_times_used,
+        uss.success_rate AS user_success_rate,
+        uss.avg_effectiveness AS user_avg_effectiveness
+    FROM user_strategy_stats uss
+    JOIN coaching_strategies_kb cs ON cs.id = uss.strategy_id
+    WHERE uss.user_id = p_user_id
+        AND uss.times_used >= 2  -- At least 2 uses for reliability
+        AND (p_distance IS NULL OR cs.distance = p_distance)
+    ORDER BY uss.success_rate DESC, uss.avg_effectiveness DESC
+    LIMIT p_limit;
+END;
+$$;
+
+-- The engine's entry point: KB strategies, keys as the prompt expects them
+DROP FUNCTION IF EXISTS get_user_top_strategies(UUID, INTEGER);
+
+CREATE OR REPLACE FUNCTION get_user_top_strategies(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    strategy_id TEXT,
+    strategy_name TEXT,
+    strategy_text TEXT,
+    user_times_used INTEGER,
+    user_success_rate REAL,
+    user_avg_effectiveness REAL
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        t.strategy_id,
+        t.title AS strategy_name,
+        t.strategy_text,
+        t.user_times_used,
+        t.user_success_rate,
+        t.user_avg_effectiveness
+    FROM get_user_top_strategies_kb(p_user_id, NULL, p_limit) t;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_user_top_strategies_kb TO authenticated;
+GRANT EXECUTE ON FUNCTION get_user_top_strategies TO authenticated;
+
+COMMENT ON TABLE user_strategy_stats IS 'Per-user strategy outcome counters, maintained by triggers on strategy_executions.';
+COMMENT ON FUNCTION get_user_top_strategies_kb IS 'Returns strategies that work best for a specific user (from user_strategy_stats).';
+COMMENT ON FUNCTION get_user_top_strategies IS 'Returns strategies that work best for a specific user (from user_strategy_stats).';
@@ -0,0 +1,176 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Bulk KB Writes (unnest)
+-- ============================================================================
+--
+-- Array counterparts of the single-row RPCs, so KB seeding and execution
+-- logging write many rows per call and per statement:
+--
+-- - update_strategy_embeddings_kb      (update_strategy_embedding_kb)
+-- - store_strategy_embedding_versions  (store_strategy_embedding_version)
+-- - record_strategy_executions_kb      (record_strategy_execution_kb)
+--
+-- Parameters are parallel arrays, zipped with multi-argument unnest() into
+-- one set-based INSERT / UPDATE. Embeddings travel as pgvector text
+-- literals ('[0.1,0.2,...]', TEXT[]) and are cast server-side.
+--
+-- record_strategy_executions_kb takes client-generated ids like
+-- record_strategy_batch_kb: re-sending a batch inserts nothing twice and
+-- times_used only counts rows actually inserted.
+-- ============================================================================
+
+-- ============================================================================
+-- RPC: Bulk live embedding update
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION update_strategy_embeddings_kb(
+    p_strategy_ids TEXT[],
+    p_embeddings TEXT[]
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_updated INTEGER;
+BEGIN
+    UPDATE coaching_strategies_kb cs
+    SET strategy_embedding = u.embedding::vector(1536),
+        updated_at = NOW()
+    FROM (
+        -- Last entry wins for repeated ids
+        SELECT DISTINCT ON (id) id, embedding
+        FROM unnest(p_strategy_ids, p_embeddings) WITH ORDINALITY AS t(id, embedding, n)
+        ORDER BY id, n DESC
+    ) u
+    WHERE cs.id = u.id;
+
+    GET DIAGNOSTICS v_updated = ROW_COUNT;
+    RETURN v_updated;
+END;
+$$;
+
+-- ============================================================================
+-- RPC: Bulk versioned embedding store
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION store_strategy_embedding_versions(
+    p_version TEXT,
+    p_model TEXT,
+    p_strategy_ids TEXT[],
+    p_embeddings TEXT[]
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_stored INTEGER;
+BEGIN
+    INSERT INTO kb_embedding_sets (version, model)
+    VALUES (p_version, p_model)
+    ON CONFLICT (version) DO NOTHING;
+
+    INSERT INTO coaching_strategy_embeddings (strategy_id, embedding_version, embedding)
+    SELECT DISTINCT ON (id) id, p_version, embedding::vector(1536)
+    FROM unnest(p_strategy_ids, p_embeddings) WITH ORDINALITY AS t(id, embedding, n)
+    ORDER BY id, n DESC
+    ON CONFLICT (embedding_version, strategy_id) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        created_at = NOW();
+
+    GET DIAGNOSTICS v_stored = ROW_COUNT;
+    RETURN v_stored;
+END;
+$$;
+
+-- ============================================================================
+-- RPC: Bulk execution insert
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION record_strategy_executions_kb(
+    p_ids UUID[],
+    p_user_ids UUID[],
+    p_run_ids UUID[],
+    p_strategy_ids TEXT[],
+    p_execution_contexts JSONB[],
+    p_strategies_delivered TEXT[],
+    p_strategy_titles TEXT[] DEFAULT NULL,
+    p_condition_match_scores REAL[] DEFAULT NULL,
+    p_executed_at TIMESTAMPTZ[] DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_inserted INTEGER;
+BEGIN
+    WITH inserted AS (
+        INSERT INTO strategy_executions (
+            id,
+            user_id,
+            run_id,
+            strategy_id,
+            execution_context,
+            strategy_delivered,
+            strategy_title,
+            condition_match_score,
+            executed_at
+        )
+        SELECT
+            e.id,
+            e.user_id,
+            e.run_id,
+            e.strategy_id,
+            COALESCE(e.execution_context, '{}'),
+            COALESCE(e.strategy_delivered, ''),
+            e.strategy_title,
+            e.condition_match_score,
+            COALESCE(e.executed_at, NOW())
+        FROM unnest(
+            p_ids,
+            p_user_ids,
+            p_run_ids,
+            p_strategy_ids,
+            p_execution_contexts,
+            p_strategies_delivered,
+            p_strategy_titles,
+            p_condition_match_scores,
+            p_executed_at
+        ) AS e(
+            id,
+            user_id,
+            run_id,
+            strategy_id,
+            execution_context,
+            strategy_delivered,
+            strategy_title,
+            condition_match_score,
+            executed_at
+        )
+        ON CONFLICT (id) DO NOTHING
+        RETURNING strategy_id
+    ),
+    used AS (
+        SELECT strategy_id, COUNT(*) AS n
+        FROM inserted
+        WHERE strategy_id IS NOT NULL
+        GROUP BY strategy_id
+    ),
+    bumped AS (
+        UPDATE coaching_strategies_kb cs
+        SET times_used = cs.times_used + used.n,
+            updated_at = NOW()
+        FROM used
+        WHERE cs.id = used.strategy_id
+    )
+    SELECT COUNT(*) INTO v_inserted FROM inserted;
+
+    RETURN v_inserted;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION update_strategy_embeddings_kb TO authenticated;
+GRANT EXECUTE ON FUNCTION store_strategy_embedding_versions TO authenticated;
+GRANT EXECUTE ON FUNCTION record_strategy_executions_kb TO authenticated;
+
+COMMENT ON FUNCTION update_strategy_embeddings_kb IS 'Bulk update of live KB embeddings (parallel id / pgvector literal arrays).';
+COMMENT ON FUNCTION store_strategy_embedding_versions IS 'Bulk store of a versioned embedding set (parallel id / pgvector literal arrays).';
+COMMENT ON FUNCTION record_strategy_executions_kb IS 'Bulk, idempotent insert of strategy executions (parallel arrays, client-generated ids).';
@@ -0,0 +1,242 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - HNSW Indexes and Per-Distance Partial Indexes
+-- ============================================================================
+--
+-- The ivfflat indexes of 001 / 002 were built when the tables were empty
+-- (lists trained on no rows), and semantic_search_strategies_kb ordered by
+-- the hybrid score, so no ANN index could serve it: every call scored all
+-- rows, then filtered distance / runner_level.
+--
+-- - HNSW replaces ivfflat (no training step, good recall as rows arrive)
+-- - coaching_strategies_kb gets one partial HNSW index per distance
+--   category: the distance filter is the index itself, not a post-filter
+-- - semantic_search_strategies_kb takes the p_candidate_count nearest
+--   strategies from the index, then applies the threshold and hybrid
+--   ranking to those
+-- - p_ef_search / p_probes tune the ANN scan per call (set_config local to
+--   the call, like SET LOCAL); p_probes only matters where an ivfflat
+--   index is still used
+-- - With pgvector >= 0.8.0 the scan is iterative (hnsw.iterative_scan), so
+--   runner_level / type / user filters do not starve the result
+--
+-- force_custom_plan keeps p_distance a constant at planning time, so the
+-- matching partial index is chosen on every call (a generic plan cannot
+-- prove the index predicate).
+-- ============================================================================
+
+-- ============================================================================
+-- 1. KB INDEXES
+-- ============================================================================
+
+DROP INDEX IF EXISTS coaching_strategies_kb_embedding_idx;
+
+-- Any distance (categories without a partial index)
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_hnsw_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active;
+
+-- One per distance category
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_casual_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active AND distance = 'casual';
+
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_5k_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active AND distance = '5k';
+
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_10k_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active AND distance = '10k';
+
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_half_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active AND distance = 'half';
+
+CREATE INDEX IF NOT EXISTS coaching_strategies_kb_embedding_full_idx
+ON coaching_strategies_kb
+USING hnsw (strategy_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE is_active AND distance = 'full';
+
+-- ============================================================================
+-- 2. RUN PERFORMANCE INDEX
+-- ============================================================================
+
+DROP INDEX IF EXISTS run_performance_embedding_idx;
+
+CREATE INDEX IF NOT EXISTS run_performance_embedding_hnsw_idx
+ON run_performance
+USING hnsw (run_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- ============================================================================
+-- 3. HELPER: Per-call ANN settings
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION set_vector_search_settings(
+    p_ef_search INTEGER DEFAULT 100,
+    p_probes INTEGER DEFAULT 10
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- is_local = true: reverted when the calling function / transaction ends
+    PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(p_ef_search, 1), 1000)::TEXT, true);
+    PERFORM set_config('ivfflat.probes', GREATEST(p_probes, 1)::TEXT, true);
+
+    -- pgvector >= 0.8.0: keep scanning until enough rows pass the filters
+    IF current_setting('hnsw.iterative_scan', true) IS NOT NULL THEN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+        PERFORM set_config('ivfflat.iterative_scan', 'relaxed_order', true);
+    END IF;
+END;
+$$;
+
+-- ============================================================================
+-- 4. RPC: KB semantic search (ANN candidates, hybrid rerank)
+-- ============================================================================
+
+-- New trailing parameters: drop the old signature so calls stay unambiguous
+DROP FUNCTION IF EXISTS semantic_search_strategies_kb(vector, TEXT, TEXT, TEXT, REAL, INTEGER);
+
+CREATE OR REPLACE FUNCTION semantic_search_strategies_kb(
+    p_situation_embedding vector(1536),
+    p_distance TEXT,
+    p_runner_level TEXT DEFAULT 'all',
+    p_strategy_type TEXT DEFAULT NULL,
+    p_match_threshold REAL DEFAULT 0.65,
+    p_match_count INTEGER DEFAULT 15,
+    p_candidate_count INTEGER DEFAULT 100,
+    p_ef_search INTEGER DEFAULT 100,
+    p_probes INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    id TEXT,
+    title TEXT,
+    distance TEXT,
+    type TEXT,
+    runner_level TEXT,
+    strategy_text TEXT,
+    conditions_to_use TEXT,
+    when_not_to_use TEXT,
+    tags TEXT[],
+    times_used INTEGER,
+    success_rate REAL,
+    avg_effectiveness_score REAL,
+    similarity REAL
+)
+LANGUAGE plpgsql
+SET plan_cache_mode = force_custom_plan
+AS $$
+BEGIN
+    -- ef_search below the candidate count would cap the candidates
+    PERFORM set_vector_search_settings(GREATEST(p_ef_search, p_candidate_count), p_probes);
+
+    RETURN QUERY
+    WITH candidates AS (
+        -- ANN scan of the distance's partial index, nearest first
+        SELECT
+            cs.id AS strategy_id,
+            cs.strategy_embedding <=> p_situation_embedding AS cosine_distance
+        FROM coaching_strategies_kb cs
+        WHERE cs.is_active
+            AND cs.strategy_embedding IS NOT NULL
+            AND cs.distance = p_distance
+            AND (cs.runner_level = 'all' OR cs.runner_level = p_runner_level)
+            AND (p_strategy_type IS NULL OR cs.type = p_strategy_type)
+        ORDER BY cs.strategy_embedding <=> p_situation_embedding
+        LIMIT p_candidate_count
+    )
+    SELECT
+        cs.id,
+        cs.title,
+        cs.distance,
+        cs.type,
+        cs.runner_level,
+        cs.strategy_text,
+        cs.conditions_to_use,
+        cs.when_not_to_use,
+        cs.tags,
+        cs.times_used,
+        cs.success_rate,
+        cs.avg_effectiveness_score,
+        (1 - c.cosine_distance)::REAL AS similarity
+    FROM candidates c
+    JOIN coaching_strategies_kb cs ON cs.id = c.strategy_id
+    WHERE (1 - c.cosine_distance) >= p_match_threshold
+    ORDER BY
+        -- Hybrid ranking: 50% similarity, 30% success_rate, 20% effectiveness
+        (
+            (1 - c.cosine_distance) * 0.5 +
+            COALESCE(cs.success_rate, 0.0) * 0.3 +
+            COALESCE(cs.avg_effectiveness_score, 0.0) * 0.2
+        ) DESC,
+        cs.times_used DESC
+    LIMIT p_match_count;
+END;
+$$;
+
+-- ============================================================================
+-- 5. RPC: Similar past runs (HNSW)
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS match_run_performance(vector, FLOAT, INT, UUID);
+
+CREATE OR REPLACE FUNCTION match_run_performance(
+    query_embedding vector(1536),
+    match_threshold FLOAT DEFAULT 0.7,
+    match_count INT DEFAULT 5,
+    filter_user_id UUID DEFAULT NULL,
+    ef_search INT DEFAULT 100,
+    probes INT DEFAULT 10
+)
+RETURNS TABLE (
+    run_id UUID,
+    distance DOUBLE PRECISION,
+    pace DOUBLE PRECISION,
+    duration DOUBLE PRECISION,
+    similarity FLOAT,
+    performance_summary TEXT,
+    key_insights TEXT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_vector_search_settings(ef_search, probes);
+
+    RETURN QUERY
+    SELECT
+        rp.run_id,
+        ra.distance_meters AS distance,
+        ra.average_pace_minutes_per_km AS pace,
+        ra.duration_s::DOUBLE PRECISION AS duration,
+        1 - (rp.run_embedding <=> query_embedding) AS similarity,
+        rp.performance_summary,
+        rp.key_insights
+    FROM run_performance rp
+    INNER JOIN run_activities ra ON ra.id = rp.run_id
+    WHERE
+        (filter_user_id IS NULL OR rp.user_id = filter_user_id)
+        AND 1 - (rp.run_embedding <=> query_embedding) > match_threshold
+    ORDER BY rp.run_embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION semantic_search_strategies_kb TO authenticated;
+GRANT EXECUTE ON FUNCTION match_run_performance TO authenticated;
+
+COMMENT ON FUNCTION set_vector_search_settings IS 'Sets hnsw.ef_search / ivfflat.probes (and iterative scans on pgvector >= 0.8) for the current transaction.';
+COMMENT ON FUNCTION semantic_search_strategies_kb IS 'KB semantic search: nearest p_candidate_count strategies from the per-distance HNSW index, then threshold + hybrid ranking.';
+COMMENT ON FUNCTION match_run_performance IS 'Semantic search for similar past runs using cosine similarity (HNSW, per-call ef_search). Joins with run_activities to get actual run data.';
@@ -0,0 +1,19 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - KB Embedding Hash (delta sync re-embeds)
+-- ============================================================================
+--
+-- The delta sync reads changed KB rows without their vectors. Re-embedding a
+-- strategy (update_strategy_embedding_kb, update_strategy_embeddings_kb)
+-- only bumps updated_at, like any stats update, so the engine could not
+-- tell that the vector changed and kept serving the old one.
+--
+-- embedding_hash is the md5 of the stored vector. The sync compares it with
+-- the hash it holds and re-fetches strategy_embedding only where it differs.
+-- ============================================================================
+
+ALTER TABLE coaching_strategies_kb
+    ADD COLUMN IF NOT EXISTS embedding_hash TEXT GENERATED ALWAYS AS (
+        md5(strategy_embedding::TEXT)
+    ) STORED;
+
+COMMENT ON COLUMN coaching_strategies_kb.embedding_hash IS 'md5 of strategy_embedding; the engine delta sync re-fetches vectors whose hash changed.';
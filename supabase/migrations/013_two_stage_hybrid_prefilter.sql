@@ -0,0 +1,100 @@
+-- ============================================================================
+-- COACH RAG AI ENGINE - Two-Stage Search: Hybrid Prefilter
+-- ============================================================================
+--
+-- Stage 1 of semantic_search_strategies_kb_two_stage (003) kept the
+-- p_rerank_count strategies nearest on the 256-dim prefix, while the
+-- in-process two_stage search (local_index.py) keeps the top p_rerank_count
+-- by hybrid score over the prefix similarity. The two paths returned
+-- different strategies for the same query.
+--
+-- Both now use the hybrid score (50% prefix similarity, 30% success_rate,
+-- 20% effectiveness) in stage 1. The final order is the hybrid score, so a
+-- nearest-only prefilter drops proven strategies that are slightly further
+-- away: on the synthetic benchmark (benchmark_retrieval.py) recall@15
+-- against exact search is 0.997 with the hybrid prefilter and 0.471 with the
+-- nearest-only one. The prefix scan was already a full scan of the filtered
+-- rows, so the hybrid ordering costs nothing extra.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION semantic_search_strategies_kb_two_stage(
+    p_situation_embedding vector(1536),
+    p_distance TEXT,
+    p_runner_level TEXT DEFAULT 'all',
+    p_strategy_type TEXT DEFAULT NULL,
+    p_match_threshold REAL DEFAULT 0.65,
+    p_match_count INTEGER DEFAULT 15,
+    p_rerank_count INTEGER DEFAULT 48
+)
+RETURNS TABLE (
+    id TEXT,
+    title TEXT,
+    distance TEXT,
+    type TEXT,
+    runner_level TEXT,
+    strategy_text TEXT,
+    conditions_to_use TEXT,
+    when_not_to_use TEXT,
+    tags TEXT[],
+    times_used INTEGER,
+    success_rate REAL,
+    avg_effectiveness_score REAL,
+    similarity REAL
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_query_prefix vector(256) := l2_normalize(subvector(p_situation_embedding, 1, 256))::vector(256);
+BEGIN
+    RETURN QUERY
+    WITH prefiltered AS (
+        -- Stage 1: hybrid score over the truncated prefix similarity
+        SELECT cs.id AS strategy_id
+        FROM coaching_strategies_kb cs
+        WHERE cs.is_active = true
+            AND cs.strategy_embedding IS NOT NULL
+            AND cs.distance = p_distance
+            AND (cs.runner_level = 'all' OR cs.runner_level = p_runner_level)
+            AND (p_strategy_type IS NULL OR cs.type = p_strategy_type)
+        ORDER BY
+            (
+                (1 - (l2_normalize(subvector(cs.strategy_embedding, 1, 256))::vector(256) <=> v_query_prefix)) * 0.5 +
+                COALESCE(cs.success_rate, 0.0) * 0.3 +
+                COALESCE(cs.avg_effectiveness_score, 0.0) * 0.2
+            ) DESC,
+            cs.times_used DESC
+        LIMIT p_rerank_count
+    )
+    -- Stage 2: full-precision rerank
+    SELECT
+        cs.id,
+        cs.title,
+        cs.distance,
+        cs.type,
+        cs.runner_level,
+        cs.strategy_text,
+        cs.conditions_to_use,
+        cs.when_not_to_use,
+        cs.tags,
+        cs.times_used,
+        cs.success_rate,
+        cs.avg_effectiveness_score,
+        (1 - (cs.strategy_embedding <=> p_situation_embedding))::REAL AS similarity
+    FROM coaching_strategies_kb cs
+    JOIN prefiltered pf ON pf.strategy_id = cs.id
+    WHERE (1 - (cs.strategy_embedding <=> p_situation_embedding)) >= p_match_threshold
+    ORDER BY
+        -- Hybrid ranking: 50% similarity, 30% success_rate, 20% effectiveness
+        (
+            (1 - (cs.strategy_embedding <=> p_situation_embedding)) * 0.5 +
+            COALESCE(cs.success_rate, 0.0) * 0.3 +
+            COALESCE(cs.avg_effectiveness_score, 0.0) * 0.2
+        ) DESC,
+        cs.times_used DESC
+    LIMIT p_match_count;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION semantic_search_strategies_kb_two_stage TO authenticated;
+
+COMMENT ON FUNCTION semantic_search_strategies_kb_two_stage IS 'Two-stage KB search: hybrid prefilter on 256-dim prefix similarity, then full 1536-dim hybrid rerank of the top p_rerank_count candidates.';